@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+import numpy as np
+
+from app.bars import iso_to_ms, ms_to_iso
+
+
+# One .npy file per column in every partition directory; strings are dictionary-coded via meta.json
+COLUMNS = ("t", "id", "price", "created", "source", "currency")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def archive_root() -> Path:
+    """Directory holding archived partitions (ARCHIVE_DIR, default data/archive)."""
+    return Path(os.getenv("ARCHIVE_DIR") or Path("data") / "archive")
+
+
+def archive_after_days() -> int:
+    return int(os.getenv("ARCHIVE_AFTER_DAYS") or 90)
+
+
+def _created_text(sec: int) -> str:
+    # Same text as SQLite's datetime('now') default
+    return (_EPOCH + timedelta(seconds=int(sec))).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _month_start(ms: int) -> datetime:
+    dt = _EPOCH + timedelta(milliseconds=int(ms))
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+# ===== Partition files =====
+@lru_cache(maxsize=256)
+def _open(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    # Partition directories are immutable (a rewrite gets a new path), so the memory maps can be kept open
+    p = Path(path)
+    cols = {name: np.load(p / f"{name}.npy", mmap_mode="r") for name in COLUMNS}
+    meta = json.loads((p / "meta.json").read_text(encoding="utf-8"))
+    meta["as_of"] = {int(k): v for k, v in meta.get("as_of", {}).items()}
+    meta["created_at"] = {int(k): v for k, v in meta.get("created_at", {}).items()}
+    return cols, meta
+
+
+def _write(root: Path, symbol: str, month: str, cols: Dict[str, np.ndarray], meta: Dict[str, Any]) -> str:
+    rel = f"{quote(symbol, safe='')}/{month}-{uuid.uuid4().hex[:8]}"
+    path = root / rel
+    path.mkdir(parents=True)
+    for name in COLUMNS:
+        np.save(path / f"{name}.npy", np.ascontiguousarray(cols[name]))
+    (path / "meta.json").write_text(json.dumps(meta, separators=(",", ":")), encoding="utf-8")
+    return rel
+
+
+def _partition_rows(cols: Dict[str, np.ndarray], meta: Dict[str, Any], symbol: str, idx: Sequence[int]) -> List[Tuple[Any, ...]]:
+    """Rows like query_prices_page's (symbol, price, as_of, currency, source, created_at, id) for positions `idx`."""
+    out = []
+    for i in idx:
+        i = int(i)
+        as_of = meta["as_of"].get(i) or ms_to_iso(int(cols["t"][i]))
+        created = meta["created_at"][i] if i in meta["created_at"] else _created_text(int(cols["created"][i]))
+        out.append((
+            symbol,
+            float(cols["price"][i]),
+            as_of,
+            meta["currencies"][int(cols["currency"][i])],
+            meta["sources"][int(cols["source"][i])],
+            created,
+            int(cols["id"][i]),
+        ))
+    return out
+
+
+def archive_slices(
+    conn: sqlite3.Connection,
+    *,
+    symbol: Optional[str] = None,
+    start_ms: Optional[int] = None,
+    end_ms: Optional[int] = None,
+    root: Optional[Path] = None,
+) -> Iterator[Tuple[str, Dict[str, np.ndarray], Dict[str, Any], int, int]]:
+    """
+    Archived ticks with start_ms <= t <= end_ms, newest partition first, as (symbol, columns, meta, lo, hi).
+    `columns` are the partition's read-only memory maps; cols[name][lo:hi] is the matching run (a view, no copy).
+    """
+    root = root or archive_root()
+    clauses: List[str] = []
+    params: List[Any] = []
+    if symbol:
+        clauses.append("symbol = ?")
+        params.append(symbol)
+    if start_ms is not None:
+        clauses.append("t_max >= ?")
+        params.append(int(start_ms))
+    if end_ms is not None:
+        clauses.append("t_min <= ?")
+        params.append(int(end_ms))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    parts = conn.execute(f"SELECT symbol, path FROM price_archive {where} ORDER BY month DESC, symbol DESC;", tuple(params)).fetchall()
+    for sym, rel in parts:
+        cols, meta = _open(str(root / rel))
+        t = cols["t"]
+        lo = 0 if start_ms is None else int(np.searchsorted(t, int(start_ms), "left"))
+        hi = len(t) if end_ms is None else int(np.searchsorted(t, int(end_ms), "right"))
+        if hi > lo:
+            yield sym, cols, meta, lo, hi
+
+
+def archived_rows(
+    conn: sqlite3.Connection,
+    *,
+    symbol: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    before: Optional[Tuple[str, int]] = None,
+    n: int,
+    root: Optional[Path] = None,
+) -> List[Tuple[Any, ...]]:
+    """
+    The newest `n` archived ticks matching query_prices_page's filters (`before` is a decoded cursor), as
+    (symbol, price, as_of, currency, source, created_at, id), newest first. Only those rows are materialised.
+    """
+    start_ms = iso_to_ms(start) if start else None
+    end_ms = iso_to_ms(end) if end else None
+    cursor_ms = iso_to_ms(before[0]) if before else None
+    if before and cursor_ms is not None:
+        end_ms = cursor_ms if end_ms is None else min(end_ms, cursor_ms)
+    found: List[Tuple[int, int, Tuple[Any, ...]]] = []
+    for sym, cols, meta, lo, hi in archive_slices(conn, symbol=symbol, start_ms=start_ms, end_ms=end_ms, root=root):
+        # Partitions come newest month first. Once n rows are held, a partition entirely older than all of them
+        # adds nothing; once they all fall at or after the end of this partition's month, no later partition can either
+        if len(found) >= n:
+            if found[n - 1][0] >= (_next_month(_month_start(int(cols["t"][0]))) - _EPOCH) // timedelta(milliseconds=1):
+                break
+            if int(cols["t"][hi - 1]) < found[n - 1][0]:
+                continue
+        t, ids = cols["t"][lo:hi], cols["id"][lo:hi]
+        if before and cursor_ms is not None:
+            # Ticks at the cursor's own timestamp continue below its id
+            tie = int(np.searchsorted(t, cursor_ms, "left"))
+            same = np.arange(tie, hi - lo)
+            take = np.concatenate([np.arange(max(0, tie - n), tie), same[ids[same] < int(before[1])]])[-n:]
+        else:
+            take = np.arange(max(0, hi - lo - n), hi - lo)
+        for i, row in zip(take, _partition_rows(cols, meta, sym, lo + take)):
+            found.append((int(t[i]), int(ids[i]), row))
+        found.sort(key=lambda f: (f[0], f[1]), reverse=True)
+        del found[n:]
+    return [f[2] for f in found]
+
+
+def archive_marks(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Per symbol, the epoch second everything before which may be archived (end of its newest archived month)."""
+    return {s: int(end) for s, end in conn.execute("SELECT symbol, MAX(end_t) FROM price_archive GROUP BY symbol;")}
+
+
+def find_archived(conn: sqlite3.Connection, *, symbol: str, as_of: str, source: str, root: Optional[Path] = None) -> Optional[Tuple[Any, ...]]:
+    """The archived tick with this (symbol, as_of, source), like get_price's row; None if not archived."""
+    ms = iso_to_ms(as_of)
+    if ms is None:
+        return None
+    month = _month_start(ms).strftime("%Y-%m")
+    part = conn.execute("SELECT path FROM price_archive WHERE symbol = ? AND month = ?;", (symbol, month)).fetchone()
+    if not part:
+        return None
+    cols, meta = _open(str((root or archive_root()) / part[0]))
+    if source not in meta["sources"]:
+        return None
+    code = meta["sources"].index(source)
+    lo, hi = np.searchsorted(cols["t"], ms, "left"), np.searchsorted(cols["t"], ms, "right")
+    hits = [i for i in range(int(lo), int(hi)) if int(cols["source"][i]) == code]
+    return _partition_rows(cols, meta, symbol, hits[:1])[0][:6] if hits else None
+
+
+def drop_archived(conn: sqlite3.Connection, rows: List[Tuple[Any, ...]]) -> List[Tuple[Any, ...]]:
+    """
+    Filter (symbol, price, as_of, currency, source) rows down to those not already archived, so re-ingesting
+    an archived period is ignored like any other duplicate instead of being counted twice in price_bars.
+    Ticks older than a symbol's retention mark (app.maintenance) are dropped too: that period is bars only.
+    """
+    marks = archive_marks(conn)
+    pruned = dict(conn.execute("SELECT symbol, end_t FROM price_retention;").fetchall())
+    if not marks and not pruned:
+        return rows
+    keep = []
+    for r in rows:
+        mark, floor = marks.get(r[0]), pruned.get(r[0])
+        ms = iso_to_ms(r[2]) if mark is not None or floor is not None else None
+        if ms is not None and floor is not None and ms < floor * 1000:
+            continue
+        if ms is None or mark is None or ms >= mark * 1000 or find_archived(conn, symbol=r[0], as_of=r[2], source=r[4]) is None:
+            keep.append(r)
+    return keep
+
+
+# ===== Compaction =====
+def _archive_month(conn: sqlite3.Connection, root: Path, symbol: str, month: datetime) -> int:
+    """Move one symbol/month of raw ticks into its partition (merged with any existing one). Caller holds the write lock."""
+    start_ms = (month - _EPOCH) // timedelta(milliseconds=1)
+    end = _next_month(month)
+    end_ms = (end - _EPOCH) // timedelta(milliseconds=1)
+    rows = conn.execute(
+        """
+        SELECT p.id, p.price, p.t, p.currency, src.name, p.created_at, p.as_of_text
+        FROM price_ticks p JOIN sources src ON src.id = p.source_id
+        WHERE p.symbol_id = (SELECT id FROM symbols WHERE name = ?) AND p.t >= ? AND p.t < ?
+        AND p.id NOT IN (
+            SELECT l.id FROM price_ticks l WHERE l.symbol_id = (SELECT id FROM symbols WHERE name = ?)
+            ORDER BY l.t DESC, l.id DESC LIMIT 2
+        );
+        """,
+        (symbol, start_ms, end_ms, symbol),
+    ).fetchall()
+    if not rows:
+        return 0
+    key = month.strftime("%Y-%m")
+    old = conn.execute("SELECT path FROM price_archive WHERE symbol = ? AND month = ?;", (symbol, key)).fetchone()
+    if old:
+        cols, meta = _open(str(root / old[0]))
+        prev = _partition_rows(cols, meta, symbol, range(len(cols["t"])))
+        prev_t = [int(x) for x in cols["t"]]
+    else:
+        prev, prev_t = [], []
+    # Old and new rows share one layout: (t, (symbol, price, as_of, currency, source, created_at, id))
+    merged = list(zip(prev_t, prev)) + [(r[2], (symbol, r[1], r[6] or ms_to_iso(r[2]), r[3], r[4], _created_text(r[5]), r[0])) for r in rows]
+    merged.sort(key=lambda m: (m[0], m[1][6]))
+    sources = sorted({m[1][4] for m in merged})
+    currencies = sorted({m[1][3] for m in merged}, key=lambda c: (c is None, c or ""))
+    meta = {"sources": sources, "currencies": currencies, "as_of": {}, "created_at": {}}
+    created = np.zeros(len(merged), dtype=np.int64)
+    for i, (ms, row) in enumerate(merged):
+        if ms_to_iso(ms) != row[2]:
+            meta["as_of"][i] = row[2]
+        sec = iso_to_ms(row[5]) if row[5] else None
+        if sec is not None and _created_text(sec // 1000) == row[5]:
+            created[i] = sec // 1000
+        else:
+            meta["created_at"][i] = row[5]
+    cols = {
+        "t": np.array([m[0] for m in merged], dtype=np.int64),
+        "id": np.array([m[1][6] for m in merged], dtype=np.int64),
+        "price": np.array([m[1][1] for m in merged], dtype=np.float64),
+        "created": created,
+        "source": np.array([sources.index(m[1][4]) for m in merged], dtype=np.int16),
+        "currency": np.array([currencies.index(m[1][3]) for m in merged], dtype=np.int16),
+    }
+    rel = _write(root, symbol, key, cols, meta)
+    try:
+        conn.execute(
+            """
+            INSERT INTO price_archive(symbol, month, path, rows, t_min, t_max, end_t) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(symbol, month) DO UPDATE SET path = excluded.path, rows = excluded.rows,
+                t_min = excluded.t_min, t_max = excluded.t_max, archived_at = datetime('now');
+            """,
+            (symbol, key, rel, len(merged), int(cols["t"][0]), int(cols["t"][-1]), (end - _EPOCH) // timedelta(seconds=1)),
+        )
+        conn.executemany("DELETE FROM price_ticks WHERE id = ?;", [(r[0],) for r in rows])
+    except Exception:
+        shutil.rmtree(root / rel, ignore_errors=True)
+        raise
+    return len(rows)
+
+
+def archive_prices(
+    conn: sqlite3.Connection,
+    *,
+    before: Optional[str] = None,
+    symbol: Optional[str] = None,
+    root: Optional[Path] = None,
+) -> Dict[str, int]:
+    """
+    Move raw ticks from whole months before `before` (default ARCHIVE_AFTER_DAYS ago) out of SQLite into
+    columnar partitions, one short transaction per symbol/month. Re-running picks up late ticks and rewrites
+    those partitions. Each symbol's two newest ticks stay in SQLite for latest_quotes, and price_bars is left
+    as is (the ticks are already rolled up). Returns {"partitions", "rows"}.
+    """
+    root = root or archive_root()
+    cutoff_ms = iso_to_ms(before) if before else iso_to_ms((datetime.now(timezone.utc) - timedelta(days=archive_after_days())).isoformat())
+    if cutoff_ms is None:
+        raise ValueError(f"Invalid date: {before!r}")
+    cutoff = _month_start(cutoff_ms)
+    if symbol:
+        symbols = [symbol]
+    else:
+        cutoff_at = (cutoff - _EPOCH) // timedelta(milliseconds=1)
+        symbols = [
+            r[0] for r in conn.execute(
+                "SELECT name FROM symbols s WHERE EXISTS (SELECT 1 FROM price_ticks p WHERE p.symbol_id = s.id AND p.t < ?);",
+                (cutoff_at,),
+            )
+        ]
+    stale: List[str] = []
+    partitions = moved = 0
+    for sym in symbols:
+        first_ms = conn.execute(
+            "SELECT MIN(t) FROM price_ticks WHERE symbol_id = (SELECT id FROM symbols WHERE name = ?);", (sym,)
+        ).fetchone()[0]
+        if first_ms is None:
+            continue
+        month = _month_start(first_ms)
+        while month < cutoff:
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE;")
+            try:
+                old = conn.execute("SELECT path FROM price_archive WHERE symbol = ? AND month = ?;", (sym, month.strftime("%Y-%m"))).fetchone()
+                n = _archive_month(conn, root, sym, month)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            if n:
+                partitions += 1
+                moved += n
+                if old:
+                    stale.append(old[0])
+            month = _next_month(month)
+    if stale:
+        _open.cache_clear()
+        for rel in stale:
+            shutil.rmtree(root / rel, ignore_errors=True)
+    return {"partitions": partitions, "rows": moved}
+
+
+def drop_partitions(conn: sqlite3.Connection, *, before: int, symbol: str, root: Optional[Path] = None) -> int:
+    """
+    Delete a symbol's archived months that end at or before epoch second `before` (retention), in one short
+    transaction, then their directories. Returns the number of ticks removed.
+    """
+    root = root or archive_root()
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE;")
+    try:
+        parts = conn.execute(
+            "DELETE FROM price_archive WHERE symbol = ? AND end_t <= ? RETURNING path, rows;", (symbol, int(before))
+        ).fetchall()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if parts:
+        _open.cache_clear()
+        for rel, _n in parts:
+            shutil.rmtree(root / rel, ignore_errors=True)
+    return sum(int(n) for _rel, n in parts)
+
+
+def archive_stats(conn: sqlite3.Connection, *, root: Optional[Path] = None) -> Dict[str, Any]:
+    root = root or archive_root()
+    row = conn.execute("SELECT COUNT(*), COALESCE(SUM(rows), 0), COUNT(DISTINCT symbol) FROM price_archive;").fetchone()
+    size = sum(f.stat().st_size for f in root.rglob("*.npy")) if root.exists() else 0
+    return {"partitions": int(row[0]), "rows": int(row[1]), "symbols": int(row[2]), "bytes": size, "dir": str(root)}
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    ROOT = Path(__file__).resolve().parents[1]
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    from app.db import get_connection, init_db
+
+    parser = argparse.ArgumentParser(description="Compact old raw price ticks into the columnar archive")
+    parser.add_argument("command", choices=["compact", "stats"])
+    parser.add_argument("--before", help="archive whole months before this date (default: ARCHIVE_AFTER_DAYS ago)")
+    parser.add_argument("--symbol", help="limit to one symbol")
+    args = parser.parse_args()
+    with get_connection() as conn:
+        init_db(conn)
+        if args.command == "compact":
+            done = archive_prices(conn, before=args.before, symbol=args.symbol)
+            print(f"[archive] Moved {done['rows']} ticks into {done['partitions']} partitions.")
+        else:
+            print(json.dumps(archive_stats(conn)))
@@ -0,0 +1,358 @@
+from __future__ import annotations
+
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Supported bar sizes in seconds
+INTERVALS = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "15m": 15 * 60,
+    "1h": 60 * 60,
+    "4h": 4 * 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+# Bar sizes materialized in price_bars. Each is a multiple of the next smaller one (coarser levels are built
+# from finer ones), and every entry in INTERVALS is a multiple of at least one of them.
+ROLLUPS = {
+    "1m": 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+
+def interval_seconds(interval: str) -> int:
+    try:
+        return INTERVALS[interval]
+    except KeyError:
+        raise ValueError(f"Unsupported interval {interval!r}; use one of {', '.join(INTERVALS)}")
+
+
+def rollup_for(interval: str) -> str:
+    """Coarsest rollup whose buckets tile the requested interval exactly."""
+    sec = interval_seconds(interval)
+    return max((r for r, rsec in ROLLUPS.items() if sec % rsec == 0), key=ROLLUPS.__getitem__)
+
+
+def epoch_to_iso(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def iso_to_ms(value: Any) -> Optional[int]:
+    """Epoch milliseconds of an ISO8601 year, month, date or datetime (naive means UTC); None when unparseable."""
+    text = str(value).strip().replace("Z", "+00:00")
+    if len(text) in (4, 7):
+        text += "-01" * ((10 - len(text)) // 3)
+    try:
+        dt = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
+
+
+def ms_to_iso(ms: int) -> str:
+    """Canonical as_of text of a tick time (same as AS_OF_SQL): whole seconds end in Z, otherwise .fffZ."""
+    dt = _EPOCH + timedelta(milliseconds=int(ms))
+    return dt.strftime("%Y-%m-%dT%H:%M:%S") + (f".{int(ms) % 1000:03d}Z" if int(ms) % 1000 else "Z")
+
+
+def as_of_sql(col: str) -> str:
+    """SQL for ms_to_iso of an epoch-ms column."""
+    return (
+        f"strftime('%Y-%m-%dT%H:%M:%S', {col} / 1000, 'unixepoch') "
+        f"|| CASE WHEN {col} % 1000 = 0 THEN 'Z' ELSE printf('.%03dZ', {col} % 1000) END"
+    )
+
+
+# ===== Rollup maintenance =====
+def _aggregate_sql(where: str) -> str:
+    """
+    One OHLC row per (symbol, bucket) over the raw ticks matching `where` (price_ticks p joined to symbols s).
+    Binds the bucket size twice. The (epoch-ms time, id) keys of the open/close ticks are kept so later merges
+    can tell which tick came first.
+    """
+    return f"""
+        WITH t AS (
+            SELECT s.name AS symbol, p.t / 1000 / ? * ? AS b, p.price, p.t AS as_of, p.id
+            FROM price_ticks p JOIN symbols s ON s.id = p.symbol_id
+            WHERE {where}
+        ),
+        w AS (
+            SELECT symbol, b,
+                FIRST_VALUE(price) OVER win AS open,
+                MAX(price) OVER win AS high,
+                MIN(price) OVER win AS low,
+                LAST_VALUE(price) OVER win AS close,
+                COUNT(*) OVER win AS n,
+                FIRST_VALUE(as_of) OVER win AS open_at,
+                FIRST_VALUE(id) OVER win AS open_id,
+                LAST_VALUE(as_of) OVER win AS close_at,
+                LAST_VALUE(id) OVER win AS close_id,
+                ROW_NUMBER() OVER win AS rn
+            FROM t
+            WHERE b IS NOT NULL
+            WINDOW win AS (PARTITION BY symbol, b ORDER BY as_of, id ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+        )
+    """
+
+
+# Per-write scratch table: the new ticks aggregated to the finest rollup, then each coarser rollup from the one below
+_DELTA_DDL = """
+    CREATE TEMP TABLE IF NOT EXISTS bar_delta (
+        sec INTEGER, symbol TEXT, t INTEGER, open REAL, high REAL, low REAL, close REAL, n INTEGER,
+        open_at INTEGER, open_id INTEGER, close_at INTEGER, close_id INTEGER
+    );
+"""
+
+# Buckets of one level never overlap in time, so ordering them by t orders their open/close ticks too
+_COARSEN_SQL = """
+    INSERT INTO temp.bar_delta
+    SELECT ?, symbol, b, open, high, low, close, n, open_at, open_id, close_at, close_id FROM (
+        SELECT symbol, t / ? * ? AS b,
+            FIRST_VALUE(open) OVER win AS open,
+            MAX(high) OVER win AS high,
+            MIN(low) OVER win AS low,
+            LAST_VALUE(close) OVER win AS close,
+            SUM(n) OVER win AS n,
+            FIRST_VALUE(open_at) OVER win AS open_at,
+            FIRST_VALUE(open_id) OVER win AS open_id,
+            LAST_VALUE(close_at) OVER win AS close_at,
+            LAST_VALUE(close_id) OVER win AS close_id,
+            ROW_NUMBER() OVER win AS rn
+        FROM temp.bar_delta
+        WHERE sec = ?
+        WINDOW win AS (PARTITION BY symbol, t / ? ORDER BY t ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING)
+    )
+    WHERE rn = 1;
+"""
+
+_MERGE_SQL = """
+    INSERT INTO price_bars(symbol, interval, t, open, high, low, close, n, open_at, open_id, close_at, close_id)
+    SELECT symbol, ?, t, open, high, low, close, n, open_at, open_id, close_at, close_id FROM temp.bar_delta WHERE sec = ?
+    ON CONFLICT(symbol, interval, t) DO UPDATE SET
+        open = CASE WHEN (excluded.open_at, excluded.open_id) < (open_at, open_id) THEN excluded.open ELSE open END,
+        open_at = CASE WHEN (excluded.open_at, excluded.open_id) < (open_at, open_id) THEN excluded.open_at ELSE open_at END,
+        open_id = CASE WHEN (excluded.open_at, excluded.open_id) < (open_at, open_id) THEN excluded.open_id ELSE open_id END,
+        high = MAX(high, excluded.high),
+        low = MIN(low, excluded.low),
+        close = CASE WHEN (excluded.close_at, excluded.close_id) > (close_at, close_id) THEN excluded.close ELSE close END,
+        close_at = CASE WHEN (excluded.close_at, excluded.close_id) > (close_at, close_id) THEN excluded.close_at ELSE close_at END,
+        close_id = CASE WHEN (excluded.close_at, excluded.close_id) > (close_at, close_id) THEN excluded.close_id ELSE close_id END,
+        n = n + excluded.n;
+"""
+
+
+def _fold_ticks(conn: sqlite3.Connection, where: str, params: Tuple[Any, ...]) -> int:
+    """Merge the raw ticks matching `where` into every rollup; returns bar rows written."""
+    levels = sorted(ROLLUPS.items(), key=lambda kv: kv[1])
+    conn.execute(_DELTA_DDL)
+    conn.execute("DELETE FROM temp.bar_delta;")
+    finest = levels[0][1]
+    conn.execute(
+        _aggregate_sql(where)
+        + " INSERT INTO temp.bar_delta SELECT ?, symbol, b, open, high, low, close, n, open_at, open_id, close_at, close_id FROM w WHERE rn = 1;",
+        (finest, finest, *params, finest),
+    )
+    written = 0
+    prev = finest
+    for name, sec in levels:
+        if sec != prev:
+            conn.execute(_COARSEN_SQL, (sec, sec, sec, prev, sec))
+            prev = sec
+        before = conn.total_changes
+        conn.execute(_MERGE_SQL, (name, sec))
+        written += conn.total_changes - before
+    conn.execute("DELETE FROM temp.bar_delta;")
+    return written
+
+
+def update_rollups(conn: sqlite3.Connection, *, after_id: int, until_id: Optional[int] = None) -> None:
+    """
+    Fold newly inserted price rows (after_id < id <= until_id) into every rollup.
+    Only the buckets those rows fall in are touched, so late or out-of-order ticks cost the same as fresh ones.
+    Call inside the inserting transaction; the caller commits.
+    """
+    if until_id is None:
+        _fold_ticks(conn, "p.id > ?", (int(after_id),))
+    else:
+        _fold_ticks(conn, "p.id > ? AND p.id <= ?", (int(after_id), int(until_id)))
+
+
+# Raw ticks before a symbol's cold mark were archived (app.archive) or deleted by retention (app.maintenance);
+# bars before it are kept as rolled up. Early migrations rebuild before those tables exist, so only present ones count.
+_COLD_MARKS = {
+    "price_archive": "(SELECT MAX(a.end_t) FROM price_archive a WHERE a.symbol = {0})",
+    "price_retention": "(SELECT r.end_t FROM price_retention r WHERE r.symbol = {0})",
+}
+
+
+def _hot_clauses(conn: sqlite3.Connection) -> Optional[Tuple[str, str]]:
+    """WHERE clauses (ticks, bars) selecting the periods still backed by raw ticks; None before price_ticks exists."""
+    have = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('price_ticks', 'price_archive', 'price_retention');"
+        )
+    }
+    if "price_ticks" not in have:
+        return None
+    marks = [sql for name, sql in _COLD_MARKS.items() if name in have]
+
+    def mark(col: str) -> str:
+        return "MAX(" + ", ".join([f"COALESCE({m.format(col)}, 0)" for m in marks] + ["0"]) + ")" if marks else "0"
+
+    return f"p.t / 1000 >= {mark('s.name')}", f"t >= {mark('price_bars.symbol')}"
+
+
+def rebuild_rollups(conn: sqlite3.Connection, *, symbol: Optional[str] = None) -> int:
+    """
+    Recompute price_bars from raw prices (all symbols or one); for backfills and after deletes.
+    Archived and retention-pruned periods keep their bars. Runs in the caller's transaction (commit afterwards).
+    Returns the number of bar rows written.
+    """
+    hot = _hot_clauses(conn)
+    if hot is None:
+        # Ticks are still in the legacy prices table; _migration_price_ticks rebuilds after moving them
+        return 0
+    hot_ticks, hot_bars = hot
+    where, params = ("symbol = ?", (symbol,)) if symbol else ("1 = 1", ())
+    conn.execute(f"DELETE FROM price_bars WHERE {where} AND {hot_bars};", params)
+    return _fold_ticks(conn, f"{'s.name = ?' if symbol else '1 = 1'} AND {hot_ticks}", params)
+
+
+def check_rollups(conn: sqlite3.Connection, *, symbol: Optional[str] = None) -> List[Tuple[str, str, str]]:
+    """
+    Compare price_bars with a fresh aggregation of raw prices (after any archived months); returns
+    (interval, symbol, t) of every mismatched bar.
+    """
+    hot = _hot_clauses(conn)
+    if hot is None:
+        return []
+    hot_ticks, hot_bars = hot
+    where, params = ("symbol = ?", (symbol,)) if symbol else ("1 = 1", ())
+    bad: List[Tuple[str, str, str]] = []
+    for name, sec in ROLLUPS.items():
+        sql = _aggregate_sql(f"{'s.name = ?' if symbol else '1 = 1'} AND {hot_ticks}") + f"""
+            , fresh AS (SELECT symbol, b AS t, open, high, low, close, n FROM w WHERE rn = 1),
+            stored AS (SELECT symbol, t, open, high, low, close, n FROM price_bars WHERE interval = ? AND {where} AND {hot_bars})
+            SELECT symbol, t FROM (SELECT * FROM fresh EXCEPT SELECT * FROM stored)
+            UNION
+            SELECT symbol, t FROM (SELECT * FROM stored EXCEPT SELECT * FROM fresh)
+            ORDER BY symbol, t;
+        """
+        for sym, t in conn.execute(sql, (sec, sec, *params, name, *params)).fetchall():
+            bad.append((name, sym, epoch_to_iso(t)))
+    return bad
+
+
+# ===== Queries =====
+def bars_version(conn: sqlite3.Connection, *, symbol: str, interval: str) -> Optional[Tuple[Any, ...]]:
+    """
+    (t, n, close_at, close_id) of the symbol's newest bar in the interval's rollup, close_at being the as_of
+    of its last tick; changes whenever a tick lands in the latest bar. None when the symbol has no bars.
+    Used to key caches of derived series.
+    """
+    row = conn.execute(
+        "SELECT t, n, close_at, close_id FROM price_bars WHERE symbol = ? AND interval = ? ORDER BY t DESC LIMIT 1;",
+        (symbol, rollup_for(interval)),
+    ).fetchone()
+    return (row[0], row[1], ms_to_iso(row[2]), row[3]) if row else None
+
+
+def query_bars(
+    conn: sqlite3.Connection,
+    *,
+    symbol: str,
+    interval: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 500,
+) -> List[Tuple[Any, ...]]:
+    """
+    OHLC bars for a symbol, oldest first: (t, open, high, low, close, count).
+    `t` is the bucket start (ISO8601 UTC); empty buckets produce no bar. Bars are merged from the coarsest
+    rollup that tiles the interval, so a 4h bar reads four 1h rows rather than every tick. `start`/`end`
+    select whole bars (by bucket start). With `start`, the first `limit` bars from it are returned; without it,
+    the latest `limit` bucket periods, counted back from the symbol's newest bar at or before `end`.
+    Raises ValueError for an unknown interval or a `start`/`end` that is not an ISO8601 date/time.
+    """
+    sec = interval_seconds(interval)
+    bounds: Dict[str, Optional[int]] = {}
+    for name, value in (("start", start), ("end", end)):
+        ms = iso_to_ms(value) if value else None
+        if value and ms is None:
+            raise ValueError(f"{name} must be an ISO8601 date/time")
+        bounds[name] = None if ms is None else ms // 1000
+    rollup = rollup_for(interval)
+    clauses = ["symbol = ?", "interval = ?"]
+    params: List[Any] = [symbol, rollup]
+    if bounds["end"] is not None:
+        clauses.append("t <= ?")
+        params.append(bounds["end"])
+    forward = bounds["start"] is not None
+    if not forward:
+        latest = conn.execute(
+            f"SELECT MAX(t) FROM price_bars WHERE {' AND '.join(clauses)};",
+            tuple(params),
+        ).fetchone()
+        if not latest or latest[0] is None:
+            return []
+        clauses.append("t >= ?")
+        params.append((int(latest[0]) // sec - (int(limit) - 1)) * sec)
+    else:
+        clauses.append("t >= ?")
+        params.append(bounds["start"] // sec * sec)
+    # Walk the primary key away from the anchor (forward from start, else back from the newest bar) and fold
+    # consecutive rollup rows into their bar
+    sql = f"SELECT t, open, high, low, close, n FROM price_bars WHERE {' AND '.join(clauses)} ORDER BY t {'ASC' if forward else 'DESC'};"
+    bars: List[List[Any]] = []
+    for t, o, h, lo, c, n in conn.execute(sql, tuple(params)):
+        b = int(t) // sec * sec
+        if bars and bars[-1][0] == b:
+            bar = bars[-1]
+            bar[4 if forward else 1] = c if forward else o
+            bar[2] = max(bar[2], h)
+            bar[3] = min(bar[3], lo)
+            bar[5] += n
+            continue
+        if len(bars) >= int(limit):
+            break
+        bars.append([b, o, h, lo, c, n])
+    if not forward:
+        bars.reverse()
+    return [(epoch_to_iso(b), o, h, lo, c, n) for b, o, h, lo, c, n in bars]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ROOT = Path(__file__).resolve().parents[1]
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    from app.db import get_connection, init_db
+
+    parser = argparse.ArgumentParser(description="Maintain the price_bars rollup tables")
+    parser.add_argument("command", choices=["rebuild", "check"])
+    parser.add_argument("--symbol", help="limit to one symbol")
+    args = parser.parse_args()
+    with get_connection() as conn:
+        init_db(conn)
+        if args.command == "rebuild":
+            written = rebuild_rollups(conn, symbol=args.symbol)
+            conn.commit()
+            print(f"[bars] Rebuilt {written} bar rows.")
+        else:
+            bad = check_rollups(conn, symbol=args.symbol)
+            for name, sym, t in bad:
+                print(f"[bars] mismatch {name} {sym} {t}")
+            print(f"[bars] {len(bad)} mismatched bars.")
+            sys.exit(1 if bad else 0)
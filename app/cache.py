@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+# (symbol, price, as_of, currency, source, created_at, prev_price) as returned by app.db.latest_quotes
+QuoteRow = Tuple[Any, ...]
+
+
+class LatestPriceCache:
+    """
+    Bounded LRU of the latest quote per (database, symbol).
+    Reads fill it from SQLite; insert_price writes through so in-process ingest is visible immediately.
+    Entries also expire after `ttl` seconds so writes made by other processes (CLI ingest) show up.
+    Requested spellings that resolved to a differently cased stored symbol are remembered as aliases
+    (same size bound and ttl), so they are served from the stored symbol's entry.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 30.0) -> None:
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, Tuple[int, int], QuoteRow]]" = OrderedDict()
+        self._aliases: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: str, symbol: str) -> Optional[QuoteRow]:
+        k = (db, symbol)
+        with self._lock:
+            alias = self._aliases.get(k)
+            if k not in self._data and alias is not None:
+                if self.ttl > 0 and time.monotonic() - alias[0] > self.ttl:
+                    del self._aliases[k]
+                else:
+                    k = (db, alias[1])
+            entry = self._data.get(k)
+            if entry is None or (self.ttl > 0 and time.monotonic() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self._data[k]
+                self.misses += 1
+                return None
+            self._data.move_to_end(k)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, db: str, row: QuoteRow, *, key: Tuple[int, int], requested: Optional[str] = None) -> None:
+        """
+        Store `row` as the latest quote; `key` is its (epoch-ms time, id) sort key. `requested` is the spelling
+        the caller asked for when it differs from the stored symbol row[0].
+        """
+        k = (db, str(row[0]))
+        with self._lock:
+            self._data[k] = (time.monotonic(), key, tuple(row))
+            self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            if requested is not None and requested != k[1]:
+                self._aliases[(db, requested)] = (time.monotonic(), k[1])
+                self._aliases.move_to_end((db, requested))
+                while len(self._aliases) > self.maxsize:
+                    self._aliases.popitem(last=False)
+
+    def observe(self, db: str, row: QuoteRow, *, key: Tuple[int, int]) -> None:
+        """
+        Write-through for a newly stored price row (symbol, price, as_of, currency, source, created_at).
+        A newer row becomes the latest and the cached price becomes its prev_price.
+        An older (back-filled) row may change prev_price, so that entry is dropped instead.
+        """
+        k = (db, str(row[0]))
+        with self._lock:
+            # A symbol stored under exactly this spelling now wins over the case-insensitive match
+            self._aliases.pop(k, None)
+            entry = self._data.get(k)
+            if entry is None:
+                return
+            _, cur_key, cur = entry
+            if key > cur_key:
+                self._data[k] = (time.monotonic(), key, tuple(row[:6]) + (cur[1],))
+                self._data.move_to_end(k)
+            else:
+                del self._data[k]
+
+    def invalidate(self, db: Optional[str] = None, symbol: Optional[str] = None) -> None:
+        with self._lock:
+            if db is None and symbol is None:
+                self._data.clear()
+                self._aliases.clear()
+                return
+            for k in [k for k in self._data if (db is None or k[0] == db) and (symbol is None or k[1] == symbol)]:
+                del self._data[k]
+            for k in [k for k in self._aliases if (db is None or k[0] == db) and (symbol is None or k[1] == symbol)]:
+                del self._aliases[k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+class ResultCache:
+    """
+    Bounded LRU for derived results (indicator series and the like) with an optional TTL.
+    Callers put a data version (e.g. the last bar's as_of) in the key, so new data simply misses.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 0.0) -> None:
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl > 0 and time.monotonic() - entry[0] > self.ttl):
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+quote_cache = LatestPriceCache(
+    maxsize=int(os.getenv("QUOTE_CACHE_SIZE") or 4096),
+    ttl=float(os.getenv("QUOTE_CACHE_TTL") or 30),
+)
+
+indicator_cache = ResultCache(
+    maxsize=int(os.getenv("INDICATOR_CACHE_SIZE") or 256),
+    ttl=float(os.getenv("INDICATOR_CACHE_TTL") or 600),
+)
+
+performance_cache = ResultCache(
+    maxsize=int(os.getenv("PERFORMANCE_CACHE_SIZE") or 64),
+    ttl=float(os.getenv("PERFORMANCE_CACHE_TTL") or 3600),
+)
@@ -8,13 +8,16 @@ ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
+from app.bars import rebuild_rollups
 from app.db import get_connection, init_db
 
 
 def main() -> None:
     with get_connection() as conn:
         init_db(conn)
-        cur = conn.execute("DELETE FROM prices WHERE source = ?", ("demo",))
+        cur = conn.execute("DELETE FROM price_ticks WHERE source_id = (SELECT id FROM sources WHERE name = ?)", ("demo",))
+        if cur.rowcount:
+            rebuild_rollups(conn)
         conn.commit()
         print(f"[clear_demo] Deleted {cur.rowcount} demo price rows.")
 
@@ -1,9 +1,21 @@
 from __future__ import annotations
 
+import base64
+import json
+import logging
 import os
+import queue
 import sqlite3
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, Tuple, Optional, List, Any
+from typing import Iterable, Iterator, Tuple, Optional, List, Any
+
+from app.archive import archived_rows, drop_archived, find_archived
+from app.bars import as_of_sql, iso_to_ms, ms_to_iso, rebuild_rollups, update_rollups
+from app.cache import quote_cache
+from app.stream import price_hub
 
 
 DATA_DIR = Path("data")
@@ -20,17 +32,260 @@ def ensure_dir(path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
 
 
-def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
+@dataclass(frozen=True)
+class StorageProfile:
+    """SQLite PRAGMA settings applied to every connection (see `from_env` for overrides)."""
+
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024  # bytes
+    cache_size: int = -20000  # negative = KiB, i.e. ~20 MB page cache
+    busy_timeout: int = 5000  # ms
+    auto_vacuum: str = "INCREMENTAL"  # takes effect for new db files; existing ones need one full VACUUM
+
+    @classmethod
+    def from_env(cls) -> "StorageProfile":
+        d = cls()
+        return cls(
+            journal_mode=(os.getenv("DB_JOURNAL_MODE") or d.journal_mode).upper(),
+            synchronous=(os.getenv("DB_SYNCHRONOUS") or d.synchronous).upper(),
+            mmap_size=int(os.getenv("DB_MMAP_SIZE") or d.mmap_size),
+            cache_size=int(os.getenv("DB_CACHE_SIZE") or d.cache_size),
+            busy_timeout=int(os.getenv("DB_BUSY_TIMEOUT_MS") or d.busy_timeout),
+            auto_vacuum=(os.getenv("DB_AUTO_VACUUM") or d.auto_vacuum).upper(),
+        )
+
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNC_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_VACUUM_MODES = {"NONE", "FULL", "INCREMENTAL"}
+
+
+def apply_storage_profile(conn: sqlite3.Connection, profile: Optional[StorageProfile] = None, *, readonly: bool = False) -> None:
+    if profile is None:
+        profile = StorageProfile.from_env()
+    if profile.journal_mode not in _JOURNAL_MODES:
+        raise ValueError(f"Unsupported journal_mode: {profile.journal_mode}")
+    if profile.synchronous not in _SYNC_MODES:
+        raise ValueError(f"Unsupported synchronous: {profile.synchronous}")
+    if profile.auto_vacuum not in _VACUUM_MODES:
+        raise ValueError(f"Unsupported auto_vacuum: {profile.auto_vacuum}")
+    conn.execute(f"PRAGMA busy_timeout = {int(profile.busy_timeout)};")
+    if readonly:
+        # journal_mode is persisted in the db file by the writer; readers only refuse writes
+        conn.execute("PRAGMA query_only = ON;")
+    else:
+        # Must precede journal_mode: switching to WAL writes the header of a new file
+        conn.execute(f"PRAGMA auto_vacuum = {profile.auto_vacuum};")
+        conn.execute(f"PRAGMA journal_mode = {profile.journal_mode};")
+    conn.execute(f"PRAGMA synchronous = {profile.synchronous};")
+    conn.execute(f"PRAGMA mmap_size = {int(profile.mmap_size)};")
+    conn.execute(f"PRAGMA cache_size = {int(profile.cache_size)};")
+
+
+def get_connection(
+    db_path: Optional[Path] = None,
+    *,
+    check_same_thread: bool = True,
+    profile: Optional[StorageProfile] = None,
+) -> sqlite3.Connection:
     """Return a sqlite3 connection to the db; creates parent dir if needed."""
     if db_path is None:
         db_path = get_db_path()
     ensure_dir(db_path)
-    conn = sqlite3.connect(str(db_path))
+    conn = sqlite3.connect(str(db_path), check_same_thread=check_same_thread)
     conn.execute("PRAGMA foreign_keys = ON;")
+    apply_storage_profile(conn, profile)
     return conn
 
 
+def get_readonly_connection(
+    db_path: Optional[Path] = None,
+    *,
+    check_same_thread: bool = True,
+    profile: Optional[StorageProfile] = None,
+) -> sqlite3.Connection:
+    """Return a read-only (URI mode=ro) connection; the db file must already exist."""
+    if db_path is None:
+        db_path = get_db_path()
+    uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+    apply_storage_profile(conn, profile, readonly=True)
+    return conn
+
+
+# ===== Connection pool =====
+class ConnectionPool:
+    """
+    Bounded pool of long-lived sqlite3 connections for one database file.
+    Connections are opened lazily up to `size` and reused (most recently returned first).
+    Schema setup (init_db) runs once, when the pool opens its first connection.
+    A `readonly` pool hands out mode=ro connections so dashboard reads never take write locks.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        *,
+        size: int = 8,
+        timeout: float = 30.0,
+        readonly: bool = False,
+        profile: Optional[StorageProfile] = None,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.readonly = bool(readonly)
+        self.profile = profile or StorageProfile.from_env()
+        self.size = max(1, int(size))
+        self.timeout = float(timeout)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._closed = False
+        self._open = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    # Read-only connections cannot create tables, so set up schema on a short-lived writer
+                    setup = get_connection(self.db_path, profile=self.profile)
+                    try:
+                        init_db(setup)
+                    finally:
+                        setup.close()
+                    self._schema_ready = True
+        if self.readonly:
+            return get_readonly_connection(self.db_path, check_same_thread=False, profile=self.profile)
+        return get_connection(self.db_path, check_same_thread=False, profile=self.profile)
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._open < self.size
+                if create:
+                    self._open += 1
+                else:
+                    self._waits += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No free database connection after {self.timeout:.1f}s (pool size {self.size})")
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            self._in_use -= 1
+            discard = self._closed
+            if discard:
+                self._open -= 1
+        if discard:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection; commits on success, rolls back on error, then returns it to the pool."""
+        conn = self.acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self.release(conn)
+
+    def warm(self) -> None:
+        """Open one connection (running schema setup) ahead of the first request."""
+        with self.connection():
+            pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "db_path": str(self.db_path),
+                "readonly": self.readonly,
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": self._open - self._in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+            }
+
+
+_POOLS: dict[str, ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(db_path: Optional[Path] = None, *, readonly: bool = False) -> ConnectionPool:
+    """
+    Return the shared pool for db_path (defaults to DB_PATH).
+    Size/timeout come from DB_POOL_SIZE/DB_POOL_TIMEOUT (DB_READ_POOL_SIZE for the read-only pool).
+    """
+    if db_path is None:
+        db_path = get_db_path()
+    key = f"{Path(db_path).resolve()}|{'ro' if readonly else 'rw'}"
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            size = (os.getenv("DB_READ_POOL_SIZE") if readonly else None) or os.getenv("DB_POOL_SIZE") or 8
+            pool = ConnectionPool(
+                Path(db_path),
+                size=int(size),
+                timeout=float(os.getenv("DB_POOL_TIMEOUT") or 30),
+                readonly=readonly,
+            )
+            _POOLS[key] = pool
+    return pool
+
+
+def pooled_connection(db_path: Optional[Path] = None, *, readonly: bool = False):
+    """Context manager yielding a pooled connection: `with pooled_connection() as conn: ...`."""
+    return get_pool(db_path, readonly=readonly).connection()
+
+
+def close_pools() -> None:
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
+
+
 def init_db(conn: sqlite3.Connection) -> None:
+    # Replaced by price_ticks and a `prices` view in _migration_price_ticks; afterwards this is a no-op
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS prices (
@@ -160,9 +415,446 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
+    migrate(conn)
     conn.commit()
 
 
+# ===== Schema migrations =====
+# Planned secondary indexes: (name, table(columns)). Each mirrors the WHERE + ORDER BY of a hot query
+# so SQLite can seek and walk the index instead of scanning and sorting in a temp B-tree.
+INDEXES: List[Tuple[str, str]] = [
+    # get_latest_price / query_prices(symbol=...): covering for the latest-price lookup
+    ("ix_prices_symbol_as_of_id", "prices(symbol, as_of, id, price)"),
+    # query_prices without symbol (date-range and "latest N" scans)
+    ("ix_prices_as_of_id", "prices(as_of, id)"),
+    ("ix_journal_date_id", "journal(date, id)"),
+    ("ix_transactions_portfolio_date_id", "transactions(portfolio_id, date, id)"),
+    ("ix_entry_plans_symbol_created_id", "entry_plans(symbol, created_at, id)"),
+    ("ix_entry_plans_created_id", "entry_plans(created_at, id)"),
+]
+
+
+# The same two lookups on price_ticks, created by _migration_price_ticks (the prices ones go with that table)
+TICK_INDEXES: List[Tuple[str, str]] = [
+    ("ix_price_ticks_symbol_t_id", "price_ticks(symbol_id, t, id, price)"),
+    ("ix_price_ticks_t_id", "price_ticks(t, id)"),
+]
+
+
+def _migration_indexes(conn: sqlite3.Connection) -> None:
+    for name, target in INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target};")
+    conn.execute("ANALYZE;")
+
+
+def _create_price_bars(conn: sqlite3.Connection) -> None:
+    # price_bars with epoch-ms open_at/close_at, as converted by _migration_price_ticks
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_bars (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            t INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            n INTEGER NOT NULL,
+            open_at INTEGER NOT NULL,
+            open_id INTEGER NOT NULL,
+            close_at INTEGER NOT NULL,
+            close_id INTEGER NOT NULL,
+            PRIMARY KEY (symbol, interval, t)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def _migration_price_bars(conn: sqlite3.Connection) -> None:
+    # OHLC rollups per (symbol, bar size, bucket start epoch), kept current by the price insert helpers.
+    # open_at/open_id and close_at/close_id identify the first/last tick so out-of-order merges stay exact.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_bars (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            t INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            n INTEGER NOT NULL,
+            open_at TEXT NOT NULL,
+            open_id INTEGER NOT NULL,
+            close_at TEXT NOT NULL,
+            close_id INTEGER NOT NULL,
+            PRIMARY KEY (symbol, interval, t)
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_rollups(conn)
+
+
+def _migration_ict(conn: sqlite3.Connection) -> None:
+    # Market structure detected from price_bars by app.ict: one row per level plus a summary per (symbol, interval)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ict_levels (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            kind TEXT NOT NULL, -- swing_high, swing_low, fvg_bull, fvg_bear, eq_high, eq_low
+            t TEXT NOT NULL,
+            t2 TEXT,
+            price REAL NOT NULL,
+            price2 REAL,
+            filled_at TEXT,
+            PRIMARY KEY (symbol, interval, kind, t)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_ict_levels_symbol_interval_t ON ict_levels(symbol, interval, t);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ict_state (
+            symbol TEXT NOT NULL,
+            interval TEXT NOT NULL,
+            version TEXT NOT NULL,
+            ctx_t TEXT NOT NULL,
+            through_t TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            updated_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (symbol, interval)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+def _migration_positions(conn: sqlite3.Connection) -> None:
+    # Per-(portfolio, symbol) running totals kept by insert_transaction/delete_transaction
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS positions (
+            portfolio_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            qty REAL NOT NULL DEFAULT 0,
+            cost REAL NOT NULL DEFAULT 0, -- sum of BUY qty * price
+            buys REAL NOT NULL DEFAULT 0, -- sum of BUY qty
+            fees REAL NOT NULL DEFAULT 0,
+            n INTEGER NOT NULL DEFAULT 0, -- transactions contributing (row removed at 0)
+            updated_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (portfolio_id, symbol),
+            FOREIGN KEY (portfolio_id) REFERENCES portfolios(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        """
+    )
+    rebuild_positions(conn)
+
+
+def _migration_journal_tags(conn: sqlite3.Connection) -> None:
+    # One row per (normalized tag, journal row), kept by upsert_journal/delete_journal; journal.tags stays the display text
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS journal_tags (
+            tag TEXT NOT NULL,
+            journal_id INTEGER NOT NULL,
+            PRIMARY KEY (tag, journal_id),
+            FOREIGN KEY (journal_id) REFERENCES journal(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_journal_tags_journal_id ON journal_tags(journal_id);")
+    rows = conn.execute("SELECT id, tags FROM journal WHERE tags IS NOT NULL AND tags != ''").fetchall()
+    conn.executemany(
+        "INSERT OR IGNORE INTO journal_tags(tag, journal_id) VALUES (?, ?)",
+        [(t, rid) for rid, tags in rows for t in split_tags(tags)],
+    )
+
+
+# External-content FTS5 indexes: (fts table, content table, indexed columns). Triggers mirror every
+# insert/update/delete of the content row, so the index never needs a separate writer.
+FTS_TABLES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("entry_plans_fts", "entry_plans", ("symbol", "text", "notes")),
+    ("journal_fts", "journal", ("symbol", "notes", "tags")),
+]
+
+
+def _migration_fts(conn: sqlite3.Connection) -> None:
+    for fts, table, columns in FTS_TABLES:
+        cols = ", ".join(columns)
+        new = ", ".join(f"new.{c}" for c in columns)
+        old = ", ".join(f"old.{c}" for c in columns)
+        conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', content_rowid='id', "
+            "tokenize='porter unicode61');"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END;"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END;"
+        )
+        conn.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END;"
+        )
+        conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild');")
+
+
+def _migration_insights_cache(conn: sqlite3.Connection) -> None:
+    # LLM completions by content address (app.insights.insights_cache_key); evicted by age and LRU
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS insights_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT DEFAULT (datetime('now')),
+            last_hit_at TEXT DEFAULT (datetime('now'))
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_insights_cache_last_hit ON insights_cache(last_hit_at);")
+
+
+def _migration_images(conn: sqlite3.Connection) -> None:
+    # Preprocessed vision inputs addressed by sha256 of the stored bytes (app.images); source_digest skips re-work
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS images (
+            digest TEXT PRIMARY KEY,
+            source_digest TEXT,
+            mime TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            height INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            created_at TEXT DEFAULT (datetime('now')),
+            last_used_at TEXT DEFAULT (datetime('now'))
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_images_source_digest ON images(source_digest);")
+
+
+def _migration_price_archive(conn: sqlite3.Connection) -> None:
+    # Columnar partitions of archived raw ticks per symbol/month (app.archive); t_min/t_max are epoch ms,
+    # end_t (epoch s) is the month end: a symbol's raw history before MAX(end_t) lives in the archive.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_archive (
+            symbol TEXT NOT NULL,
+            month TEXT NOT NULL,
+            path TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            t_min INTEGER NOT NULL,
+            t_max INTEGER NOT NULL,
+            end_t INTEGER NOT NULL,
+            archived_at TEXT DEFAULT (datetime('now')),
+            PRIMARY KEY (symbol, month)
+        ) WITHOUT ROWID;
+        """
+    )
+    # Reads across all symbols walk partitions newest month first
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_price_archive_month ON price_archive(month, symbol);")
+
+
+# Epoch ms of an ISO8601 text column in SQL (NULL when unparseable); used to convert legacy rows
+_ISO_MS_SQL = "CAST(ROUND((julianday({}) - 2440587.5) * 86400000) AS INTEGER)"
+# as_of as it was written: the original text if kept, else the canonical text of the tick time
+TICK_AS_OF = f"COALESCE(p.as_of_text, {as_of_sql('p.t')})"
+
+
+def _migration_price_ticks(conn: sqlite3.Connection) -> None:
+    # Raw ticks: epoch-ms time and small integer keys into the symbols/sources dictionaries. Legacy text `prices`
+    # rows move into price_ticks (ids kept), then the table is replaced with a view of the same columns.
+    # Rows whose as_of cannot be parsed are dropped; rows that collide once normalised keep the oldest id.
+    # as_of_text keeps the original as_of when it differs from the canonical text of t, so reads are unchanged.
+    conn.execute("CREATE TABLE IF NOT EXISTS symbols (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);")
+    conn.execute("CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_ticks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol_id INTEGER NOT NULL REFERENCES symbols(id),
+            t INTEGER NOT NULL, -- epoch ms, UTC
+            source_id INTEGER NOT NULL REFERENCES sources(id),
+            price REAL NOT NULL,
+            currency TEXT,
+            created_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)), -- epoch s
+            as_of_text TEXT, -- original as_of when not the canonical text of t
+            UNIQUE(symbol_id, t, source_id)
+        );
+        """
+    )
+    legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prices';").fetchone()
+    dropped = 0
+    if legacy:
+        conn.execute("INSERT OR IGNORE INTO symbols(name) SELECT DISTINCT symbol FROM prices;")
+        conn.execute("INSERT OR IGNORE INTO sources(name) SELECT DISTINCT source FROM prices;")
+        before = conn.total_changes
+        conn.execute(
+            f"""
+            INSERT OR IGNORE INTO price_ticks(id, symbol_id, t, source_id, price, currency, created_at, as_of_text)
+            SELECT p.id, s.id, {_ISO_MS_SQL.format("p.as_of")}, src.id, p.price, p.currency,
+                COALESCE(CAST(strftime('%s', p.created_at) AS INTEGER), 0),
+                NULLIF(p.as_of, {as_of_sql(_ISO_MS_SQL.format("p.as_of"))})
+            FROM prices p JOIN symbols s ON s.name = p.symbol JOIN sources src ON src.name = p.source
+            WHERE julianday(p.as_of) IS NOT NULL
+            ORDER BY p.id;
+            """
+        )
+        dropped = conn.execute("SELECT COUNT(*) FROM prices;").fetchone()[0] - (conn.total_changes - before)
+        if dropped:
+            logging.warning("price_ticks migration dropped %d price rows with unparseable or duplicate as_of", dropped)
+        # Ids of archived or deleted ticks are never reused
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO sqlite_sequence(rowid, name, seq)
+            SELECT (SELECT rowid FROM sqlite_sequence WHERE name = 'price_ticks'), 'price_ticks', MAX(seq)
+            FROM sqlite_sequence WHERE name IN ('prices', 'price_ticks');
+            """
+        )
+        conn.execute("DROP TABLE prices;")
+    types = {r[1]: (r[2] or "").upper() for r in conn.execute("PRAGMA table_info(price_bars);")}
+    if types.get("open_at") == "TEXT":
+        # Rollups recorded their open/close ticks by as_of text; keep the bars (archived months have no ticks)
+        conn.execute("ALTER TABLE price_bars RENAME TO price_bars_text;")
+        _create_price_bars(conn)
+        conn.execute(
+            f"""
+            INSERT INTO price_bars
+            SELECT symbol, interval, t, open, high, low, close, n, {_ISO_MS_SQL.format("open_at")}, open_id,
+                {_ISO_MS_SQL.format("close_at")}, close_id
+            FROM price_bars_text;
+            """
+        )
+        conn.execute("DROP TABLE price_bars_text;")
+    conn.execute(
+        f"""
+        CREATE VIEW IF NOT EXISTS prices AS
+        SELECT p.id AS id, s.name AS symbol, p.price AS price, {TICK_AS_OF} AS as_of, p.currency AS currency,
+            src.name AS source, datetime(p.created_at, 'unixepoch') AS created_at
+        FROM price_ticks p JOIN symbols s ON s.id = p.symbol_id JOIN sources src ON src.id = p.source_id;
+        """
+    )
+    # Writes through the view for ad-hoc SQL and older tools; the app writes price_ticks directly
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS prices_insert INSTEAD OF INSERT ON prices BEGIN
+            INSERT OR IGNORE INTO symbols(name) VALUES (NEW.symbol);
+            INSERT OR IGNORE INTO sources(name) VALUES (NEW.source);
+            INSERT INTO price_ticks(symbol_id, t, source_id, price, currency, as_of_text) VALUES (
+                (SELECT id FROM symbols WHERE name = NEW.symbol), {_ISO_MS_SQL.format("NEW.as_of")},
+                (SELECT id FROM sources WHERE name = NEW.source), NEW.price, NEW.currency,
+                NULLIF(NEW.as_of, {as_of_sql(_ISO_MS_SQL.format("NEW.as_of"))})
+            );
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS prices_update INSTEAD OF UPDATE OF price, currency ON prices BEGIN
+            UPDATE price_ticks SET price = NEW.price, currency = NEW.currency WHERE id = OLD.id;
+        END;
+        """
+    )
+    conn.execute("CREATE TRIGGER IF NOT EXISTS prices_delete INSTEAD OF DELETE ON prices BEGIN DELETE FROM price_ticks WHERE id = OLD.id; END;")
+    for name, target in TICK_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target};")
+    conn.execute("ANALYZE;")
+    # Earlier rollup rebuilds ran before price_ticks existed
+    if legacy and (dropped or not conn.execute("SELECT 1 FROM price_bars LIMIT 1;").fetchone()):
+        rebuild_rollups(conn)
+
+
+def _migration_retention(conn: sqlite3.Connection) -> None:
+    # Per symbol, the epoch second before which retention (app.maintenance) deleted the raw ticks; their bars
+    # are kept
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_retention (
+            symbol TEXT PRIMARY KEY,
+            end_t INTEGER NOT NULL,
+            pruned_at TEXT DEFAULT (datetime('now'))
+        ) WITHOUT ROWID;
+        """
+    )
+    # Expiry purges (app.maintenance) delete in small batches by these columns
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_email_codes_expires ON email_codes(expires_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions(expires_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_images_last_used ON images(last_used_at);")
+
+
+def _migration_symbols_nocase(conn: sqlite3.Connection) -> None:
+    # /quotes falls back to a case-insensitive symbol lookup when there is no exact match
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_symbols_name_nocase ON symbols(name COLLATE NOCASE);")
+
+
+# Applied in order by init_db; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    _migration_indexes,
+    _migration_price_bars,
+    _migration_ict,
+    _migration_positions,
+    _migration_journal_tags,
+    _migration_fts,
+    _migration_insights_cache,
+    _migration_images,
+    _migration_price_archive,
+    _migration_price_ticks,
+    _migration_retention,
+    _migration_symbols_nocase,
+]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Apply pending migrations; returns the resulting schema version."""
+    version = int(conn.execute("PRAGMA user_version;").fetchone()[0])
+    for target, step in enumerate(MIGRATIONS, start=1):
+        if target <= version:
+            continue
+        step(conn)
+        conn.execute(f"PRAGMA user_version = {target};")
+        version = target
+    return version
+
+
+# ===== Keyset pagination =====
+def encode_cursor(*key: Any) -> str:
+    """Opaque page token for a sort key such as (as_of, id); pass back as `cursor` to continue after it."""
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, *, arity: int = 2) -> Tuple[Any, ...]:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        key = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != arity or not isinstance(key[-1], int):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    """Normalized tags from comma-separated text: trimmed, lower-cased, de-duplicated, sorted."""
+    return sorted({t.strip().lower() for t in (tags or "").split(",") if t.strip()})
+
+
+def _sync_journal_tags(conn: sqlite3.Connection, journal_id: int, tags: Optional[str]) -> None:
+    conn.execute("DELETE FROM journal_tags WHERE journal_id=?", (int(journal_id),))
+    conn.executemany(
+        "INSERT OR IGNORE INTO journal_tags(tag, journal_id) VALUES (?, ?)",
+        [(t, int(journal_id)) for t in split_tags(tags)],
+    )
+
+
 def upsert_journal(
     conn: sqlite3.Connection,
     *,
@@ -179,7 +871,7 @@ def upsert_journal(
     notes: Optional[str],
 ) -> int:
     if id:
-        conn.execute(
+        cur = conn.execute(
             """
             UPDATE journal
             SET symbol=?, date=?, direction=?, qty=?, entry=?, stop=?, exit=?, fees=?, tags=?, notes=?, updated_at=datetime('now')
@@ -187,6 +879,8 @@ def upsert_journal(
             """,
             (symbol, date, direction, float(qty), float(entry), stop, exit, float(fees), tags, notes, int(id)),
         )
+        if cur.rowcount:
+            _sync_journal_tags(conn, int(id), tags)
         conn.commit()
         return int(id)
     cur = conn.execute(
@@ -196,27 +890,35 @@ def upsert_journal(
         """,
         (symbol, date, direction, float(qty), float(entry), stop, exit, float(fees), tags, notes),
     )
-    conn.commit()
     lid = cur.lastrowid if cur and cur.lastrowid is not None else 0
+    _sync_journal_tags(conn, lid, tags)
+    conn.commit()
     return int(lid)
 
 
 def delete_journal(conn: sqlite3.Connection, *, id: int) -> int:
+    # Explicit rather than relying on ON DELETE CASCADE, which needs PRAGMA foreign_keys on this connection
+    conn.execute("DELETE FROM journal_tags WHERE journal_id=?", (int(id),))
     cur = conn.execute("DELETE FROM journal WHERE id=?", (int(id),))
     conn.commit()
     return cur.rowcount
 
 
-def query_journal(
-    conn: sqlite3.Connection,
+def journal_filters(
     *,
     symbol: Optional[str] = None,
     direction: Optional[str] = None,
     start: Optional[str] = None,
     end: Optional[str] = None,
     tag: Optional[str] = None,
-) -> List[Tuple[Any, ...]]:
-    clauses = []
+    tag_mode: str = "any",
+) -> Tuple[List[str], List[Any]]:
+    """
+    WHERE clauses and parameters for the journal filters shared by query_journal and the stats endpoint.
+    `tag` is one or more comma-separated tags matched exactly (case-insensitive) through journal_tags:
+    rows carrying any of them (tag_mode="any") or all of them (tag_mode="all").
+    """
+    clauses: List[str] = []
     params: List[Any] = []
     if symbol:
         clauses.append("symbol = ?")
@@ -230,15 +932,70 @@ def query_journal(
     if end:
         clauses.append("date <= ?")
         params.append(end)
-    if tag:
-        clauses.append("(tags LIKE ?)")
-        params.append(f"%{tag}%")
+    wanted = split_tags(tag)
+    if tag_mode not in ("any", "all"):
+        raise ValueError("tag_mode must be 'any' or 'all'")
+    # Correlated probes on the (tag, journal_id) primary key keep the journal walk in date-index order
+    probe = "EXISTS (SELECT 1 FROM journal_tags WHERE journal_tags.journal_id = journal.id AND tag {})"
+    if wanted and tag_mode == "all":
+        clauses.extend(probe.format("= ?") for _ in wanted)
+        params.extend(wanted)
+    elif wanted:
+        clauses.append(probe.format(f"IN ({', '.join('?' for _ in wanted)})"))
+        params.extend(wanted)
+    return clauses, params
+
+
+def query_journal(
+    conn: sqlite3.Connection,
+    *,
+    symbol: Optional[str] = None,
+    direction: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    tag: Optional[str] = None,
+    tag_mode: str = "any",
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> List[Tuple[Any, ...]]:
+    """
+    Journal rows newest first. Without `limit` the full (filtered) history is returned.
+    `cursor` (from encode_cursor(date, id)) seeks past the last row of the previous page.
+    """
+    clauses, params = journal_filters(symbol=symbol, direction=direction, start=start, end=end, tag=tag, tag_mode=tag_mode)
+    if cursor:
+        clauses.append("(date, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
     sql = (
         "SELECT id, symbol, date, direction, qty, entry, stop, exit, fees, tags, notes, created_at, updated_at "
-        f"FROM journal {where} ORDER BY date DESC, id DESC;"
+        f"FROM journal {where} ORDER BY date DESC, id DESC"
     )
-    return conn.execute(sql, tuple(params)).fetchall()
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return conn.execute(sql + ";", tuple(params)).fetchall()
+
+
+# Tick rows as the API returns them; `p` is price_ticks, `s` symbols and `src` sources
+TICK_COLUMNS = f"s.name, p.price, {TICK_AS_OF}, p.currency, src.name, datetime(p.created_at, 'unixepoch')"
+TICK_JOINS = "price_ticks p JOIN symbols s ON s.id = p.symbol_id JOIN sources src ON src.id = p.source_id"
+
+_INSERT_TICK_SQL = """
+    INSERT OR IGNORE INTO price_ticks(symbol_id, t, source_id, price, currency, as_of_text)
+    VALUES ((SELECT id FROM symbols WHERE name = ?), ?, (SELECT id FROM sources WHERE name = ?), ?, ?, ?)
+"""
+
+
+def _tick_params(r: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """_INSERT_TICK_SQL parameters of a validate_price_row row; as_of is kept only when it is not canonical."""
+    return (r[0], r[5], r[4], r[1], r[3], None if ms_to_iso(r[5]) == r[2] else r[2])
+
+
+def _intern(conn: sqlite3.Connection, rows: List[Tuple[Any, ...]]) -> None:
+    """Make sure the symbols and sources of (symbol, price, as_of, currency, source, t) rows have dictionary ids."""
+    conn.executemany("INSERT OR IGNORE INTO symbols(name) VALUES (?);", [(n,) for n in {r[0] for r in rows}])
+    conn.executemany("INSERT OR IGNORE INTO sources(name) VALUES (?);", [(n,) for n in {r[4] for r in rows}])
 
 
 def insert_price(
@@ -250,20 +1007,128 @@ def insert_price(
     currency: Optional[str],
     source: str,
 ) -> int:
-    cur = conn.execute(
-        """
-        INSERT OR IGNORE INTO prices(symbol, price, as_of, currency, source)
-        VALUES (?, ?, ?, ?, ?);
-        """,
-        (symbol, float(price), as_of, currency, source),
-    )
+    """Store one tick (as_of: any ISO8601 date/time, kept as epoch ms). Returns 1, or 0 for a duplicate."""
+    row = validate_price_row((symbol, price, as_of, currency, source))
+    if not drop_archived(conn, [row]):
+        return 0
+    _intern(conn, [row])
+    saved = conn.execute(
+        _INSERT_TICK_SQL.rstrip() + " RETURNING id, datetime(created_at, 'unixepoch');",
+        _tick_params(row),
+    ).fetchone()
+    if saved:
+        update_rollups(conn, after_id=int(saved[0]) - 1, until_id=int(saved[0]))
     conn.commit()
-    return cur.rowcount
+    if not saved:
+        return 0
+    as_of = row[2]
+    db = cache_db_key(conn)
+    if db:
+        quote_cache.observe(db, (symbol, row[1], as_of, currency, source, saved[1]), key=(row[5], int(saved[0])))
+    price_hub.publish({"symbol": symbol, "price": row[1], "as_of": as_of, "currency": currency, "source": source, "created_at": saved[1]})
+    return 1
+
+
+PRICE_FIELDS = ("symbol", "price", "as_of", "currency", "source")
+
+
+def validate_price_row(row: Any, default_source: Optional[str] = None) -> Tuple[Any, ...]:
+    """
+    Check one price row (a dict with PRICE_FIELDS keys, or a tuple in that order) the way insert_prices does.
+    Returns (symbol, price, as_of, currency, source, t) with t the epoch ms of as_of; raises ValueError.
+    """
+    if isinstance(row, dict):
+        symbol, price, as_of = row.get("symbol"), row.get("price"), row.get("as_of")
+        currency, source = row.get("currency"), row.get("source") or default_source
+    else:
+        try:
+            symbol, price, as_of, currency, source = (tuple(row) + (None,) * 5)[:5]
+        except TypeError:
+            raise ValueError(f"not a price row: {row!r}")
+        source = source or default_source
+    if not symbol or as_of in (None, "") or price is None or not source:
+        raise ValueError("symbol, price, as_of and source are required")
+    t = iso_to_ms(as_of)
+    if t is None:
+        raise ValueError(f"as_of is not an ISO8601 date/time: {as_of!r}")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ValueError(f"price is not a number: {price!r}")
+    return (str(symbol), price, str(as_of), currency, str(source), t)
+
+
+def insert_prices(
+    conn: sqlite3.Connection,
+    rows: Iterable[Any],
+    *,
+    source: Optional[str] = None,
+    chunk_size: int = 10000,
+) -> Tuple[int, int]:
+    """
+    Bulk INSERT OR IGNORE of price rows (dicts with PRICE_FIELDS keys, or tuples in that order),
+    fed to executemany in chunks inside a single transaction. `source` fills rows without one.
+    Returns (inserted, ignored). A malformed row raises ValueError and nothing is written.
+    """
+    received = 0
+    inserted = 0
+    chunk: List[Tuple[Any, ...]] = []
+
+    def flush() -> int:
+        fresh = drop_archived(conn, chunk)
+        _intern(conn, fresh)
+        before = conn.total_changes
+        conn.executemany(_INSERT_TICK_SQL, [_tick_params(r) for r in fresh])
+        return conn.total_changes - before
+
+    # Take the write lock before reading MAX(id) so every id above it belongs to this batch; one commit at the end
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE;")
+    try:
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM price_ticks;").fetchone()[0]
+        for row in rows:
+            try:
+                chunk.append(validate_price_row(row, source))
+            except ValueError as e:
+                raise ValueError(f"Row {received}: {e}")
+            received += 1
+            if len(chunk) >= chunk_size:
+                inserted += flush()
+                chunk = []
+        if chunk:
+            inserted += flush()
+        if inserted:
+            update_rollups(conn, after_id=int(max_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if inserted:
+        _after_bulk_prices(conn, after_id=int(max_id))
+    return inserted, received - inserted
+
+
+def _after_bulk_prices(conn: sqlite3.Connection, *, after_id: int) -> None:
+    """Refresh quote_cache and notify streams once per symbol touched by a bulk insert."""
+    # Bare columns with MAX() come from the row holding the max, i.e. the newest new row per symbol
+    newest = conn.execute(
+        f"""
+        SELECT s.name, p.price, MAX(p.t), p.currency, src.name, datetime(p.created_at, 'unixepoch'), p.as_of_text
+        FROM {TICK_JOINS} WHERE p.id > ? GROUP BY p.symbol_id;
+        """,
+        (after_id,),
+    ).fetchall()
+    db = cache_db_key(conn)
+    for symbol, price, t, currency, source, created_at, as_of_text in newest:
+        if db:
+            # Several new rows may have landed for the symbol, so prev_price must be re-read
+            quote_cache.invalidate(db, symbol)
+        price_hub.publish({"symbol": symbol, "price": price, "as_of": as_of_text or ms_to_iso(t), "currency": currency, "source": source, "created_at": created_at})
 
 
 def list_prices(conn: sqlite3.Connection, limit: int = 5) -> Iterable[Tuple]:
     return conn.execute(
-        "SELECT symbol, price, as_of, currency, source, created_at FROM prices ORDER BY id DESC LIMIT ?;",
+        f"SELECT {TICK_COLUMNS} FROM {TICK_JOINS} ORDER BY p.id DESC LIMIT ?;",
         (limit,),
     ).fetchall()
 
@@ -276,30 +1141,123 @@ def query_prices(
     end: Optional[str] = None,
     limit: int = 10,
     offset: int = 0,
+    cursor: Optional[str] = None,
 ) -> List[Tuple[Any, ...]]:
     """
-    Query prices with optional filters. as_of is stored as ISO8601 text, so lexical range works.
-    Returns list of tuples like list_prices.
+    Query prices with optional filters. start/end are ISO8601 dates or datetimes, compared as instants
+    (ticks are stored as epoch ms). Archived ticks (app.archive) are merged in. Returns list of tuples like list_prices.
+    """
+    rows, _ = query_prices_page(conn, symbol=symbol, start=start, end=end, limit=limit, offset=offset, cursor=cursor)
+    return rows
+
+
+def _ms_param(value: str, name: str) -> int:
+    t = iso_to_ms(value)
+    if t is None:
+        raise ValueError(f"{name} must be an ISO8601 date/time")
+    return t
+
+
+def query_prices_page(
+    conn: sqlite3.Connection,
+    *,
+    symbol: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Tuple[Any, ...]], Optional[str]]:
+    """
+    Like query_prices, but also returns the next_cursor for a full page (None otherwise).
+    With a cursor the query seeks on (t, id) and `offset` is ignored.
+    When part of the range is archived, the newest limit + offset rows of each tier are merged by time.
     """
+    before = decode_cursor(cursor) if cursor else None
     clauses = []
     params: List[Any] = []
     if symbol:
-        clauses.append("symbol = ?")
+        clauses.append("p.symbol_id = (SELECT id FROM symbols WHERE name = ?)")
         params.append(symbol)
     if start:
-        clauses.append("as_of >= ?")
-        params.append(start)
+        clauses.append("p.t >= ?")
+        params.append(_ms_param(start, "start"))
     if end:
-        clauses.append("as_of <= ?")
-        params.append(end)
+        clauses.append("p.t <= ?")
+        params.append(_ms_param(end, "end"))
+    if before:
+        clauses.append("(p.t, p.id) < (?, ?)")
+        params.extend([_ms_param(before[0], "cursor"), before[1]])
+        offset = 0
     where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
-    sql = (
-        "SELECT symbol, price, as_of, currency, source, created_at FROM prices "
-        f"{where} ORDER BY as_of DESC, id DESC LIMIT ? OFFSET ?;"
-    )
-    params.append(int(limit))
-    params.append(int(offset))
-    return conn.execute(sql, tuple(params)).fetchall()
+    sql = f"SELECT {TICK_COLUMNS}, p.id, p.t FROM {TICK_JOINS} {where} ORDER BY p.t DESC, p.id DESC LIMIT ? OFFSET ?;"
+    cold = archived_rows(conn, symbol=symbol, start=start, end=end, before=before, n=int(limit) + int(offset))
+    if cold:
+        rows = conn.execute(sql, (*params, int(limit) + int(offset), 0)).fetchall()
+        rows += [r + (iso_to_ms(r[2]),) for r in cold]
+        rows.sort(key=lambda r: (r[7], r[6]), reverse=True)
+        rows = rows[int(offset):int(offset) + int(limit)]
+    else:
+        rows = conn.execute(sql, (*params, int(limit), int(offset))).fetchall()
+    next_cursor = encode_cursor(rows[-1][2], rows[-1][6]) if rows and len(rows) == int(limit) else None
+    return [r[:6] for r in rows], next_cursor
+
+
+def cache_db_key(conn: sqlite3.Connection) -> Optional[str]:
+    """File path identifying conn's database in quote_cache; None for in-memory/temp dbs (not cached)."""
+    row = conn.execute("PRAGMA database_list;").fetchone()
+    return str(row[2]) if row and row[2] else None
+
+
+def latest_quotes(conn: sqlite3.Connection, *, symbols: List[str]) -> List[Tuple[Any, ...]]:
+    """
+    Latest row plus the previous price for each requested symbol.
+    Served from quote_cache where possible; misses are resolved in one statement that costs two seeks
+    on ix_price_ticks_symbol_t_id per symbol, however long its history is.
+    A symbol without an exact match is looked up case-insensitively (oldest such symbol first).
+    Returns (symbol, price, as_of, currency, source, created_at, prev_price) with the stored symbol name;
+    unknown symbols are omitted.
+    """
+    symbols = list(dict.fromkeys(s for s in symbols if s))
+    if not symbols:
+        return []
+    db = cache_db_key(conn)
+    found: dict[str, Tuple[Any, ...]] = {}
+    misses: List[str] = []
+    for sym in symbols:
+        hit = quote_cache.get(db, sym) if db else None
+        if hit is None:
+            misses.append(sym)
+        else:
+            found[sym] = hit
+    if misses:
+        values = ", ".join("(?)" for _ in misses)
+        sql = f"""
+            WITH req(symbol) AS (VALUES {values})
+            SELECT req.symbol, {TICK_COLUMNS},
+                (
+                    SELECT q.price FROM price_ticks q
+                    WHERE q.symbol_id = p.symbol_id AND (q.t, q.id) < (p.t, p.id)
+                    ORDER BY q.t DESC, q.id DESC LIMIT 1
+                ) AS prev_price,
+                p.t, p.id
+            FROM req
+            JOIN symbols s ON s.id = COALESCE(
+                (SELECT id FROM symbols WHERE name = req.symbol),
+                (SELECT id FROM symbols WHERE name = req.symbol COLLATE NOCASE ORDER BY id LIMIT 1)
+            )
+            JOIN price_ticks p ON p.id = (
+                SELECT l.id FROM price_ticks l WHERE l.symbol_id = s.id ORDER BY l.t DESC, l.id DESC LIMIT 1
+            )
+            JOIN sources src ON src.id = p.source_id;
+        """
+        for r in conn.execute(sql, tuple(misses)).fetchall():
+            row = tuple(r[1:8])
+            found[r[0]] = row
+            if db:
+                quote_cache.put(db, row, key=(int(r[8]), int(r[9])), requested=r[0])
+    # Differently cased requests for one symbol collapse into one row
+    return list({found[s][0]: found[s] for s in symbols if s in found}.values())
 
 
 def get_price(
@@ -309,16 +1267,19 @@ def get_price(
     as_of: str,
     source: str,
 ) -> Optional[Tuple[Any, ...]]:
-    return conn.execute(
-        """
-        SELECT symbol, price, as_of, currency, source, created_at
-        FROM prices
-        WHERE symbol = ? AND as_of = ? AND source = ?
-        ORDER BY id DESC
-        LIMIT 1;
+    t = iso_to_ms(as_of)
+    if t is None:
+        return None
+    row = conn.execute(
+        f"""
+        SELECT {TICK_COLUMNS}
+        FROM {TICK_JOINS}
+        WHERE p.symbol_id = (SELECT id FROM symbols WHERE name = ?) AND p.t = ?
+            AND p.source_id = (SELECT id FROM sources WHERE name = ?);
         """,
-        (symbol, as_of, source),
+        (symbol, t, source),
     ).fetchone()
+    return row or find_archived(conn, symbol=symbol, as_of=as_of, source=source)
 
 
 # Wealth helpers
@@ -354,6 +1315,32 @@ def delete_portfolio(conn: sqlite3.Connection, *, id: int) -> int:
     cur = conn.execute("DELETE FROM portfolios WHERE id=?", (int(id),)); conn.commit(); return cur.rowcount
 
 
+# Signed contribution of one transaction to its positions row: (qty, cost, buys, fees)
+_POSITION_DELTA_SQL = """
+    INSERT INTO positions(portfolio_id, symbol, qty, cost, buys, fees, n)
+    VALUES (?, ?,
+        CASE UPPER(?) WHEN 'BUY' THEN ? WHEN 'SELL' THEN -? ELSE 0 END,
+        CASE UPPER(?) WHEN 'BUY' THEN ? * ? ELSE 0 END,
+        CASE UPPER(?) WHEN 'BUY' THEN ? ELSE 0 END,
+        CASE WHEN UPPER(?) IN ('BUY', 'SELL') THEN ? ELSE 0 END,
+        1)
+    ON CONFLICT(portfolio_id, symbol) DO UPDATE SET
+        qty = qty + ? * excluded.qty,
+        cost = cost + ? * excluded.cost,
+        buys = buys + ? * excluded.buys,
+        fees = fees + ? * excluded.fees,
+        n = n + ?,
+        updated_at = datetime('now');
+"""
+
+
+def _apply_position(conn: sqlite3.Connection, portfolio_id: int, symbol: str, type: str, qty: float, price: float, fees: float, sign: int) -> None:
+    conn.execute(
+        _POSITION_DELTA_SQL,
+        (portfolio_id, symbol, type, qty, qty, type, qty, price, type, qty, type, fees, sign, sign, sign, sign, sign),
+    )
+
+
 def insert_transaction(
     conn: sqlite3.Connection,
     *,
@@ -374,6 +1361,8 @@ def insert_transaction(
         """,
         (int(portfolio_id), date, symbol, type, float(qty), float(price), float(fees), currency, notes),
     )
+    # Positions are order-independent totals, so a back-dated transaction is applied as the same delta
+    _apply_position(conn, int(portfolio_id), symbol, type, float(qty), float(price), float(fees), 1)
     conn.commit(); return int(cur.lastrowid or 0)
 
 
@@ -385,41 +1374,54 @@ def list_transactions(conn: sqlite3.Connection, *, portfolio_id: int) -> List[Tu
 
 
 def delete_transaction(conn: sqlite3.Connection, *, id: int) -> int:
-    cur = conn.execute("DELETE FROM transactions WHERE id=?", (int(id),)); conn.commit(); return cur.rowcount
+    row = conn.execute(
+        "DELETE FROM transactions WHERE id=? RETURNING portfolio_id, symbol, type, qty, price, fees",
+        (int(id),),
+    ).fetchone()
+    if row:
+        pid, symbol, typ, qty, price, fees = row
+        _apply_position(conn, int(pid), symbol, typ, float(qty or 0), float(price or 0), float(fees or 0), -1)
+        conn.execute("DELETE FROM positions WHERE portfolio_id=? AND symbol=? AND n <= 0", (int(pid), symbol))
+    conn.commit(); return 1 if row else 0
+
+
+def rebuild_positions(conn: sqlite3.Connection, *, portfolio_id: Optional[int] = None) -> None:
+    """Recompute the positions table from transactions (all portfolios or one); the caller commits."""
+    where, params = ("WHERE portfolio_id=?", (int(portfolio_id),)) if portfolio_id is not None else ("", ())
+    conn.execute(f"DELETE FROM positions {where}", params)
+    conn.execute(
+        f"""
+        INSERT INTO positions(portfolio_id, symbol, qty, cost, buys, fees, n)
+        SELECT portfolio_id, symbol,
+            TOTAL(CASE UPPER(type) WHEN 'BUY' THEN qty WHEN 'SELL' THEN -qty ELSE 0 END),
+            TOTAL(CASE UPPER(type) WHEN 'BUY' THEN qty * price ELSE 0 END),
+            TOTAL(CASE UPPER(type) WHEN 'BUY' THEN qty ELSE 0 END),
+            TOTAL(CASE WHEN UPPER(type) IN ('BUY', 'SELL') THEN fees ELSE 0 END),
+            COUNT(*)
+        FROM transactions {where}
+        GROUP BY portfolio_id, symbol
+        """,
+        params,
+    )
 
 
 def get_latest_price(conn: sqlite3.Connection, *, symbol: str) -> Optional[float]:
-    row = conn.execute(
-        "SELECT price FROM prices WHERE symbol=? ORDER BY as_of DESC, id DESC LIMIT 1",
-        (symbol,),
-    ).fetchone()
-    return float(row[0]) if row else None
+    rows = latest_quotes(conn, symbols=[symbol])
+    return float(rows[0][1]) if rows else None
 
 
 def compute_positions(conn: sqlite3.Connection, *, portfolio_id: int) -> List[dict]:
+    """Current positions from the maintained snapshot (one primary-key range read) valued at the latest prices."""
     rows = conn.execute(
-        "SELECT symbol, type, qty, price, fees FROM transactions WHERE portfolio_id=? ORDER BY date ASC, id ASC",
+        "SELECT symbol, qty, cost, buys FROM positions WHERE portfolio_id=? ORDER BY symbol",
         (int(portfolio_id),),
     ).fetchall()
-    # Aggregate by symbol
-    agg: dict[str, dict] = {}
-    for symbol, typ, qty, price, fees in rows:
-        if symbol not in agg:
-            agg[symbol] = {"qty": 0.0, "cost": 0.0, "fees": 0.0, "buys": 0.0}
-        if typ.upper() == "BUY":
-            agg[symbol]["qty"] += float(qty)
-            agg[symbol]["cost"] += float(qty) * float(price)
-            agg[symbol]["fees"] += float(fees)
-            agg[symbol]["buys"] += float(qty)
-        elif typ.upper() == "SELL":
-            agg[symbol]["qty"] -= float(qty)
-            agg[symbol]["fees"] += float(fees)
-        # DIV/CASH/FX ignored in position qty
+    # One batched (cache-first) lookup instead of a query per held symbol
+    latest = {r[0]: float(r[1]) for r in latest_quotes(conn, symbols=[r[0] for r in rows])}
     out = []
-    for sym, a in agg.items():
-        qty = a["qty"]
-        avg_cost = (a["cost"] / a["buys"]) if a["buys"] else 0.0
-        last = get_latest_price(conn, symbol=sym)
+    for sym, qty, cost, buys in rows:
+        avg_cost = (cost / buys) if buys else 0.0
+        last = latest.get(sym)
         mkt = (last * qty) if (last is not None) else None
         out.append({"symbol": sym, "qty": qty, "avg_cost": avg_cost, "last": last, "market_value": mkt})
     return out
@@ -452,26 +1454,29 @@ def list_entry_plans(
     symbol: Optional[str] = None,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
 ) -> List[Tuple[Any, ...]]:
+    """Newest first. `cursor` (from encode_cursor(created_at, id)) seeks past the previous page; offset is then ignored."""
+    clauses = []
+    params: List[Any] = []
     if symbol:
-        return conn.execute(
-            """
-            SELECT id, symbol, text, horizon, source, notes, images, created_at
-            FROM entry_plans
-            WHERE symbol = ?
-            ORDER BY created_at DESC, id DESC
-            LIMIT ? OFFSET ?
-            """,
-            (symbol, int(limit), int(offset)),
-        ).fetchall()
+        clauses.append("symbol = ?")
+        params.append(symbol)
+    if cursor:
+        clauses.append("(created_at, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+        offset = 0
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    params.extend([int(limit), int(offset)])
     return conn.execute(
-        """
+        f"""
         SELECT id, symbol, text, horizon, source, notes, images, created_at
         FROM entry_plans
+        {where}
         ORDER BY created_at DESC, id DESC
         LIMIT ? OFFSET ?
         """,
-        (int(limit), int(offset)),
+        tuple(params),
     ).fetchall()
 
 # ===== Auth helpers =====
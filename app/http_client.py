@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Safe to resend after a timeout or a 5xx; other methods (e.g. an OpenAI completion POST) may already have run
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+
+
+def _not_sent(exc: Exception) -> bool:
+    """True when the request failed while connecting, i.e. the server never saw it."""
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    # requests wraps urllib3's MaxRetryError, whose reason is the underlying connect failure
+    cause = exc.args[0] if exc.args else None
+    return isinstance(cause, NewConnectionError) or isinstance(getattr(cause, "reason", None), NewConnectionError)
+
+
+class ProviderClient:
+    """
+    One keep-alive requests.Session shared by every outbound provider call (Alpha Vantage, Yahoo, OpenAI).
+    Connection pools are bounded per host; 429/5xx responses and connection errors are retried with
+    full-jitter exponential backoff (honouring Retry-After). Non-idempotent methods are only retried when the
+    request never reached the server (connect errors, 429). Per-provider timing is kept for /health/http.
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        retries: int = 3,
+        backoff: float = 0.5,
+        backoff_max: float = 8.0,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.retries = max(0, int(retries))
+        self.backoff = float(backoff)
+        self.backoff_max = float(backoff_max)
+        self.retry_statuses = frozenset(retry_statuses)
+        self._sleep = sleep
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=int(pool_connections), pool_maxsize=int(pool_maxsize), pool_block=True)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _delay(self, attempt: int, resp: Optional[requests.Response]) -> float:
+        if resp is not None:
+            retry_after = resp.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(self.backoff_max, max(0.0, float(retry_after)))
+                except ValueError:
+                    try:
+                        return min(self.backoff_max, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+                    except Exception:
+                        pass
+        return random.uniform(0.0, min(self.backoff_max, self.backoff * (2 ** attempt)))
+
+    def _record(self, provider: str, elapsed: float, *, retried: bool, failed: bool) -> None:
+        with self._lock:
+            m = self._metrics.setdefault(provider, {"requests": 0, "retries": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            ms = elapsed * 1000.0
+            m["requests"] += 1
+            m["retries"] += 1 if retried else 0
+            m["errors"] += 1 if failed else 0
+            m["total_ms"] += ms
+            m["max_ms"] = max(m["max_ms"], ms)
+
+    def request(self, method: str, url: str, *, provider: str = "other", **kwargs: Any) -> requests.Response:
+        """Send with retries; returns the final response (callers still check status) or raises the last network error."""
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            resp: Optional[requests.Response] = None
+            try:
+                resp = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(provider, time.perf_counter() - started, retried=attempt > 0, failed=True)
+                if attempt >= self.retries or not (idempotent or _not_sent(e)):
+                    raise
+            else:
+                failed = resp.status_code in self.retry_statuses
+                self._record(provider, time.perf_counter() - started, retried=attempt > 0, failed=failed)
+                if not failed or attempt >= self.retries or not (idempotent or resp.status_code == 429):
+                    return resp
+                resp.close()
+            self._sleep(self._delay(attempt, resp))
+            attempt += 1
+
+    def get(self, url: str, *, provider: str = "other", **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, provider=provider, **kwargs)
+
+    def post(self, url: str, *, provider: str = "other", **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, provider=provider, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            out = {}
+            for name, m in self._metrics.items():
+                out[name] = {**m, "avg_ms": round(m["total_ms"] / m["requests"], 2) if m["requests"] else 0.0}
+            return out
+
+    def close(self) -> None:
+        self.session.close()
+
+
+http_client = ProviderClient(
+    pool_connections=int(os.getenv("HTTP_POOL_CONNECTIONS") or 10),
+    pool_maxsize=int(os.getenv("HTTP_POOL_SIZE") or 10),
+    retries=int(os.getenv("HTTP_RETRIES") or 3),
+    backoff=float(os.getenv("HTTP_BACKOFF") or 0.5),
+)
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.bars import bars_version, interval_seconds, query_bars
+from app.indicators import sma, swing_highs, swing_lows
+
+
+SWING = 2  # bars on each side confirming a swing high/low
+EQ_TOLERANCE = 0.0005  # relative distance for equal highs/lows (~5 pips on majors)
+RANGE_BARS = 100  # dealing range for premium/discount and bias
+MAX_BARS = 2000  # history analysed on a full rebuild (and the most a tail refresh will read)
+
+# (kind, t, t2, price, price2, filled_at) as stored in ict_levels:
+#   swing_high/swing_low: t = bar, price = extreme
+#   fvg_bull/fvg_bear: t = middle bar, t2 = confirming bar, price/price2 = gap bottom/top,
+#     filled_at = first later bar trading through the whole gap
+#   eq_high/eq_low: t/t2 = the two swings, price/price2 their extremes, filled_at = first later bar sweeping both
+Level = Tuple[str, str, Optional[str], float, Optional[float], Optional[str]]
+
+_LEVEL_COLS = "kind, t, t2, price, price2, filled_at"
+
+
+def _first(mask: np.ndarray, t: Sequence[str], offset: int) -> Optional[str]:
+    hit = np.flatnonzero(mask)
+    return t[offset + int(hit[0])] if len(hit) else None
+
+
+def _equal_pairs(kind: str, swings: List[Tuple[int, float]], t: Sequence[str], ext: np.ndarray, tol: float,
+                 prior: Optional[Tuple[str, float]]) -> List[Level]:
+    # Consecutive swings within tolerance; `prior` is the last stored swing before this window (index -1)
+    out: List[Level] = []
+    pts: List[Tuple[int, str, float]] = [(-1, prior[0], prior[1])] if prior else []
+    pts += [(i, t[i], p) for i, p in swings]
+    for (ia, ta, a), (ib, tb, b) in zip(pts, pts[1:]):
+        if abs(a - b) > tol * (a + b) / 2:
+            continue
+        after = ext[ib + 1:]
+        swept = after > max(a, b) if kind == "eq_high" else after < min(a, b)
+        out.append((kind, ta, tb, a, b, _first(swept, t, ib + 1)))
+    return out
+
+
+def detect_levels(
+    t: Sequence[str],
+    high: Sequence[float],
+    low: Sequence[float],
+    *,
+    swing: int = SWING,
+    eq_tolerance: float = EQ_TOLERANCE,
+    prior_high: Optional[Tuple[str, float]] = None,
+    prior_low: Optional[Tuple[str, float]] = None,
+) -> List[Level]:
+    """
+    Swing points, fair-value gaps and equal highs/lows in a bar series (oldest first).
+    `prior_high`/`prior_low` are the (t, price) of the last swing before the series so equal levels can pair across it.
+    """
+    h = np.asarray(high, dtype=float)
+    lo = np.asarray(low, dtype=float)
+    out: List[Level] = []
+    sh = [(int(i), float(h[i])) for i in swing_highs(h, swing)]
+    sl = [(int(i), float(lo[i])) for i in swing_lows(lo, swing)]
+    out += [("swing_high", t[i], None, p, None, None) for i, p in sh]
+    out += [("swing_low", t[i], None, p, None, None) for i, p in sl]
+    # Three-bar gaps: bar i-2 and bar i do not overlap, leaving the middle bar's range unfilled
+    for i in (np.flatnonzero(lo[2:] > h[:-2]) + 2).tolist():
+        bottom, top = float(h[i - 2]), float(lo[i])
+        out.append(("fvg_bull", t[i - 1], t[i], bottom, top, _first(lo[i + 1:] <= bottom, t, i + 1)))
+    for i in (np.flatnonzero(h[2:] < lo[:-2]) + 2).tolist():
+        bottom, top = float(h[i]), float(lo[i - 2])
+        out.append(("fvg_bear", t[i - 1], t[i], bottom, top, _first(h[i + 1:] >= top, t, i + 1)))
+    out += _equal_pairs("eq_high", sh, t, h, eq_tolerance, prior_high)
+    out += _equal_pairs("eq_low", sl, t, lo, eq_tolerance, prior_low)
+    return out
+
+
+def _fill_open_levels(conn: sqlite3.Connection, symbol: str, interval: str, before: str,
+                      t: Sequence[str], h: np.ndarray, lo: np.ndarray) -> None:
+    # Gaps and equal levels found earlier stay open until a later bar trades through them
+    rows = conn.execute(
+        """
+        SELECT kind, t, t2, price, price2 FROM ict_levels
+        WHERE symbol = ? AND interval = ? AND t < ? AND filled_at IS NULL
+          AND kind IN ('fvg_bull', 'fvg_bear', 'eq_high', 'eq_low');
+        """,
+        (symbol, interval, before),
+    ).fetchall()
+    ts = np.asarray(t, dtype=object)
+    for kind, lt, t2, price, price2 in rows:
+        later = ts > t2
+        if kind == "fvg_bull":
+            hit = later & (lo <= price)
+        elif kind == "fvg_bear":
+            hit = later & (h >= price2)
+        elif kind == "eq_high":
+            hit = later & (h > max(price, price2))
+        else:
+            hit = later & (lo < min(price, price2))
+        filled_at = _first(hit, t, 0)
+        if filled_at:
+            conn.execute(
+                "UPDATE ict_levels SET filled_at = ? WHERE symbol = ? AND interval = ? AND kind = ? AND t = ?;",
+                (filled_at, symbol, interval, kind, lt),
+            )
+
+
+def _last_swing(conn: sqlite3.Connection, symbol: str, interval: str, kind: str, before: str) -> Optional[Tuple[str, float]]:
+    row = conn.execute(
+        "SELECT t, price FROM ict_levels WHERE symbol = ? AND interval = ? AND kind = ? AND t < ? ORDER BY t DESC LIMIT 1;",
+        (symbol, interval, kind, before),
+    ).fetchone()
+    return (row[0], float(row[1])) if row else None
+
+
+def _summarize(conn: sqlite3.Connection, symbol: str, interval: str, bars: List[Tuple[Any, ...]]) -> Dict[str, Any]:
+    """Premium/discount, bias, liquidity and OTE zone over the latest RANGE_BARS bars (mirrors the dashboard's former analyzeICT)."""
+    bars = bars[-RANGE_BARS:]
+    if len(bars) < 10:
+        return {"ok": False, "reason": "Insufficient data", "as_of": bars[-1][0] if bars else None}
+    c = np.array([b[4] for b in bars], dtype=float)
+    hi = float(max(b[2] for b in bars))
+    lo = float(min(b[3] for b in bars))
+    last = float(c[-1])
+    mid = (hi + lo) / 2
+    ma_short, ma_long = sma(c, 10), sma(c, min(20, len(c)))
+    # Slopes over 2 and 5 bars; NaN (not enough warm-up yet) counts as flat
+    short_slope = float(np.nan_to_num(ma_short[-1] - ma_short[-3]))
+    long_slope = float(np.nan_to_num(ma_long[-1] - ma_long[-6]))
+    bias = "bullish" if short_slope > 0 and long_slope > 0 else "bearish" if short_slope < 0 and long_slope < 0 else "neutral"
+
+    def recent(kind: str, n: int) -> List[Tuple[Any, ...]]:
+        return conn.execute(
+            f"SELECT {_LEVEL_COLS} FROM ict_levels WHERE symbol = ? AND interval = ? AND kind = ? ORDER BY t DESC LIMIT ?;",
+            (symbol, interval, kind, n),
+        ).fetchall()
+
+    highs, lows = recent("swing_high", 2), recent("swing_low", 2)
+    eq = lambda rows: len(rows) == 2 and abs(rows[0][3] - rows[1][3]) <= EQ_TOLERANCE * (rows[0][3] + rows[1][3]) / 2
+    last_high = (highs[0][1], float(highs[0][3])) if highs else (bars[int(np.argmax([b[2] for b in bars]))][0], hi)
+    last_low = (lows[0][1], float(lows[0][3])) if lows else (bars[int(np.argmin([b[3] for b in bars]))][0], lo)
+    leg_start, leg_end = (last_high, last_low) if bias == "bearish" else (last_low, last_high)
+    if leg_start[0] > leg_end[0]:
+        leg_start, leg_end = leg_end, leg_start
+    r62 = leg_end[1] - 0.62 * (leg_end[1] - leg_start[1])
+    r79 = leg_end[1] - 0.79 * (leg_end[1] - leg_start[1])
+
+    open_gaps = conn.execute(
+        f"""
+        SELECT {_LEVEL_COLS} FROM ict_levels
+        WHERE symbol = ? AND interval = ? AND kind IN ('fvg_bull', 'fvg_bear') AND filled_at IS NULL
+        ORDER BY t DESC LIMIT 50;
+        """,
+        (symbol, interval),
+    ).fetchall()
+    above = [g for g in open_gaps if g[3] > last]
+    below = [g for g in open_gaps if g[4] < last]
+    return {
+        "ok": True,
+        "as_of": bars[-1][0],
+        "last": last,
+        "high": hi,
+        "low": lo,
+        "mid": mid,
+        "zone": "premium" if last >= mid else "discount",
+        "bias": bias,
+        "eq_highs": bool(eq(highs)),
+        "eq_lows": bool(eq(lows)),
+        "leg_start": {"t": leg_start[0], "price": leg_start[1]},
+        "leg_end": {"t": leg_end[0], "price": leg_end[1]},
+        "ote_low": min(r62, r79),
+        "ote_high": max(r62, r79),
+        "fvg_above": list(min(above, key=lambda g: g[3])) if above else None,
+        "fvg_below": list(max(below, key=lambda g: g[4])) if below else None,
+    }
+
+
+def refresh_structure(conn: sqlite3.Connection, *, symbol: str, interval: str = "1h", full: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Bring the persisted structure for (symbol, interval) up to date and return its summary; None without bars.
+    Unchanged bars cost one state lookup. Otherwise only the tail is re-detected: levels from the first bar
+    that could still change (swings need SWING bars after them) are replaced, and open gaps/equal levels are
+    checked against the new bars. `full` re-detects the last MAX_BARS bars (after back-fills or rollup rebuilds).
+    Writes go through conn and are committed.
+    """
+    interval_seconds(interval)
+    version = bars_version(conn, symbol=symbol, interval=interval)
+    if version is None:
+        return None
+    version_key = json.dumps(list(version))
+    state = conn.execute(
+        "SELECT version, ctx_t, through_t, summary FROM ict_state WHERE symbol = ? AND interval = ?;",
+        (symbol, interval),
+    ).fetchone()
+    if state and state[0] == version_key and not full:
+        return json.loads(state[3])
+
+    try:
+        bars: List[Tuple[Any, ...]] = []
+        if state and not full:
+            bars = query_bars(conn, symbol=symbol, interval=interval, start=state[1], limit=MAX_BARS)
+            # Bars shrank (rollup rebuild) or too many new bars for a tail pass: start over
+            if not bars or bars[0][0] != state[1] or bars[-1][0] < state[2] or len(bars) >= MAX_BARS:
+                bars = []
+        if bars:
+            replace_from = bars[min(SWING, len(bars) - 1)][0]
+            prior_high = _last_swing(conn, symbol, interval, "swing_high", replace_from)
+            prior_low = _last_swing(conn, symbol, interval, "swing_low", replace_from)
+            conn.execute(
+                "DELETE FROM ict_levels WHERE symbol = ? AND interval = ? AND (t >= ? OR t2 >= ?);",
+                (symbol, interval, replace_from, replace_from),
+            )
+        else:
+            bars = query_bars(conn, symbol=symbol, interval=interval, limit=MAX_BARS)
+            replace_from = bars[0][0] if bars else ""
+            prior_high = prior_low = None
+            conn.execute("DELETE FROM ict_levels WHERE symbol = ? AND interval = ?;", (symbol, interval))
+        t = [b[0] for b in bars]
+        h = np.array([b[2] for b in bars], dtype=float)
+        lo = np.array([b[3] for b in bars], dtype=float)
+        _fill_open_levels(conn, symbol, interval, replace_from, t, h, lo)
+        levels = [
+            lv for lv in detect_levels(t, h, lo, prior_high=prior_high, prior_low=prior_low)
+            if lv[1] >= replace_from or (lv[2] or "") >= replace_from
+        ]
+        conn.executemany(
+            f"INSERT OR REPLACE INTO ict_levels(symbol, interval, {_LEVEL_COLS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?);",
+            [(symbol, interval, *lv) for lv in levels],
+        )
+        if len(bars) < RANGE_BARS:
+            bars = query_bars(conn, symbol=symbol, interval=interval, limit=RANGE_BARS)
+        summary = _summarize(conn, symbol, interval, bars)
+        # Next tail pass starts 2*SWING + 2 bars back so the first replaceable bar still has full left context
+        ctx_t = t[max(0, len(t) - 1 - (2 * SWING + 2))] if t else ""
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO ict_state(symbol, interval, version, ctx_t, through_t, summary, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'));
+            """,
+            (symbol, interval, version_key, ctx_t, t[-1] if t else "", json.dumps(summary)),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return summary
+
+
+def list_levels(
+    conn: sqlite3.Connection,
+    *,
+    symbol: str,
+    interval: str = "1h",
+    kinds: Optional[Sequence[str]] = None,
+    open_only: bool = False,
+    limit: int = 50,
+) -> List[Level]:
+    """Persisted levels, newest first."""
+    clauses = ["symbol = ?", "interval = ?"]
+    params: List[Any] = [symbol, interval]
+    if kinds:
+        clauses.append(f"kind IN ({', '.join('?' for _ in kinds)})")
+        params.extend(kinds)
+    if open_only:
+        clauses.append("filled_at IS NULL")
+    params.append(int(limit))
+    sql = f"SELECT {_LEVEL_COLS} FROM ict_levels WHERE {' AND '.join(clauses)} ORDER BY t DESC LIMIT ?;"
+    return conn.execute(sql, tuple(params)).fetchall()
+
+
+def structure_notes(summary: Optional[Dict[str, Any]], interval: str = "1h") -> str:
+    """One-paragraph plain-text digest of a structure summary for LLM prompts; empty when there is none."""
+    if not summary or not summary.get("ok"):
+        return ""
+    parts = [
+        f"Market structure ({interval}, last {summary['last']:g}): {summary['bias']} bias, price in {summary['zone']}"
+        f" of range {summary['low']:g}-{summary['high']:g} (mid {summary['mid']:g}).",
+        f"OTE zone {summary['ote_low']:g}-{summary['ote_high']:g}.",
+    ]
+    if summary.get("eq_highs"):
+        parts.append("Equal highs (buy-side liquidity) above.")
+    if summary.get("eq_lows"):
+        parts.append("Equal lows (sell-side liquidity) below.")
+    for key, label in (("fvg_above", "above"), ("fvg_below", "below")):
+        g = summary.get(key)
+        if g:
+            parts.append(f"Nearest open {'bullish' if g[0] == 'fvg_bull' else 'bearish'} FVG {label}: {g[3]:g}-{g[4]:g}.")
+    return " ".join(parts)
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+from PIL import Image, ImageOps
+
+
+def max_side() -> int:
+    """Longest edge kept for vision inputs (IMAGE_MAX_SIDE, default 1536 px); larger images are downscaled."""
+    return max(64, int(os.getenv("IMAGE_MAX_SIDE") or 1536))
+
+
+def quality() -> int:
+    return min(95, max(30, int(os.getenv("IMAGE_QUALITY") or 85)))
+
+
+def max_upload_bytes() -> int:
+    return int(os.getenv("IMAGE_MAX_UPLOAD_BYTES") or 20 * 1024 * 1024)
+
+
+def decode_data_url(url: str) -> bytes:
+    """Raw bytes of a base64 `data:image/...` URL; raises ValueError otherwise."""
+    head, sep, payload = (url or "").partition(",")
+    if not sep or not head.startswith("data:image") or not head.endswith(";base64"):
+        raise ValueError("Expected a base64 data:image URL")
+    try:
+        return base64.b64decode(payload, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid base64 image data")
+
+
+def preprocess_image(raw: bytes, *, side: Optional[int] = None, jpeg_quality: Optional[int] = None) -> Tuple[bytes, str, int, int]:
+    """
+    Downscale so the longest edge is at most `side` and recompress as JPEG (transparency flattened onto white).
+    Deterministic for the same input, so identical uploads produce identical bytes and digests.
+    Returns (data, mime, width, height); raises ValueError for data Pillow cannot read.
+    """
+    side = side or max_side()
+    try:
+        img = Image.open(io.BytesIO(raw))
+        img.draft("RGB", (side, side))  # JPEG sources decode at a reduced scale directly
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((side, side), Image.LANCZOS, reducing_gap=3.0)
+    except (OSError, Image.DecompressionBombError, SyntaxError) as e:
+        raise ValueError(f"Unreadable image: {e}")
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        flat = Image.new("RGB", img.size, (255, 255, 255))
+        flat.paste(img, mask=img.getchannel("A"))
+        img = flat
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=jpeg_quality or quality(), optimize=True)
+    return out.getvalue(), "image/jpeg", img.width, img.height
+
+
+def store_image(conn: sqlite3.Connection, raw: bytes) -> Dict[str, Any]:
+    """
+    Preprocess and store an upload content-addressed by the sha256 of the processed bytes. Commits.
+    Re-uploads of the same source are recognised by their own digest and skip preprocessing.
+    Returns {"digest", "mime", "width", "height", "size", "deduped"}.
+    """
+    source = hashlib.sha256(raw).hexdigest()
+    row = conn.execute("SELECT digest, mime, width, height, size FROM images WHERE source_digest = ?", (source,)).fetchone()
+    if row:
+        return {"digest": row[0], "mime": row[1], "width": row[2], "height": row[3], "size": row[4], "deduped": True}
+    data, mime, width, height = preprocess_image(raw)
+    digest = hashlib.sha256(data).hexdigest()
+    cur = conn.execute(
+        "INSERT OR IGNORE INTO images(digest, source_digest, mime, width, height, size, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (digest, source, mime, width, height, len(data), data),
+    )
+    conn.commit()
+    return {"digest": digest, "mime": mime, "width": width, "height": height, "size": len(data), "deduped": cur.rowcount == 0}
+
+
+def load_image(conn: sqlite3.Connection, digest: str) -> Optional[Tuple[str, bytes]]:
+    """(mime, data) for a stored digest, or None."""
+    row = conn.execute("SELECT mime, data FROM images WHERE digest = ?", (digest,)).fetchone()
+    return (row[0], bytes(row[1])) if row else None
+
+
+def touch_images(conn: sqlite3.Connection, digests: Any) -> None:
+    """Record use (for retention); does not commit."""
+    conn.executemany("UPDATE images SET last_used_at = datetime('now') WHERE digest = ?", [(d,) for d in digests])
+
+
+def to_data_url(mime: str, data: bytes) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
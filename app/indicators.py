@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.bars import bars_version, interval_seconds, query_bars
+from app.cache import indicator_cache
+from app.db import cache_db_key
+
+
+# ===== Kernels =====
+# All kernels take 1-D float arrays and return arrays of the same length; positions without a full
+# window are NaN. Each runs in O(n) regardless of the window size.
+def _check(n: int) -> int:
+    n = int(n)
+    if n < 1:
+        raise ValueError("Window must be >= 1")
+    return n
+
+
+def sma(x: Sequence[float], n: int) -> np.ndarray:
+    """Simple moving average from a running sum (prefix-sum difference)."""
+    x = np.asarray(x, dtype=float)
+    n = _check(n)
+    out = np.full(x.shape, np.nan)
+    if len(x) >= n:
+        c = np.concatenate(([0.0], np.cumsum(x)))
+        out[n - 1:] = (c[n:] - c[:-n]) / n
+    return out
+
+
+def _ewm(x: np.ndarray, n: int, alpha: float) -> np.ndarray:
+    # Seeded with the SMA of the first n values; the recurrence itself is inherently sequential
+    out = np.full(x.shape, np.nan)
+    if len(x) < n:
+        return out
+    prev = float(x[:n].mean())
+    out[n - 1] = prev
+    vals = x[n:].tolist()
+    tail = np.empty(len(vals))
+    for i, v in enumerate(vals):
+        prev += alpha * (v - prev)
+        tail[i] = prev
+    out[n:] = tail
+    return out
+
+
+def ema(x: Sequence[float], n: int) -> np.ndarray:
+    """Exponential moving average, alpha = 2 / (n + 1)."""
+    n = _check(n)
+    return _ewm(np.asarray(x, dtype=float), n, 2.0 / (n + 1))
+
+
+def rolling_std(x: Sequence[float], n: int, *, ddof: int = 1) -> np.ndarray:
+    """Rolling standard deviation from prefix sums of x and x²; the series is centred first to limit cancellation."""
+    x = np.asarray(x, dtype=float)
+    n = _check(n)
+    out = np.full(x.shape, np.nan)
+    if len(x) < n or n <= ddof:
+        return out
+    d = x - x.mean()
+    s1 = np.concatenate(([0.0], np.cumsum(d)))
+    s2 = np.concatenate(([0.0], np.cumsum(d * d)))
+    win = s1[n:] - s1[:-n]
+    sq = s2[n:] - s2[:-n]
+    var = (sq - win * win / n) / (n - ddof)
+    out[n - 1:] = np.sqrt(np.maximum(var, 0.0))
+    return out
+
+
+def _rolling_extreme(x: Sequence[float], n: int, op: np.ufunc, fill: float) -> np.ndarray:
+    # van Herk/Gil-Werman: split into blocks of n, take prefix and suffix extremes per block;
+    # any window of length n is one block's suffix plus the next block's prefix.
+    x = np.asarray(x, dtype=float)
+    n = _check(n)
+    out = np.full(x.shape, np.nan)
+    size = len(x)
+    if size < n:
+        return out
+    blocks = np.concatenate((x, np.full(-size % n, fill))).reshape(-1, n)
+    prefix = op.accumulate(blocks, axis=1).ravel()
+    suffix = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    starts = np.arange(size - n + 1)
+    out[n - 1:] = op(suffix[starts], prefix[starts + n - 1])
+    return out
+
+
+def rolling_max(x: Sequence[float], n: int) -> np.ndarray:
+    return _rolling_extreme(x, n, np.maximum, -np.inf)
+
+
+def rolling_min(x: Sequence[float], n: int) -> np.ndarray:
+    return _rolling_extreme(x, n, np.minimum, np.inf)
+
+
+def true_range(high: Sequence[float], low: Sequence[float], close: Sequence[float]) -> np.ndarray:
+    high, low, close = (np.asarray(a, dtype=float) for a in (high, low, close))
+    tr = high - low
+    if len(tr) > 1:
+        prev = close[:-1]
+        tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - prev), np.abs(low[1:] - prev)))
+    return tr
+
+
+def atr(high: Sequence[float], low: Sequence[float], close: Sequence[float], n: int = 14) -> np.ndarray:
+    """Average true range with Wilder smoothing (alpha = 1 / n)."""
+    n = _check(n)
+    return _ewm(true_range(high, low, close), n, 1.0 / n)
+
+
+def swing_highs(high: Sequence[float], k: int = 2) -> np.ndarray:
+    """Indices i where high[i] is the maximum of high[i-k:i+k+1] (k bars confirm each side)."""
+    high = np.asarray(high, dtype=float)
+    k = _check(k)
+    if len(high) < 2 * k + 1:
+        return np.empty(0, dtype=int)
+    m = rolling_max(high, 2 * k + 1)[2 * k:]
+    return np.flatnonzero(high[k:len(high) - k] >= m) + k
+
+
+def swing_lows(low: Sequence[float], k: int = 2) -> np.ndarray:
+    """Indices i where low[i] is the minimum of low[i-k:i+k+1]."""
+    low = np.asarray(low, dtype=float)
+    k = _check(k)
+    if len(low) < 2 * k + 1:
+        return np.empty(0, dtype=int)
+    m = rolling_min(low, 2 * k + 1)[2 * k:]
+    return np.flatnonzero(low[k:len(low) - k] <= m) + k
+
+
+# ===== Series over stored bars =====
+def _as_list(a: np.ndarray) -> List[Optional[float]]:
+    # JSON has no NaN: warm-up positions become null
+    return [None if v != v else v for v in a.tolist()]
+
+
+def compute_indicators(
+    conn: sqlite3.Connection,
+    *,
+    symbol: str,
+    interval: str = "1h",
+    limit: int = 300,
+    sma_periods: Iterable[int] = (20, 50),
+    ema_periods: Iterable[int] = (20,),
+    std_window: int = 14,
+    range_window: int = 20,
+    atr_period: int = 14,
+    swing: int = 2,
+) -> Optional[Dict[str, Any]]:
+    """
+    Indicator series over the latest `limit` bars of a symbol; None if it has no bars.
+    Extra history (the longest window) is read and trimmed so the returned range is fully warmed up where
+    the data allows. Results are cached per (symbol, interval, parameters, newest bar version).
+    Returns {"t", "open", "high", "low", "close", "series": {name: values}, "swing_highs", "swing_lows", "as_of", "cached"}.
+    """
+    interval_seconds(interval)
+    smas = tuple(sorted({_check(p) for p in sma_periods}))
+    emas = tuple(sorted({_check(p) for p in ema_periods}))
+    params = (smas, emas, _check(std_window), _check(range_window), _check(atr_period), _check(swing))
+    version = bars_version(conn, symbol=symbol, interval=interval)
+    if version is None:
+        return None
+    db = cache_db_key(conn)
+    key = (db, symbol, interval, int(limit), params, tuple(version))
+    cached = indicator_cache.get(key) if db else None
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    lookback = max((*smas, *emas, std_window, range_window, atr_period, swing))
+    bars = query_bars(conn, symbol=symbol, interval=interval, limit=int(limit) + lookback)
+    t = [b[0] for b in bars]
+    o, h, lo, c = (np.array([b[i] for b in bars], dtype=float) for i in range(1, 5))
+    series: Dict[str, np.ndarray] = {}
+    for p in smas:
+        series[f"sma{p}"] = sma(c, p)
+    for p in emas:
+        series[f"ema{p}"] = ema(c, p)
+    series[f"std{std_window}"] = rolling_std(c, std_window)
+    series[f"high{range_window}"] = rolling_max(h, range_window)
+    series[f"low{range_window}"] = rolling_min(lo, range_window)
+    series[f"atr{atr_period}"] = atr(h, lo, c, atr_period)
+
+    cut = max(0, len(t) - int(limit))
+    result = {
+        "t": t[cut:],
+        "open": o[cut:].tolist(),
+        "high": h[cut:].tolist(),
+        "low": lo[cut:].tolist(),
+        "close": c[cut:].tolist(),
+        "series": {name: _as_list(v[cut:]) for name, v in series.items()},
+        # Indices into "t"; a swing needs `swing` bars on both sides, so the newest ones are unconfirmed
+        "swing_highs": [int(i) - cut for i in swing_highs(h, swing) if i >= cut],
+        "swing_lows": [int(i) - cut for i in swing_lows(lo, swing) if i >= cut],
+        "as_of": version[2],
+    }
+    if db:
+        indicator_cache.put(key, result)
+    return {**result, "cached": False}
+
+
+def parse_periods(spec: Optional[str], default: Tuple[int, ...]) -> Tuple[int, ...]:
+    """Parse a comma-separated period list such as "20,50"; raises ValueError for bad or out-of-range values."""
+    if spec is None:
+        return default
+    try:
+        periods = tuple(int(p) for p in spec.split(",") if p.strip())
+    except ValueError:
+        raise ValueError(f"Invalid periods: {spec!r}")
+    if len(periods) > 8 or any(p < 1 or p > 1000 for p in periods):
+        raise ValueError("Periods must be 1..1000 (at most 8)")
+    return periods
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from app.bars import bars_version
+from app.db import pooled_connection
+from app.http_client import http_client
+from app.ict import refresh_structure, structure_notes
+from app.images import decode_data_url, load_image, store_image, to_data_url, touch_images
+
+
+SYSTEM_PROMPT = (
+    "You are an ICT trading mentor. Use ICT concepts (liquidity, displacement, PD arrays, OTE, FVG/OB, killzones) "
+    "to craft concise, actionable plans."
+)
+
+
+def cache_ttl() -> float:
+    """Seconds a cached completion stays valid (INSIGHTS_CACHE_TTL, default 6h); 0 disables the cache."""
+    return float(os.getenv("INSIGHTS_CACHE_TTL") or 6 * 3600)
+
+
+def cache_max_entries() -> int:
+    return max(1, int(os.getenv("INSIGHTS_CACHE_MAX") or 500))
+
+
+def insights_cache_key(
+    *,
+    model: str,
+    system: str,
+    prompt: str,
+    structure_bar: Optional[int] = None,
+    image_digests: Sequence[str] = (),
+) -> str:
+    """
+    Content address of a completion request: identical inputs hash to the same key. `prompt` is the user's
+    request without the live structure digest; `structure_bar` (start of the newest structure bar) stands in for it.
+    """
+    raw = json.dumps([model, system, prompt, structure_bar, list(image_digests)], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_cached_insight(conn: sqlite3.Connection, *, key: str, ttl: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Cached completion for `key` if younger than `ttl` seconds; bumps its hit count and recency. Commits."""
+    ttl = cache_ttl() if ttl is None else ttl
+    if ttl <= 0:
+        return None
+    row = conn.execute(
+        """
+        UPDATE insights_cache SET hits = hits + 1, last_hit_at = datetime('now')
+        WHERE key = ? AND created_at > datetime('now', ?)
+        RETURNING model, summary, created_at, hits
+        """,
+        (key, f"-{int(ttl)} seconds"),
+    ).fetchone()
+    conn.commit()
+    if row is None:
+        return None
+    return {"model": row[0], "summary": row[1], "cached_at": row[2], "hits": int(row[3])}
+
+
+def put_cached_insight(
+    conn: sqlite3.Connection,
+    *,
+    key: str,
+    model: str,
+    summary: str,
+    ttl: Optional[float] = None,
+    max_entries: Optional[int] = None,
+) -> None:
+    """Store a completion, then drop expired entries and the least recently used ones beyond `max_entries`. Commits."""
+    ttl = cache_ttl() if ttl is None else ttl
+    if ttl <= 0:
+        return
+    conn.execute(
+        """
+        INSERT INTO insights_cache(key, model, summary) VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET model = excluded.model, summary = excluded.summary,
+            created_at = datetime('now'), last_hit_at = datetime('now'), hits = 0
+        """,
+        (key, model, summary),
+    )
+    conn.execute("DELETE FROM insights_cache WHERE created_at <= datetime('now', ?)", (f"-{int(ttl)} seconds",))
+    conn.execute(
+        """
+        DELETE FROM insights_cache WHERE key IN (
+            SELECT key FROM insights_cache ORDER BY last_hit_at DESC LIMIT -1 OFFSET ?
+        )
+        """,
+        (cache_max_entries() if max_entries is None else int(max_entries),),
+    )
+    conn.commit()
+
+
+# ===== Completion pipeline =====
+class InsightsError(Exception):
+    """Upstream or network failure; `status_code` and `detail` are what the API returns."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def openai_url() -> str:
+    # OPENAI_URL points at any Chat Completions-compatible server (e.g. `python -m app.llm_stub`)
+    return os.getenv("OPENAI_URL") or "https://api.openai.com/v1/chat/completions"
+
+
+def request_prompt(*, symbol: str, horizon: str, notes: Optional[str]) -> str:
+    return f"Provide a {horizon} view for {symbol} with risks and potential trade setups. {notes or ''}".strip()
+
+
+def build_prompt(*, symbol: str, horizon: str, notes: Optional[str]) -> Tuple[str, Optional[int]]:
+    """The full prompt, and the start of the newest 1h bar its structure digest was read from (None without one)."""
+    prompt = request_prompt(symbol=symbol, horizon=horizon, notes=notes)
+    # Precomputed structure from stored bars (empty when the symbol has none)
+    bar = None
+    try:
+        with pooled_connection() as conn:
+            structure = structure_notes(refresh_structure(conn, symbol=symbol))
+            version = bars_version(conn, symbol=symbol, interval="1h")
+            bar = int(version[0]) if version else None
+    except Exception as e:
+        logging.warning("Structure for insights unavailable: %s", e)
+        structure = ""
+    if structure:
+        prompt += "\n\n" + structure
+    return prompt, bar
+
+
+def _upstream_error(r: requests.Response) -> InsightsError:
+    # Log a safe summary; do not log the API key
+    try:
+        err = r.json()
+        msg = err.get("error", {}).get("message", str(err))
+    except Exception:
+        msg = r.text[:300]
+    logging.warning("OpenAI insights upstream error %s: %s", r.status_code, msg)
+    return InsightsError(502, f"OpenAI error {r.status_code}: {msg}")
+
+
+def _read_stream(r: requests.Response, on_token: Callable[[str], None]) -> str:
+    # Chat Completions SSE: `data: {json chunk}` lines, terminated by `data: [DONE]`
+    parts: List[str] = []
+    for line in r.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            break
+        delta = (json.loads(data).get("choices") or [{}])[0].get("delta", {}).get("content")
+        if delta:
+            parts.append(delta)
+            on_token(delta)
+    return "".join(parts)
+
+
+def generate_insights(
+    *,
+    symbol: str,
+    horizon: str = "daily",
+    notes: Optional[str] = None,
+    images: Optional[Sequence[str]] = None,
+    image_digests: Optional[Sequence[str]] = None,
+    refresh: bool = False,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the prompt, answer from the completion cache or call the model, and store fresh completions.
+    Blocking (runs on the insights job workers). With `on_token` the completion is streamed and each text
+    delta is passed on as it arrives; cached and demo answers arrive as a single delta.
+    Vision inputs are stored images (`image_digests`, from POST /images) plus any inline data URLs, which are
+    preprocessed and stored the same way first; at most 5 are sent.
+    Returns InsightsResponse fields; raises InsightsError on bad images or upstream/network failure.
+    """
+    key = os.getenv("OPENAI_API_KEY")
+    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    prompt, structure_bar = build_prompt(symbol=symbol, horizon=horizon, notes=notes)
+    emit = on_token or (lambda _text: None)
+    if not key:
+        extra = "\n\n[Note] Vision inputs not processed in demo mode." if (images or image_digests) else ""
+        summary = "[Demo] " + prompt + "\n\nNote: Set OPENAI_API_KEY to enable live GPT insights." + extra
+        emit(summary)
+        return {"summary": summary}
+
+    headers = {"Authorization": f"Bearer {key}", "Content-Type": "application/json"}
+    if os.getenv("OPENAI_ORG_ID"):
+        headers["OpenAI-Organization"] = os.environ["OPENAI_ORG_ID"]
+    if os.getenv("OPENAI_PROJECT_ID"):
+        headers["OpenAI-Project"] = os.environ["OPENAI_PROJECT_ID"]
+    digests = list(image_digests or [])
+    stored: List[Tuple[str, bytes]] = []
+    with pooled_connection() as conn:
+        try:
+            digests += [store_image(conn, decode_data_url(u))["digest"] for u in images or []]
+        except ValueError as e:
+            raise InsightsError(400, str(e))
+        digests = list(dict.fromkeys(digests))[:5]
+        for d in digests:
+            img = load_image(conn, d)
+            if img is None:
+                raise InsightsError(400, f"Unknown image digest: {d}")
+            stored.append(img)
+        touch_images(conn, digests)
+        conn.commit()
+        # Identical model, request and images reuse a stored completion while the newest 1h bar is the same:
+        # the cache is scoped per bar, not per tick (the structure digest quotes the live price)
+        cache_key = insights_cache_key(
+            model=model,
+            system=SYSTEM_PROMPT,
+            prompt=request_prompt(symbol=symbol, horizon=horizon, notes=notes),
+            structure_bar=structure_bar,
+            image_digests=digests,
+        )
+        hit = None if refresh else get_cached_insight(conn, key=cache_key)
+    if hit:
+        emit(hit["summary"])
+        return {"summary": hit["summary"], "cached": True, "cache_key": cache_key, "cached_at": hit["cached_at"], "cache_hits": hit["hits"], "model": hit["model"]}
+
+    # Chat Completions request; stored images go upstream as (already downsized) data URLs
+    content: List[Dict[str, Any]] = [{"type": "text", "text": prompt}]
+    content += [{"type": "image_url", "image_url": {"url": to_data_url(mime, data)}} for mime, data in stored]
+    body: Dict[str, Any] = {
+        "model": model,
+        "messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": content}],
+        "temperature": 0.4,
+    }
+    stream = on_token is not None
+    if stream:
+        body["stream"] = True
+    try:
+        r = http_client.post(openai_url(), provider="openai", headers=headers, json=body, timeout=60, stream=stream)
+        if r.status_code != 200:
+            raise _upstream_error(r)
+        txt = (_read_stream(r, emit) if stream else r.json()["choices"][0]["message"]["content"]).strip()
+    except requests.RequestException as e:
+        logging.warning("OpenAI insights network error: %s", str(e))
+        raise InsightsError(502, "Network error calling OpenAI (check connectivity/firewall)")
+    # Do not auto-persist here; the client saves entry plans explicitly after generation
+    with pooled_connection() as conn:
+        put_cached_insight(conn, key=cache_key, model=model, summary=txt)
+    return {"summary": txt, "cache_key": cache_key, "model": model}
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+# (event, data): ("token", text) while running, then exactly one ("done", result) or ("error", {"status_code", "detail"})
+Event = Tuple[str, Any]
+
+
+class JobLimitError(Exception):
+    """Submission refused: the owner already has `per_owner` unfinished jobs, or the queue is full."""
+
+    def __init__(self, status_code: int, detail: str) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Job:
+    """One queued call. Events are kept so late subscribers replay the stream from the first token."""
+
+    def __init__(self, owner: str, *, limited: bool = True) -> None:
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.limited = limited
+        self.status = "queued"  # queued | running | done | error
+        self.created_at = time.time()
+        self.events: List[Event] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[Dict[str, Any]] = None
+        self._subs: Set[Tuple[asyncio.AbstractEventLoop, "asyncio.Queue[Event]"]] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def _publish(self, event: Event) -> None:
+        # Called on a worker thread; delivery hops onto each subscriber's loop (as app.stream.PriceHub does)
+        with self._lock:
+            self.events.append(event)
+            targets = list(self._subs)
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                pass
+
+    def _start(self) -> bool:
+        """queued -> running; False if the job already finished (e.g. failed by JobQueue.shutdown)."""
+        with self._lock:
+            if self.finished:
+                return False
+            self.status = "running"
+            return True
+
+    def _finish(self, status: str, event: Event) -> bool:
+        """Move to done/error and publish the final event; False if the job had already finished."""
+        with self._lock:
+            if self.finished:
+                return False
+            self.status = status
+            if status == "done":
+                self.result = event[1]
+            else:
+                self.error = event[1]
+        self._publish(event)
+        return True
+
+    def subscribe(self) -> "asyncio.Queue[Event]":
+        """Queue on the running loop that receives every event so far, then new ones as they happen."""
+        queue: "asyncio.Queue[Event]" = asyncio.Queue()
+        with self._lock:
+            for event in self.events:
+                queue.put_nowait(event)
+            self._subs.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Event]") -> None:
+        with self._lock:
+            self._subs = {s for s in self._subs if s[1] is not queue}
+
+    async def wait(self) -> Dict[str, Any]:
+        """Await the final ("done" | "error", data) event and return it as {"event", "data"}."""
+        queue = self.subscribe()
+        try:
+            while True:
+                name, data = await queue.get()
+                if name in ("done", "error"):
+                    return {"event": name, "data": data}
+        finally:
+            self.unsubscribe(queue)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            text = "".join(d for e, d in self.events if e == "token")
+        return {"id": self.id, "status": self.status, "text": text, "result": self.result, "error": self.error}
+
+
+class JobQueue:
+    """
+    Bounded worker pool for slow blocking calls (LLM completions) so they never hold the server's request threads.
+    At most `per_owner` unfinished jobs per owner (session or client address) and `max_pending` overall;
+    finished jobs are kept (newest `keep`) so clients can reconnect to a stream or poll the result.
+    """
+
+    def __init__(self, *, workers: int = 4, per_owner: int = 2, max_pending: int = 64, keep: int = 256) -> None:
+        self.workers = max(1, int(workers))
+        self.per_owner = max(1, int(per_owner))
+        self.max_pending = max(1, int(max_pending))
+        self.keep = max(1, int(keep))
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, owner: str, fn: Callable[[Callable[[str], None]], Dict[str, Any]], *, limited: bool = True) -> Job:
+        """
+        Queue fn(on_token) -> result. Exceptions with `status_code`/`detail` are reported as-is, others as 500.
+        `limited=False` skips (and does not count towards) the per-owner and queue limits, for callers that
+        block on the result anyway.
+        """
+        job = Job(owner, limited=limited)
+        with self._lock:
+            active = [j for j in self._jobs.values() if j.limited and not j.finished] if limited else []
+            if sum(1 for j in active if j.owner == owner) >= self.per_owner:
+                self.rejected += 1
+                raise JobLimitError(429, f"At most {self.per_owner} insights jobs may run at once per user")
+            if len(active) >= self.max_pending:
+                self.rejected += 1
+                raise JobLimitError(503, "Insights queue is full; retry shortly")
+            self._jobs[job.id] = job
+            finished = [jid for jid, j in self._jobs.items() if j.finished]
+            for jid in finished[: max(0, len(finished) - self.keep)]:
+                del self._jobs[jid]
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="insights")
+            pool = self._pool
+        pool.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Callable[[str], None]], Dict[str, Any]]) -> None:
+        if not job._start():
+            return
+        try:
+            result = fn(lambda text: job._publish(("token", text)))
+        except Exception as e:
+            error = {"status_code": int(getattr(e, "status_code", 500)), "detail": str(getattr(e, "detail", None) or e)}
+            if job._finish("error", ("error", error)):
+                self._count("failed")
+            return
+        # A job already failed by shutdown() keeps that outcome
+        if job._finish("done", ("done", result)):
+            self._count("completed")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            states = [j.status for j in self._jobs.values()]
+            counts = {"completed": self.completed, "failed": self.failed, "rejected": self.rejected}
+        return {
+            "workers": self.workers,
+            "per_owner": self.per_owner,
+            "queued": states.count("queued"),
+            "running": states.count("running"),
+            **counts,
+        }
+
+    def shutdown(self) -> None:
+        """Stop the workers. Unfinished jobs fail with 503 so their waiters and streams end instead of hanging."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            pending = [j for j in self._jobs.values() if not j.finished]
+        for job in pending:
+            if job._finish("error", ("error", {"status_code": 503, "detail": "Shutting down"})):
+                self._count("failed")
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+insights_jobs = JobQueue(
+    workers=int(os.getenv("INSIGHTS_WORKERS") or 4),
+    per_owner=int(os.getenv("INSIGHTS_USER_CONCURRENCY") or 2),
+    max_pending=int(os.getenv("INSIGHTS_QUEUE_MAX") or 64),
+)
+
+
+async def sse_job_events(
+    job: Job,
+    *,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    keepalive: float = 15.0,
+) -> AsyncIterator[str]:
+    """Server-Sent Events frames for a job: `token` per text delta, then one `done` or `error`; pings when idle."""
+    queue = job.subscribe()
+    try:
+        yield ": connected\n\n"
+        while True:
+            if is_disconnected is not None and await is_disconnected():
+                return
+            try:
+                name, data = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            payload = {"text": data} if name == "token" else data
+            yield f"event: {name}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+            if name in ("done", "error"):
+                return
+    finally:
+        job.unsubscribe(queue)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.db import journal_filters
+
+
+# PnL and R per closed trade, computed in SQL; rows without an exit are still open and only counted
+_TRADES_SQL = """
+SELECT id, date, symbol, pnl,
+       CASE WHEN stop IS NOT NULL AND entry != stop AND qty != 0 THEN pnl / (ABS(entry - stop) * ABS(qty)) END AS r
+FROM (
+    SELECT id, date, symbol, entry, stop, qty,
+           CASE direction WHEN 'Long' THEN (exit - entry) * qty ELSE (entry - exit) * qty END - COALESCE(fees, 0) AS pnl
+    FROM journal {where}
+)
+ORDER BY date ASC, id ASC
+"""
+
+
+def _groups(keys: Sequence[int], labels: Sequence[str], pnl: np.ndarray, r: np.ndarray) -> List[Dict[str, Any]]:
+    # Per-group aggregates with bincount over integer group ids; `keys` may repeat a trade (one per tag)
+    idx = np.asarray(keys, dtype=np.int64)
+    if not len(labels):
+        return []
+    k = len(labels)
+    trades = np.bincount(idx, minlength=k)
+    wins = np.bincount(idx, weights=(pnl > 0).astype(float), minlength=k)
+    total = np.bincount(idx, weights=pnl, minlength=k)
+    has_r = ~np.isnan(r)
+    r_n = np.bincount(idx, weights=has_r.astype(float), minlength=k)
+    r_sum = np.bincount(idx, weights=np.where(has_r, r, 0.0), minlength=k)
+    out = []
+    for g in sorted(range(k), key=lambda g: (-total[g], labels[g])):
+        n = int(trades[g])
+        out.append({
+            "key": labels[g],
+            "trades": n,
+            "wins": int(wins[g]),
+            "win_rate": float(wins[g] / n) if n else 0.0,
+            "pnl": float(total[g]),
+            "expectancy": float(total[g] / n) if n else 0.0,
+            "avg_r": float(r_sum[g] / r_n[g]) if r_n[g] else None,
+        })
+    return out
+
+
+def journal_stats(
+    conn: sqlite3.Connection,
+    *,
+    symbol: Optional[str] = None,
+    direction: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    tag: Optional[str] = None,
+    tag_mode: str = "any",
+    bins: int = 10,
+) -> Dict[str, Any]:
+    """
+    Aggregates over closed journal trades matching the query_journal filters.
+    PnL is (exit - entry) * qty for longs, (entry - exit) * qty for shorts, less fees; R is PnL over the
+    stop distance times qty (null without a stop). Returns totals, per-symbol and per-tag breakdowns sorted by
+    PnL, the cumulative PnL curve (one point per closed trade, oldest first) and a PnL histogram.
+    """
+    clauses, params = journal_filters(symbol=symbol, direction=direction, start=start, end=end, tag=tag, tag_mode=tag_mode)
+    open_where = f"WHERE {' AND '.join(clauses + ['exit IS NULL'])}"
+    open_trades = conn.execute(f"SELECT COUNT(*) FROM journal {open_where}", tuple(params)).fetchone()[0]
+    closed_where = f"WHERE {' AND '.join(clauses + ['exit IS NOT NULL'])}"
+    rows = conn.execute(_TRADES_SQL.format(where=closed_where), tuple(params)).fetchall()
+
+    pnl = np.array([row[3] for row in rows], dtype=float)
+    r = np.array([np.nan if row[4] is None else row[4] for row in rows], dtype=float)
+    n = len(rows)
+    wins, losses = pnl > 0, pnl < 0
+    gross_win, gross_loss = float(pnl[wins].sum()), float(-pnl[losses].sum())
+
+    symbols, sym_idx = np.unique(np.array([row[2] for row in rows], dtype=object), return_inverse=True) if n else ([], [])
+    # (trade, tag) pairs for the same closed rows, read through journal_tags
+    pos = {row[0]: i for i, row in enumerate(rows)}
+    pairs = conn.execute(
+        f"SELECT journal_tags.journal_id, journal_tags.tag FROM journal JOIN journal_tags ON journal_tags.journal_id = journal.id {closed_where}",
+        tuple(params),
+    ).fetchall()
+    tag_labels: Dict[str, int] = {}
+    tag_idx = [tag_labels.setdefault(t, len(tag_labels)) for _, t in pairs]
+    tr = np.array([pos[jid] for jid, _ in pairs], dtype=np.int64)
+
+    counts, edges = np.histogram(pnl, bins=int(bins)) if n else (np.zeros(0), np.zeros(0))
+    return {
+        "trades": n,
+        "open": int(open_trades),
+        "wins": int(wins.sum()),
+        "losses": int(losses.sum()),
+        "win_rate": float(wins.sum() / n) if n else 0.0,
+        "pnl": float(pnl.sum()),
+        "avg_win": float(pnl[wins].mean()) if wins.any() else 0.0,
+        "avg_loss": float(pnl[losses].mean()) if losses.any() else 0.0,
+        "expectancy": float(pnl.mean()) if n else 0.0,
+        "profit_factor": gross_win / gross_loss if gross_loss else None,
+        "avg_r": float(np.nanmean(r)) if (~np.isnan(r)).any() else None,
+        "by_symbol": _groups(sym_idx, [str(s) for s in symbols], pnl, r),
+        "by_tag": _groups(tag_idx, list(tag_labels), pnl[tr], r[tr]),
+        "equity": {"t": [row[1] for row in rows], "pnl": np.cumsum(pnl).tolist()},
+        "histogram": {"edges": edges.tolist(), "counts": [int(c) for c in counts]},
+    }
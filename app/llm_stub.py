@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """
+    Local stand-in for the OpenAI Chat Completions endpoint, for tests and offline development.
+    Replies "Stub plan: <first words of the prompt>", word by word as SSE chunks when the request sets `stream`.
+    """
+
+    calls: List[Dict[str, Any]] = []  # request bodies, in arrival order
+    delay = 0.0  # seconds between streamed chunks (and before a non-streamed reply)
+    status = 200
+
+    @classmethod
+    def reply_for(cls, body: Dict[str, Any]) -> str:
+        user = body["messages"][-1]["content"]
+        text = user if isinstance(user, str) else " ".join(p.get("text", "") for p in user if p.get("type") == "text")
+        return "Stub plan: " + " ".join(text.split()[:8])
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        type(self).calls.append(body)
+        if self.status != 200:
+            return self._json(self.status, {"error": {"message": "stub failure"}})
+        text = self.reply_for(body)
+        if not body.get("stream"):
+            time.sleep(self.delay)
+            return self._json(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]})
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        words = text.split(" ")
+        for i, w in enumerate(words):
+            chunk = {"choices": [{"index": 0, "delta": {"content": w if i == 0 else " " + w}}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def _json(self, status: int, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int = 0, host: str = "127.0.0.1") -> Tuple[ThreadingHTTPServer, str]:
+    """Start the stub on a background thread; returns the server (call .shutdown()) and its completions URL."""
+    srv = ThreadingHTTPServer((host, port), StubLLMHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, f"http://{host}:{srv.server_address[1]}/v1/chat/completions"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    # python -m app.llm_stub, then run the API with OPENAI_URL=http://127.0.0.1:9100/v1/chat/completions
+    parser = argparse.ArgumentParser(description="Stub OpenAI Chat Completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--delay", type=float, default=0.05, help="seconds between streamed words")
+    args = parser.parse_args()
+    StubLLMHandler.delay = args.delay
+    srv = ThreadingHTTPServer((args.host, args.port), StubLLMHandler)
+    print(f"[llm_stub] Serving http://{args.host}:{args.port}/v1/chat/completions")
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
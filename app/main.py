@@ -1,14 +1,14 @@
 from contextlib import asynccontextmanager
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
-from fastapi import FastAPI, Query, Body, HTTPException
+from fastapi import FastAPI, Query, Body, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
 from app.db import (
-    get_connection, init_db, list_prices, query_prices, get_price,
+    get_pool, pooled_connection, close_pools, list_prices, query_prices, query_prices_page, get_price, encode_cursor, latest_quotes, insert_prices,
     upsert_journal, delete_journal, query_journal,
     upsert_account, list_accounts, delete_account,
     upsert_portfolio, list_portfolios, delete_portfolio,
@@ -16,7 +16,21 @@ from app.db import (
     insert_entry_plan, list_entry_plans,
     ensure_user, insert_email_code, verify_email_code, create_session, get_session, delete_session,
 )
+from app.bars import INTERVALS, query_bars
+from app.cache import indicator_cache, performance_cache, quote_cache
+from app.ict import list_levels, refresh_structure
+from app.images import load_image, max_upload_bytes, store_image
+from app.indicators import compute_indicators, parse_periods
+from app.insights import generate_insights
+from app.jobs import Job, JobLimitError, insights_jobs, sse_job_events
+from app.journal import journal_stats
+from app.maintenance import maintenance_from_env
+from app.performance import compute_performance
+from app.search import KINDS as SEARCH_KINDS, search_text
+from app.http_client import http_client
+from app.stream import price_hub, sse_price_events
 from dotenv import load_dotenv, find_dotenv
+import hashlib
 import os
 
 
@@ -24,6 +38,29 @@ class HealthResponse(BaseModel):
     status: str = "ok"
 
 
+class PoolStats(BaseModel):
+    db_path: str
+    readonly: bool = False
+    size: int
+    open: int
+    in_use: int
+    idle: int
+    checkouts: int
+    waits: int
+
+
+class PoolStatsResponse(BaseModel):
+    items: List[PoolStats]
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    ttl: float
+    hits: int
+    misses: int
+
+
 class PriceItem(BaseModel):
     symbol: str
     price: float
@@ -38,6 +75,74 @@ class PricesResponse(BaseModel):
     count: int
     offset: int = 0
     next_offset: Optional[int] = None
+    next_cursor: Optional[str] = None
+
+
+class QuoteItem(BaseModel):
+    symbol: str
+    price: float
+    as_of: str
+    currency: Optional[str] = None
+    source: str
+    created_at: str
+    prev_price: Optional[float] = None
+    delta: float = 0.0
+
+
+class QuotesResponse(BaseModel):
+    items: List[QuoteItem]
+
+
+class BulkPricesResponse(BaseModel):
+    received: int
+    inserted: int
+    ignored: int
+
+
+class Bar(BaseModel):
+    t: str
+    open: float
+    high: float
+    low: float
+    close: float
+    count: int
+
+
+class BarsResponse(BaseModel):
+    symbol: str
+    interval: str
+    items: List[Bar]
+
+
+class IndicatorsResponse(BaseModel):
+    symbol: str
+    interval: str
+    as_of: str
+    cached: bool = False
+    t: List[str]
+    open: List[float]
+    high: List[float]
+    low: List[float]
+    close: List[float]
+    series: Dict[str, List[Optional[float]]]
+    swing_highs: List[int]
+    swing_lows: List[int]
+
+
+class StructureLevel(BaseModel):
+    kind: str
+    t: str
+    t2: Optional[str] = None
+    price: float
+    price2: Optional[float] = None
+    filled_at: Optional[str] = None
+
+
+class StructureResponse(BaseModel):
+    symbol: str
+    interval: str
+    summary: Dict[str, Any]
+    levels: List[StructureLevel]
 
 
 class IngestRequest(BaseModel):
@@ -86,16 +191,40 @@ class InsightsRequest(BaseModel):
     horizon: str = Field("daily", description="daily|weekly")
     notes: Optional[str] = None
     images: Optional[List[str]] = Field(None, description="Optional list of data URLs (image/*) to include for vision analysis")
+    image_digests: Optional[List[str]] = Field(None, description="Digests returned by POST /images (preferred over inline data URLs)")
+    refresh: bool = Field(False, description="Skip the insights cache and request a fresh completion")
 
 
 class InsightsResponse(BaseModel):
     summary: str
+    cached: bool = False
+    cache_key: Optional[str] = None
+    cached_at: Optional[str] = None
+    cache_hits: Optional[int] = None
+    model: Optional[str] = None
+
+
+class InsightsJob(BaseModel):
+    id: str
+    status: str  # queued | running | done | error
+    text: str = ""  # tokens streamed so far
+    result: Optional[InsightsResponse] = None
+    error: Optional[Dict[str, Any]] = None
 
 
 class InsightsStatus(BaseModel):
     enabled: bool
 
 
+class ImageUploadResponse(BaseModel):
+    digest: str
+    mime: str
+    width: int
+    height: int
+    size: int
+    deduped: bool = False
+
+
 class EntryPlan(BaseModel):
     id: Optional[int] = None
     symbol: str
@@ -109,6 +238,22 @@ class EntryPlan(BaseModel):
 
 class EntryPlanResponse(BaseModel):
     items: List[EntryPlan]
+    next_cursor: Optional[str] = None
+
+
+class SearchHit(BaseModel):
+    kind: str  # plan | journal
+    id: int
+    symbol: str
+    date: Optional[str] = None
+    snippet: str
+    score: float
+
+
+class SearchResponse(BaseModel):
+    q: str
+    items: List[SearchHit]
+    next_offset: Optional[int] = None
 
 
 class EmailStartRequest(BaseModel):
@@ -139,6 +284,35 @@ class JournalItem(BaseModel):
 
 class JournalResponse(BaseModel):
     items: list[JournalItem]
+    next_cursor: Optional[str] = None
+
+
+class JournalGroupStats(BaseModel):
+    key: str
+    trades: int
+    wins: int
+    win_rate: float
+    pnl: float
+    expectancy: float
+    avg_r: Optional[float] = None
+
+
+class JournalStatsResponse(BaseModel):
+    trades: int
+    open: int
+    wins: int
+    losses: int
+    win_rate: float
+    pnl: float
+    avg_win: float
+    avg_loss: float
+    expectancy: float
+    profit_factor: Optional[float] = None
+    avg_r: Optional[float] = None
+    by_symbol: List[JournalGroupStats]
+    by_tag: List[JournalGroupStats]
+    equity: Dict[str, List[Any]]
+    histogram: Dict[str, List[float]]
 
 
 # Wealth models
@@ -198,6 +372,18 @@ class PositionsResponse(BaseModel):
     items: list[Position]
 
 
+class PerformanceResponse(BaseModel):
+    portfolio_id: int
+    cached: bool = False
+    dates: List[str]
+    equity: List[float]
+    twr: List[float]
+    drawdown: List[float]
+    total_return: float
+    max_drawdown: float
+    volatility: float
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
@@ -208,15 +394,32 @@ async def lifespan(app: FastAPI):
         import pathlib
         env_file = str((pathlib.Path(__file__).resolve().parents[1] / ".env"))
     load_dotenv(dotenv_path=env_file, override=True)
-    with get_connection() as conn:
-        init_db(conn)
+    # Open the pool once so schema setup runs here instead of on every request
+    get_pool().warm()
+    get_pool(readonly=True).warm()
+    # Optional background ingestion of a fixed symbol universe
+    from ingest.scheduler import scheduler_from_env
+    scheduler = scheduler_from_env()
+    if scheduler:
+        scheduler.start()
+        print(f"[startup] Ingest scheduler: {len(scheduler.jobs)} symbols every {scheduler.interval:.0f}s")
+    # Retention purges, ANALYZE and incremental vacuum; only when MAINTENANCE_INTERVAL is set
+    maintenance = app.state.maintenance = maintenance_from_env()
+    if maintenance:
+        maintenance.start()
     # Simple startup diagnostics (does not print secrets)
     if os.getenv("OPENAI_API_KEY"):
         print("[startup] Insights: OPENAI_API_KEY detected")
     else:
         print("[startup] Insights: OPENAI_API_KEY not set (using fallback responses)")
     yield
-    # Shutdown (nothing yet)
+    # Shutdown
+    if scheduler:
+        scheduler.stop(timeout=5)
+    if maintenance:
+        maintenance.stop(timeout=5)
+    insights_jobs.shutdown()
+    close_pools()
 
 
 app = FastAPI(title="Market Insights App", lifespan=lifespan)
@@ -237,8 +440,7 @@ app.add_middleware(
 def _get_session_email(token: Optional[str]) -> Optional[str]:
     if not token:
         return None
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         row = get_session(conn, token=token)
         if not row:
             return None
@@ -281,23 +483,47 @@ def list_journal(
     direction: Optional[str] = Query(None),
     start: Optional[str] = Query(None),
     end: Optional[str] = Query(None),
-    tag: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None, description="Comma-separated tags, matched exactly"),
+    tag_mode: str = Query("any", description="any: rows with at least one of the tags; all: rows with every tag"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to return the full history"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
 ):
-    with get_connection() as conn:
-        init_db(conn)
-        rows = query_journal(conn, symbol=symbol, direction=direction, start=start, end=end, tag=tag)
+    with pooled_connection(readonly=True) as conn:
+        try:
+            rows = query_journal(conn, symbol=symbol, direction=direction, start=start, end=end, tag=tag, tag_mode=tag_mode, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     items: list[JournalItem] = []
     for r in rows:
         (rid, s, d, dirn, q, e, st, x, f, tags, notes, ca, ua) = r
         items.append(JournalItem(id=rid, symbol=s, date=d, direction=dirn, qty=q, entry=e, stop=st, exit=x, fees=f, tags=tags, notes=notes, created_at=ca, updated_at=ua))
-    return JournalResponse(items=items)
+    next_cursor = encode_cursor(items[-1].date, items[-1].id) if (limit and len(items) == limit) else None
+    return JournalResponse(items=items, next_cursor=next_cursor)
+
+
+@app.get("/journal/stats", response_model=JournalStatsResponse)
+def journal_stats_view(
+    symbol: Optional[str] = Query(None),
+    direction: Optional[str] = Query(None),
+    start: Optional[str] = Query(None),
+    end: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None, description="Comma-separated tags, matched exactly"),
+    tag_mode: str = Query("any", description="any: rows with at least one of the tags; all: rows with every tag"),
+    bins: int = Query(10, ge=1, le=100, description="PnL histogram bins"),
+):
+    """Win rate, PnL, R, expectancy, per-symbol/per-tag breakdowns, equity curve and PnL histogram for the filtered journal."""
+    with pooled_connection(readonly=True) as conn:
+        try:
+            stats = journal_stats(conn, symbol=symbol, direction=direction, start=start, end=end, tag=tag, tag_mode=tag_mode, bins=bins)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return JournalStatsResponse(**stats)
 
 
 # Wealth API
 @app.get("/accounts", response_model=AccountsResponse)
 def accounts_list():
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection(readonly=True) as conn:
         rows = list_accounts(conn)
     items = [Account(id=r[0], name=r[1], type=r[2], currency=r[3], created_at=r[4], updated_at=r[5]) for r in rows]
     return AccountsResponse(items=items)
@@ -305,8 +531,7 @@ def accounts_list():
 
 @app.post("/accounts", response_model=Account)
 def accounts_save(item: Account = Body(...)):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         rid = upsert_account(conn, id=item.id, name=item.name, type=item.type, currency=item.currency)
         rows = list_accounts(conn)
     for r in rows:
@@ -317,8 +542,7 @@ def accounts_save(item: Account = Body(...)):
 
 @app.delete("/accounts/{rid}")
 def accounts_delete(rid: int):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         n = delete_account(conn, id=rid)
     if n == 0:
         raise HTTPException(status_code=404, detail="Account not found")
@@ -327,8 +551,7 @@ def accounts_delete(rid: int):
 
 @app.get("/portfolios", response_model=PortfoliosResponse)
 def portfolios_list():
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection(readonly=True) as conn:
         rows = list_portfolios(conn)
     items = [Portfolio(id=r[0], name=r[1], base_currency=r[2], created_at=r[3], updated_at=r[4]) for r in rows]
     return PortfoliosResponse(items=items)
@@ -336,8 +559,7 @@ def portfolios_list():
 
 @app.post("/portfolios", response_model=Portfolio)
 def portfolios_save(item: Portfolio = Body(...)):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         rid = upsert_portfolio(conn, id=item.id, name=item.name, base_currency=item.base_currency)
         rows = list_portfolios(conn)
     for r in rows:
@@ -348,8 +570,7 @@ def portfolios_save(item: Portfolio = Body(...)):
 
 @app.delete("/portfolios/{rid}")
 def portfolios_delete(rid: int):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         n = delete_portfolio(conn, id=rid)
     if n == 0:
         raise HTTPException(status_code=404, detail="Portfolio not found")
@@ -358,8 +579,7 @@ def portfolios_delete(rid: int):
 
 @app.get("/portfolios/{pid}/transactions", response_model=TxnResponse)
 def transactions_list(pid: int = 0):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection(readonly=True) as conn:
         rows = list_transactions(conn, portfolio_id=pid)
     items = [Txn(id=r[0], portfolio_id=r[1], date=r[2], symbol=r[3], type=r[4], qty=r[5], price=r[6], fees=r[7], currency=r[8], notes=r[9], created_at=r[10], updated_at=r[11]) for r in rows]
     return TxnResponse(items=items)
@@ -367,8 +587,7 @@ def transactions_list(pid: int = 0):
 
 @app.post("/portfolios/{pid}/transactions", response_model=Txn)
 def transactions_add(pid: int, item: Txn = Body(...)):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         rid = insert_transaction(conn, portfolio_id=pid, date=item.date, symbol=item.symbol, type=item.type, qty=item.qty, price=item.price, fees=item.fees, currency=item.currency, notes=item.notes)
         rows = list_transactions(conn, portfolio_id=pid)
     for r in rows:
@@ -379,8 +598,7 @@ def transactions_add(pid: int, item: Txn = Body(...)):
 
 @app.delete("/transactions/{rid}")
 def transactions_delete(rid: int):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         n = delete_transaction(conn, id=rid)
     if n == 0:
         raise HTTPException(status_code=404, detail="Transaction not found")
@@ -389,16 +607,24 @@ def transactions_delete(rid: int):
 
 @app.get("/portfolios/{pid}/positions", response_model=PositionsResponse)
 def positions_list(pid: int):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection(readonly=True) as conn:
         items = [Position(**p) for p in compute_positions(conn, portfolio_id=pid)]
     return PositionsResponse(items=items)
 
 
+@app.get("/portfolios/{pid}/performance", response_model=PerformanceResponse)
+def portfolio_performance(pid: int):
+    """Daily equity, time-weighted return, drawdown and annualised volatility valued at daily closes."""
+    with pooled_connection(readonly=True) as conn:
+        perf = compute_performance(conn, portfolio_id=pid)
+    if perf is None:
+        raise HTTPException(status_code=404, detail="No trades for portfolio")
+    return PerformanceResponse(portfolio_id=pid, **perf)
+
+
 @app.post("/journal", response_model=JournalItem)
 def save_journal(item: JournalItem = Body(...)):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         rid = upsert_journal(conn, id=item.id, symbol=item.symbol, date=item.date, direction=item.direction, qty=item.qty, entry=item.entry, stop=item.stop, exit=item.exit, fees=item.fees, tags=item.tags, notes=item.notes)
         rows = query_journal(conn)
     # return the newly saved row
@@ -411,8 +637,7 @@ def save_journal(item: JournalItem = Body(...)):
 
 @app.delete("/journal/{rid}")
 def delete_journal_row(rid: int):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         n = delete_journal(conn, id=rid)
     if n == 0:
         raise HTTPException(status_code=404, detail="Journal row not found")
@@ -424,6 +649,42 @@ def root():
     return {"status": "ok"}
 
 
+@app.get("/health/db", response_model=PoolStatsResponse)
+def db_pool_stats():
+    pools = [get_pool(), get_pool(readonly=True)]
+    return PoolStatsResponse(items=[PoolStats(**p.stats()) for p in pools])
+
+
+@app.get("/health/http")
+def http_client_stats():
+    """Per-provider outbound request counts, retries, errors and latency (ms)."""
+    return {"providers": http_client.stats()}
+
+
+@app.get("/health/maintenance")
+def maintenance_stats():
+    """Background maintenance: interval (seconds, null when off) and the last pass's counts."""
+    maintenance = getattr(app.state, "maintenance", None)
+    if maintenance is None:
+        return {"interval": None, "last_result": None}
+    return {"interval": maintenance.interval, "last_result": maintenance.last_result}
+
+
+@app.get("/health/cache", response_model=CacheStats)
+def quote_cache_stats():
+    return CacheStats(**quote_cache.stats())
+
+
+@app.get("/health/cache/indicators", response_model=CacheStats)
+def indicator_cache_stats():
+    return CacheStats(**indicator_cache.stats())
+
+
+@app.get("/health/cache/performance", response_model=CacheStats)
+def performance_cache_stats():
+    return CacheStats(**performance_cache.stats())
+
+
 # ===== Email magic-code authentication =====
 @app.post("/auth/request_code")
 def auth_request_code(payload: EmailStartRequest = Body(...)):
@@ -437,8 +698,7 @@ def auth_request_code(payload: EmailStartRequest = Body(...)):
     if not email or "@" not in email:
         raise HTTPException(status_code=400, detail="Invalid email")
     code = "".join(random.choice(string.digits) for _ in range(6))
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         ensure_user(conn, email=email)
         insert_email_code(conn, email=email, code=code, ttl_minutes=10)
     # Try to send email via SMTP if configured
@@ -485,8 +745,7 @@ def auth_verify_code(payload: EmailVerifyRequest = Body(...)):
     import secrets
     email = payload.email.strip().lower()
     code = payload.code.strip()
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         if not verify_email_code(conn, email=email, code=code):
             raise HTTPException(status_code=400, detail="Invalid or expired code")
         token = secrets.token_urlsafe(32)
@@ -516,14 +775,43 @@ def auth_logout(session: Optional[str] = Query(default=None)):
             cookie_token = None
     token = cookie_token or session
     if token:
-        with get_connection() as conn:
-            init_db(conn)
+        with pooled_connection() as conn:
             delete_session(conn, token=token)
     resp = HTMLResponse(content="OK")
     resp.delete_cookie("session")
     return resp
 
 
+def _prices_page(
+    *,
+    symbol: Optional[str],
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+) -> PricesResponse:
+    with pooled_connection(readonly=True) as conn:
+        try:
+            rows, next_cursor = query_prices_page(conn, symbol=symbol, start=start, end=end, limit=limit, offset=offset, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    items = [
+        PriceItem(
+            symbol=s,
+            price=p,
+            as_of=a,
+            currency=c,
+            source=src,
+            created_at=cr,
+        )
+        for s, p, a, c, src, cr in rows
+    ]
+    # Offset paging is kept for backwards compatibility; cursor paging has no meaningful next_offset
+    next_off = offset + limit if (len(items) == limit and not cursor) else None
+    return PricesResponse(items=items, count=len(items), offset=offset, next_offset=next_off, next_cursor=next_cursor)
+
+
 @app.get("/prices", response_model=PricesResponse)
 def get_prices(
     limit: int = Query(10, ge=1, le=100),
@@ -531,41 +819,158 @@ def get_prices(
     symbol: Optional[str] = Query(None),
     start: Optional[str] = Query(None, description="ISO8601 start, e.g., 2024-01-01T00:00:00Z or 2024-01-01"),
     end: Optional[str] = Query(None, description="ISO8601 end"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (takes precedence over offset)"),
 ):
-    with get_connection() as conn:
-        rows = query_prices(conn, symbol=symbol, start=start, end=end, limit=limit, offset=offset)
-        items = [
-            PriceItem(
-                symbol=s,
-                price=p,
-                as_of=a,
-                currency=c,
-                source=src,
-                created_at=cr,
-            )
-            for s, p, a, c, src, cr in rows
-        ]
-        next_off = offset + limit if len(items) == limit else None
-        return PricesResponse(items=items, count=len(items), offset=offset, next_offset=next_off)
+    return _prices_page(symbol=symbol, start=start, end=end, limit=limit, offset=offset, cursor=cursor)
 
 
 @app.get("/prices/{symbol}", response_model=PricesResponse)
-def get_prices_for_symbol(symbol: str, limit: int = Query(10, ge=1, le=100), offset: int = Query(0, ge=0)):
-    with get_connection() as conn:
-        rows = query_prices(conn, symbol=symbol, limit=limit, offset=offset)
-        items = [
-            PriceItem(
-                symbol=s,
-                price=p,
-                as_of=a,
-                currency=c,
-                source=src,
-                created_at=cr,
+def get_prices_for_symbol(
+    symbol: str,
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (takes precedence over offset)"),
+):
+    return _prices_page(symbol=symbol, limit=limit, offset=offset, cursor=cursor)
+
+
+@app.post("/prices/bulk", response_model=BulkPricesResponse)
+async def prices_bulk(request: Request, source: Optional[str] = Query(None, description="Default source for rows without one")):
+    """
+    Bulk insert price rows in one transaction. Body is a JSON array of
+    {symbol, price, as_of, currency?, source?} objects, or NDJSON (one object per line)
+    when Content-Type is application/x-ndjson. Rows already stored (same symbol/as_of/source) are ignored.
+    """
+    import json
+    from starlette.concurrency import run_in_threadpool
+
+    raw = await request.body()
+    ctype = (request.headers.get("content-type") or "").split(";")[0].strip().lower()
+    try:
+        if ctype in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+            rows = [json.loads(line) for line in raw.splitlines() if line.strip()]
+        else:
+            rows = json.loads(raw or b"[]")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of price rows")
+
+    def write():
+        with pooled_connection() as conn:
+            return insert_prices(conn, rows, source=source)
+
+    try:
+        inserted, ignored = await run_in_threadpool(write)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return BulkPricesResponse(received=len(rows), inserted=inserted, ignored=ignored)
+
+
+@app.get("/bars/{symbol}", response_model=BarsResponse)
+def get_bars(
+    symbol: str,
+    interval: str = Query("1h", description="|".join(INTERVALS)),
+    start: Optional[str] = Query(None, description="ISO8601 start; omit for the latest `limit` bars"),
+    end: Optional[str] = Query(None, description="ISO8601 end"),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    with pooled_connection(readonly=True) as conn:
+        try:
+            rows = query_bars(conn, symbol=symbol, interval=interval, start=start, end=end, limit=limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    items = [Bar(t=t, open=o, high=h, low=lo, close=c, count=n) for t, o, h, lo, c, n in rows]
+    return BarsResponse(symbol=symbol, interval=interval, items=items)
+
+
+@app.get("/indicators/{symbol}", response_model=IndicatorsResponse)
+def get_indicators(
+    symbol: str,
+    interval: str = Query("1h", description="|".join(INTERVALS)),
+    limit: int = Query(300, ge=1, le=5000),
+    sma: Optional[str] = Query(None, description="Comma-separated SMA periods (default 20,50)"),
+    ema: Optional[str] = Query(None, description="Comma-separated EMA periods (default 20)"),
+    std: int = Query(14, ge=2, le=1000, description="Rolling std window"),
+    window: int = Query(20, ge=1, le=1000, description="Rolling high/low window"),
+    atr: int = Query(14, ge=1, le=1000, description="ATR period"),
+    swing: int = Query(2, ge=1, le=50, description="Bars on each side confirming a swing high/low"),
+):
+    try:
+        sma_periods = parse_periods(sma, (20, 50))
+        ema_periods = parse_periods(ema, (20,))
+        with pooled_connection(readonly=True) as conn:
+            out = compute_indicators(
+                conn, symbol=symbol, interval=interval, limit=limit,
+                sma_periods=sma_periods, ema_periods=ema_periods,
+                std_window=std, range_window=window, atr_period=atr, swing=swing,
             )
-            for s, p, a, c, src, cr in rows
-        ]
-        next_off = offset + limit if len(items) == limit else None
-        return PricesResponse(items=items, count=len(items), offset=offset, next_offset=next_off)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if out is None:
+        raise HTTPException(status_code=404, detail=f"No bars for {symbol}")
+    return IndicatorsResponse(symbol=symbol, interval=interval, **out)
+
+
+@app.get("/structure/{symbol}", response_model=StructureResponse)
+def get_structure(
+    symbol: str,
+    interval: str = Query("1h", description="|".join(INTERVALS)),
+    levels: int = Query(50, ge=0, le=1000, description="How many persisted levels to return, newest first"),
+    open_only: bool = Query(False, description="Only unfilled gaps / unswept equal levels (and swings)"),
+    full: bool = Query(False, description="Re-detect from scratch instead of updating the tail"),
+):
+    # Refreshing persists new levels, so this uses the read-write pool; unchanged bars cost one lookup
+    with pooled_connection() as conn:
+        try:
+            summary = refresh_structure(conn, symbol=symbol, interval=interval, full=full)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if summary is None:
+            raise HTTPException(status_code=404, detail=f"No bars for {symbol}")
+        rows = list_levels(conn, symbol=symbol, interval=interval, open_only=open_only, limit=levels) if levels else []
+    items = [StructureLevel(kind=k, t=t, t2=t2, price=p, price2=p2, filled_at=f) for k, t, t2, p, p2, f in rows]
+    return StructureResponse(symbol=symbol, interval=interval, summary=summary, levels=items)
+
+
+@app.get("/quotes", response_model=QuotesResponse)
+def get_quotes(symbols: str = Query(..., description="Comma-separated symbols, e.g. EURUSD,XAUUSD,AAPL")):
+    wanted = [s.strip() for s in symbols.split(",") if s.strip()]
+    if len(wanted) > 200:
+        raise HTTPException(status_code=400, detail="Too many symbols (max 200)")
+    with pooled_connection(readonly=True) as conn:
+        rows = latest_quotes(conn, symbols=wanted)
+    items = [
+        QuoteItem(
+            symbol=s,
+            price=p,
+            as_of=a,
+            currency=c,
+            source=src,
+            created_at=cr,
+            prev_price=prev,
+            delta=(p - prev) if prev is not None else 0.0,
+        )
+        for s, p, a, c, src, cr, prev in rows
+    ]
+    return QuotesResponse(items=items)
+
+
+@app.get("/stream/prices")
+async def stream_prices(request: Request, symbols: Optional[str] = Query(None, description="Comma-separated symbols; omit for all")):
+    """Server-Sent Events: one `price` event per newly stored row for the subscribed symbols."""
+    # Subscriptions match symbols case-insensitively, so rows stored in any case are delivered
+    wanted = [s.strip() for s in (symbols or "").split(",") if s.strip()]
+    sub = price_hub.subscribe(wanted)
+
+    async def events():
+        try:
+            async for frame in sse_price_events(sub, is_disconnected=request.is_disconnected):
+                yield frame
+        finally:
+            price_hub.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 
 @app.post("/ingest/alpha_vantage", response_model=IngestResponse)
@@ -579,18 +984,21 @@ def ingest_alpha_vantage(payload: IngestRequest = Body(...)):
     data = fetch_price(payload.symbol, api_key)
     # Persist
     from app.db import insert_price
-    with get_connection() as conn:
-        init_db(conn)
-        insert_price(
-            conn,
-            symbol=data["symbol"],
-            price=data["price"],
-            as_of=data["as_of"],
-            currency=data.get("currency"),
-            source="alpha_vantage",
-        )
+    with pooled_connection() as conn:
+        try:
+            insert_price(
+                conn,
+                symbol=data["symbol"],
+                price=data["price"],
+                as_of=data["as_of"],
+                currency=data.get("currency"),
+                source="alpha_vantage",
+            )
+        except ValueError as e:
+            # e.g. a quote without a usable timestamp
+            raise HTTPException(status_code=502, detail=f"Provider returned an unusable quote: {e}")
     # Read back to include created_at
-    with get_connection() as conn:
+    with pooled_connection() as conn:
         row = get_price(conn, symbol=data["symbol"], as_of=data["as_of"], source="alpha_vantage")
     if not row:
         raise HTTPException(status_code=500, detail="Saved row not found")
@@ -613,18 +1021,21 @@ def ingest_fx(payload: FXIngestRequest = Body(...)):
     except Exception as e:
         # Convert upstream/provider errors into a 502 to inform the client cleanly
         raise HTTPException(status_code=502, detail=f"FX ingest failed: {e}")
-    # Ensure row exists even if mocked save didn't write; init schema and insert idempotently
+    # Ensure row exists even if mocked save didn't write; insert idempotently
     from app.db import insert_price
-    with get_connection() as conn:
-        init_db(conn)
-        insert_price(
-            conn,
-            symbol=item["symbol"],
-            price=item["price"],
-            as_of=item["as_of"],
-            currency=item.get("currency"),
-            source="alpha_vantage_fx",
-        )
+    with pooled_connection() as conn:
+        try:
+            insert_price(
+                conn,
+                symbol=item["symbol"],
+                price=item["price"],
+                as_of=item["as_of"],
+                currency=item.get("currency"),
+                source="alpha_vantage_fx",
+            )
+        except ValueError as e:
+            # e.g. a quote without a usable timestamp
+            raise HTTPException(status_code=502, detail=f"Provider returned an unusable quote: {e}")
         row = get_price(conn, symbol=item["symbol"], as_of=item["as_of"], source="alpha_vantage_fx")
     if not row:
         raise HTTPException(status_code=500, detail="Saved row not found")
@@ -670,70 +1081,98 @@ def get_calendar(country: Optional[str] = Query(None)):
     return CalendarResponse(items=items)
 
 
+def _job_owner(request: Request) -> str:
+    # Concurrency is limited per signed-in session, else per client address
+    token = request.cookies.get("session")
+    if token:
+        return "session:" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+    return "addr:" + (request.client.host if request.client else "unknown")
+
+
+def _submit_insights(request: Request, payload: InsightsRequest, *, stream: bool, limited: bool = True) -> Job:
+    def run(on_token):
+        return generate_insights(symbol=payload.symbol, horizon=payload.horizon, notes=payload.notes, images=payload.images, image_digests=payload.image_digests, refresh=payload.refresh, on_token=on_token if stream else None)
+
+    try:
+        return insights_jobs.submit(_job_owner(request), run, limited=limited)
+    except JobLimitError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+
 @app.post("/insights", response_model=InsightsResponse)
-def get_insights(payload: InsightsRequest = Body(...)):
-    import os
-    import json
-    import logging
-    import requests
+async def get_insights(request: Request, payload: InsightsRequest = Body(...)):
+    """
+    Blocking-style call kept for simple clients: runs as an insights job and awaits its result.
+    Not subject to the per-user and queue limits of /insights/jobs, as before jobs existed.
+    """
+    outcome = await _submit_insights(request, payload, stream=False, limited=False).wait()
+    if outcome["event"] == "error":
+        raise HTTPException(status_code=outcome["data"]["status_code"], detail=outcome["data"]["detail"])
+    return InsightsResponse(**outcome["data"])
+
+
+@app.post("/insights/jobs", response_model=InsightsJob, status_code=202)
+async def insights_job_create(request: Request, payload: InsightsRequest = Body(...)):
+    """Queue an insights completion; follow `/insights/jobs/{id}/events` (SSE) for tokens or poll `/insights/jobs/{id}`."""
+    job = _submit_insights(request, payload, stream=True)
+    return InsightsJob(**job.snapshot())
+
+
+@app.get("/insights/jobs/{job_id}", response_model=InsightsJob)
+async def insights_job_status(job_id: str):
+    job = insights_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return InsightsJob(**job.snapshot())
+
+
+@app.get("/insights/jobs/{job_id}/events")
+async def insights_job_events(request: Request, job_id: str):
+    """Server-Sent Events: `token` frames ({"text"}) as the model writes, then `done` (InsightsResponse) or `error`."""
+    job = insights_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    frames = sse_job_events(job, is_disconnected=request.is_disconnected)
+    return StreamingResponse(frames, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    key = os.getenv("OPENAI_API_KEY")
-    model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-    org = os.getenv("OPENAI_ORG_ID")
-    project = os.getenv("OPENAI_PROJECT_ID")
-    prompt = f"Provide a {payload.horizon} view for {payload.symbol} with risks and potential trade setups. {payload.notes or ''}".strip()
-    if not key:
-        extra = "\n\n[Note] Vision inputs not processed in demo mode." if (payload.images and len(payload.images)>0) else ""
-        return InsightsResponse(summary=("[Demo] " + prompt + "\n\nNote: Set OPENAI_API_KEY to enable live GPT insights." + extra))
+
+@app.get("/health/insights")
+def insights_job_stats():
+    """Insights worker pool: queued/running jobs and completed/failed/rejected counts."""
+    return insights_jobs.stats()
+
+
+@app.post("/images", response_model=ImageUploadResponse)
+async def images_upload(request: Request):
+    """
+    Store a vision input. Body is the raw image (any format Pillow reads); it is downscaled to IMAGE_MAX_SIDE,
+    recompressed as JPEG and stored by digest. Re-uploading the same file returns the existing digest.
+    """
+    from starlette.concurrency import run_in_threadpool
+
+    raw = await request.body()
+    if len(raw) > max_upload_bytes():
+        raise HTTPException(status_code=413, detail=f"Image larger than {max_upload_bytes()} bytes")
+    if not raw:
+        raise HTTPException(status_code=400, detail="Empty body")
+
+    def write():
+        with pooled_connection() as conn:
+            return store_image(conn, raw)
 
     try:
-        headers = {
-            "Authorization": f"Bearer {key}",
-            "Content-Type": "application/json",
-        }
-        if org:
-            headers["OpenAI-Organization"] = org
-        if project:
-            headers["OpenAI-Project"] = project
-
-        # Build a Chat Completions request; include images when provided
-        url = "https://api.openai.com/v1/chat/completions"
-        content = [{"type": "text", "text": prompt}]
-        imgs = payload.images or []
-        for u in imgs[:5]:  # cap to 5 images
-            try:
-                if isinstance(u, str) and u.startswith("data:image"):
-                    content.append({"type": "image_url", "image_url": {"url": u}})
-            except Exception:
-                pass
-        body = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": "You are an ICT trading mentor. Use ICT concepts (liquidity, displacement, PD arrays, OTE, FVG/OB, killzones) to craft concise, actionable plans."},
-                {"role": "user", "content": content},
-            ],
-            "temperature": 0.4,
-        }
-        r = requests.post(url, headers=headers, json=body, timeout=60)
-        if r.status_code != 200:
-            # Log a safe summary; do not log the API key
-            try:
-                err = r.json()
-                msg = err.get("error", {}).get("message", str(err))
-            except Exception:
-                msg = r.text[:300]
-            logging.warning("OpenAI insights upstream error %s: %s", r.status_code, msg)
-            from fastapi import HTTPException
-            raise HTTPException(status_code=502, detail=f"OpenAI error {r.status_code}: {msg}")
-        body = r.json()
-        txt = body["choices"][0]["message"]["content"].strip()
-        # Do not auto-persist here; the client saves entry plans explicitly after generation
-        return InsightsResponse(summary=txt)
-    except requests.RequestException as e:
-        import traceback
-        logging.warning("OpenAI insights network error: %s", str(e))
-        from fastapi import HTTPException
-        raise HTTPException(status_code=502, detail="Network error calling OpenAI (check connectivity/firewall)")
+        return ImageUploadResponse(**await run_in_threadpool(write))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/images/{digest}")
+def images_get(digest: str):
+    with pooled_connection(readonly=True) as conn:
+        img = load_image(conn, digest)
+    if img is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return Response(content=img[1], media_type=img[0], headers={"Cache-Control": "public, max-age=31536000, immutable"})
 
 
 @app.get("/insights/status", response_model=InsightsStatus)
@@ -743,21 +1182,47 @@ def insights_status():
 
 # Entry Plans API (persisted)
 @app.get("/entry_plans", response_model=EntryPlanResponse)
-def entry_plans_list(symbol: Optional[str] = Query(None), limit: int = Query(50, ge=1, le=200), offset: int = Query(0, ge=0)):
-    with get_connection() as conn:
-        init_db(conn)
-        rows = list_entry_plans(conn, symbol=symbol, limit=limit, offset=offset)
+def entry_plans_list(
+    symbol: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page (takes precedence over offset)"),
+):
+    with pooled_connection(readonly=True) as conn:
+        try:
+            rows = list_entry_plans(conn, symbol=symbol, limit=limit, offset=offset, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     items: List[EntryPlan] = []
     for r in rows:
         rid, sym, text, horizon, source, notes, images, created_at = r
         items.append(EntryPlan(id=rid, symbol=sym, text=text, horizon=horizon, source=source, notes=notes, images=images, created_at=created_at))
-    return EntryPlanResponse(items=items)
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(items) == limit else None
+    return EntryPlanResponse(items=items, next_cursor=next_cursor)
+
+
+@app.get("/search", response_model=SearchResponse)
+def search(
+    q: str = Query(..., min_length=1, description="Words to match (all required); word* for a prefix"),
+    kind: Optional[str] = Query(None, description="Comma-separated: plan, journal (default both)"),
+    symbol: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+):
+    """Full-text search over entry plans and journal notes, bm25-ranked, with <mark>-highlighted snippets."""
+    kinds = tuple(k.strip() for k in kind.split(",") if k.strip()) if kind else SEARCH_KINDS
+    with pooled_connection(readonly=True) as conn:
+        try:
+            hits = search_text(conn, q=q, kinds=kinds, symbol=symbol, limit=limit, offset=offset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    next_offset = offset + limit if len(hits) == limit else None
+    return SearchResponse(q=q, items=[SearchHit(**h) for h in hits], next_offset=next_offset)
 
 
 @app.post("/entry_plans", response_model=EntryPlan)
 def entry_plan_save(item: EntryPlan = Body(...)):
-    with get_connection() as conn:
-        init_db(conn)
+    with pooled_connection() as conn:
         rid = insert_entry_plan(conn, symbol=item.symbol, text=item.text, horizon=item.horizon, source=item.source, notes=item.notes, images=item.images or 0)
         rows = list_entry_plans(conn, symbol=item.symbol, limit=1, offset=0)
     if rows:
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.archive import drop_partitions
+from app.db import pooled_connection
+from app.insights import cache_ttl
+
+
+log = logging.getLogger("app.maintenance")
+
+DAY = 86400
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """How long each kind of data is kept and how deletes are paced (see `from_env`); 0 days keeps it forever."""
+
+    ticks_days: int = 0  # raw ticks (live and archived); bars of the pruned period are kept
+    minute_bars_days: int = 0  # 1m bars, only where the raw ticks are already gone; 1h/1d bars are kept
+    images_days: int = 0  # stored vision inputs not used in insights for this long
+    batch_size: int = 2000  # rows per delete transaction
+    pause: float = 0.05  # seconds between batches so other writers get the lock
+    vacuum_pages: int = 1000  # free pages released per incremental_vacuum step
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        d = cls()
+        return cls(
+            ticks_days=int(os.getenv("RETAIN_TICKS_DAYS") or d.ticks_days),
+            minute_bars_days=int(os.getenv("RETAIN_1M_BARS_DAYS") or d.minute_bars_days),
+            images_days=int(os.getenv("RETAIN_IMAGES_DAYS") or d.images_days),
+            batch_size=max(1, int(os.getenv("MAINTENANCE_BATCH") or d.batch_size)),
+            pause=float(os.getenv("MAINTENANCE_PAUSE") or d.pause),
+            vacuum_pages=max(1, int(os.getenv("MAINTENANCE_VACUUM_PAGES") or d.vacuum_pages)),
+        )
+
+
+def _day_cutoff(days: int, now: Optional[float]) -> int:
+    # Whole UTC days, so the cutoff is a bucket boundary for every rollup (1m/1h/1d)
+    return (int(now if now is not None else time.time()) // DAY - int(days)) * DAY
+
+
+def _batched_delete(conn: sqlite3.Connection, policy: RetentionPolicy, table: str, key: str, where: str, params: Tuple[Any, ...] = ()) -> int:
+    """Delete the rows matching `where`, at most `policy.batch_size` per short write transaction. Returns the count."""
+    sql = f"DELETE FROM {table} WHERE ({key}) IN (SELECT {key} FROM {table} WHERE {where} LIMIT ?);"
+    total = 0
+    while True:
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE;")
+        try:
+            n = conn.execute(sql, (*params, policy.batch_size)).rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        total += n
+        if n < policy.batch_size:
+            return total
+        time.sleep(policy.pause)
+
+
+# ===== Retention =====
+def purge_expired(conn: sqlite3.Connection, policy: Optional[RetentionPolicy] = None) -> Dict[str, int]:
+    """Delete expired login codes and sessions, stale insights completions and long-unused images."""
+    policy = policy or RetentionPolicy.from_env()
+    out = {
+        "email_codes": _batched_delete(conn, policy, "email_codes", "rowid", "expires_at <= datetime('now')"),
+        "sessions": _batched_delete(conn, policy, "sessions", "rowid", "expires_at <= datetime('now')"),
+        # A disabled cache (TTL 0) keeps nothing
+        "insights_cache": _batched_delete(
+            conn, policy, "insights_cache", "key", "created_at <= datetime('now', ?)", (f"-{max(0, int(cache_ttl()))} seconds",)
+        ),
+        "images": 0,
+    }
+    if policy.images_days > 0:
+        out["images"] = _batched_delete(
+            conn, policy, "images", "digest", "last_used_at <= datetime('now', ?)", (f"-{int(policy.images_days)} days",)
+        )
+    return out
+
+
+def prune_ticks(conn: sqlite3.Connection, policy: Optional[RetentionPolicy] = None, *, now: Optional[float] = None) -> Dict[str, int]:
+    """
+    Delete raw ticks older than `policy.ticks_days` whole days, keeping their bars. Each symbol's retention mark
+    is raised first, so rollup rebuilds leave the pruned bars alone and re-ingested old ticks are ignored.
+    Like archiving, each symbol's two newest ticks stay for latest_quotes. Archived months that end before the
+    cutoff are removed with their files. Returns {"symbols", "ticks", "archived"}.
+    """
+    policy = policy or RetentionPolicy.from_env()
+    out = {"symbols": 0, "ticks": 0, "archived": 0}
+    if policy.ticks_days <= 0:
+        return out
+    cutoff = _day_cutoff(policy.ticks_days, now)
+    symbols = {
+        r[0] for r in conn.execute(
+            "SELECT name FROM symbols s WHERE EXISTS (SELECT 1 FROM price_ticks p WHERE p.symbol_id = s.id AND p.t < ?);",
+            (cutoff * 1000,),
+        )
+    }
+    symbols |= {r[0] for r in conn.execute("SELECT DISTINCT symbol FROM price_archive WHERE end_t <= ?;", (cutoff,))}
+    for sym in sorted(symbols):
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE;")
+        try:
+            conn.execute(
+                """
+                INSERT INTO price_retention(symbol, end_t) VALUES (?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET end_t = MAX(end_t, excluded.end_t), pruned_at = datetime('now');
+                """,
+                (sym, cutoff),
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        out["ticks"] += _batched_delete(
+            conn,
+            policy,
+            "price_ticks",
+            "id",
+            """
+            symbol_id = (SELECT id FROM symbols WHERE name = ?) AND t < ? AND id NOT IN (
+                SELECT l.id FROM price_ticks l WHERE l.symbol_id = (SELECT id FROM symbols WHERE name = ?)
+                ORDER BY l.t DESC, l.id DESC LIMIT 2
+            )
+            """,
+            (sym, cutoff * 1000, sym),
+        )
+        out["archived"] += drop_partitions(conn, before=cutoff, symbol=sym)
+        out["symbols"] += 1
+    return out
+
+
+def prune_minute_bars(conn: sqlite3.Connection, policy: Optional[RetentionPolicy] = None, *, now: Optional[float] = None) -> int:
+    """
+    Downsample: delete 1m bars older than `policy.minute_bars_days`, but only before each symbol's archive or
+    retention mark (where no raw ticks remain to rebuild them). 5m/15m queries there return no bars; 1h and
+    coarser are unaffected. Returns the number of bars deleted.
+    """
+    policy = policy or RetentionPolicy.from_env()
+    if policy.minute_bars_days <= 0:
+        return 0
+    cutoff = _day_cutoff(policy.minute_bars_days, now)
+    marks = conn.execute(
+        """
+        SELECT symbol, MAX(end_t) FROM (
+            SELECT symbol, end_t FROM price_archive UNION ALL SELECT symbol, end_t FROM price_retention
+        ) GROUP BY symbol;
+        """
+    ).fetchall()
+    return sum(
+        _batched_delete(conn, policy, "price_bars", "symbol, interval, t", "symbol = ? AND interval = '1m' AND t < ?", (sym, min(cutoff, int(mark))))
+        for sym, mark in marks
+    )
+
+
+# ===== Housekeeping =====
+def optimize(conn: sqlite3.Connection, policy: Optional[RetentionPolicy] = None) -> Dict[str, Any]:
+    """
+    Refresh planner statistics (a bounded ANALYZE) and, when the file uses auto_vacuum=INCREMENTAL, hand free
+    pages back to the OS a few at a time. Returns {"auto_vacuum", "free_pages", "vacuumed_pages"}.
+    """
+    policy = policy or RetentionPolicy.from_env()
+    # analysis_limit is per connection and conn may be pooled: put the default (no limit) back afterwards
+    conn.execute("PRAGMA analysis_limit = 1000;")
+    try:
+        conn.execute("ANALYZE;")
+        conn.commit()
+    finally:
+        conn.execute("PRAGMA analysis_limit = 0;")
+    mode = {0: "NONE", 1: "FULL", 2: "INCREMENTAL"}[int(conn.execute("PRAGMA auto_vacuum;").fetchone()[0])]
+    free = start = int(conn.execute("PRAGMA freelist_count;").fetchone()[0])
+    if mode == "INCREMENTAL":
+        while free > 0:
+            conn.execute(f"PRAGMA incremental_vacuum({int(policy.vacuum_pages)});").fetchall()
+            conn.commit()
+            left = int(conn.execute("PRAGMA freelist_count;").fetchone()[0])
+            if left >= free:
+                break
+            free = left
+            if free:
+                time.sleep(policy.pause)
+    elif free:
+        log.info("[maintenance] %d free pages; auto_vacuum is %s, run `python -m app.maintenance vacuum` once", free, mode)
+    return {"auto_vacuum": mode, "free_pages": free, "vacuumed_pages": start - free}
+
+
+def vacuum_full(conn: sqlite3.Connection) -> Dict[str, Any]:
+    """Rebuild the whole file with auto_vacuum=INCREMENTAL. Blocks writers while it runs; for the CLI."""
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+    conn.execute("VACUUM;")
+    return {"auto_vacuum": "INCREMENTAL", "pages": int(conn.execute("PRAGMA page_count;").fetchone()[0])}
+
+
+def run_maintenance(conn: sqlite3.Connection, policy: Optional[RetentionPolicy] = None, *, now: Optional[float] = None) -> Dict[str, Any]:
+    """One maintenance pass: expiry purges, tick retention, 1m downsampling, then ANALYZE and incremental vacuum."""
+    policy = policy or RetentionPolicy.from_env()
+    started = time.monotonic()
+    result: Dict[str, Any] = {"purged": purge_expired(conn, policy)}
+    result["ticks"] = prune_ticks(conn, policy, now=now)
+    result["minute_bars"] = prune_minute_bars(conn, policy, now=now)
+    result.update(optimize(conn, policy))
+    result["seconds"] = round(time.monotonic() - started, 3)
+    return result
+
+
+class MaintenanceScheduler:
+    """Runs run_maintenance every `interval` seconds on a daemon thread; the first pass is one interval after start."""
+
+    def __init__(self, *, interval: float, policy: Optional[RetentionPolicy] = None, db_path: Optional[Path] = None) -> None:
+        self.interval = float(interval)
+        self.policy = policy or RetentionPolicy.from_env()
+        self.db_path = db_path
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def run_once(self) -> Dict[str, Any]:
+        with pooled_connection(self.db_path) as conn:
+            result = run_maintenance(conn, self.policy)
+        log.info("[maintenance] %s", json.dumps(result))
+        self.last_result = result
+        return result
+
+    def run_forever(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("[maintenance] pass failed")
+
+    def start(self) -> None:
+        """Run in a daemon thread (used by the API lifespan unless MAINTENANCE_INTERVAL is 0)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+def maintenance_from_env() -> Optional[MaintenanceScheduler]:
+    """Scheduler every MAINTENANCE_INTERVAL seconds; None (no background maintenance) when it is unset or 0."""
+    interval = float(os.getenv("MAINTENANCE_INTERVAL") or 0)
+    if interval <= 0:
+        return None
+    return MaintenanceScheduler(interval=interval)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from app.db import get_connection, init_db
+
+    parser = argparse.ArgumentParser(description="Retention, downsampling and SQLite housekeeping")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "purge", "prune", "optimize", "vacuum"],
+                        help="run: everything (default); purge: expired auth/cache/images; prune: ticks and 1m bars; "
+                             "optimize: ANALYZE + incremental vacuum; vacuum: one full VACUUM enabling incremental mode")
+    parser.add_argument("--ticks-days", type=int, help="override RETAIN_TICKS_DAYS")
+    parser.add_argument("--bars-days", type=int, help="override RETAIN_1M_BARS_DAYS")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    env = RetentionPolicy.from_env()
+    policy = RetentionPolicy(
+        ticks_days=env.ticks_days if args.ticks_days is None else args.ticks_days,
+        minute_bars_days=env.minute_bars_days if args.bars_days is None else args.bars_days,
+        images_days=env.images_days,
+        batch_size=env.batch_size,
+        pause=env.pause,
+        vacuum_pages=env.vacuum_pages,
+    )
+    with get_connection() as conn:
+        init_db(conn)
+        if args.command == "run":
+            done: Any = run_maintenance(conn, policy)
+        elif args.command == "purge":
+            done = purge_expired(conn, policy)
+        elif args.command == "prune":
+            done = {"ticks": prune_ticks(conn, policy), "minute_bars": prune_minute_bars(conn, policy)}
+        elif args.command == "optimize":
+            done = optimize(conn, policy)
+        else:
+            done = vacuum_full(conn)
+        print(json.dumps(done))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import math
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.bars import bars_version
+from app.cache import performance_cache
+from app.db import cache_db_key
+
+
+TRADING_DAYS = 252  # annualisation factor for daily volatility
+
+
+def portfolio_version(conn: sqlite3.Connection, *, portfolio_id: int) -> Tuple[int, int]:
+    """(count, max id) of the portfolio's transactions; any insert or delete changes it (ids are never reused)."""
+    row = conn.execute(
+        "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM transactions WHERE portfolio_id=?",
+        (int(portfolio_id),),
+    ).fetchone()
+    return int(row[0]), int(row[1])
+
+
+def _ffill(times: np.ndarray, obs_t: np.ndarray, obs_v: np.ndarray) -> np.ndarray:
+    # Value of the latest observation at or before each time; NaN before the first one
+    if not len(obs_t):
+        return np.full(times.shape, np.nan)
+    idx = np.searchsorted(obs_t, times, side="right") - 1
+    return np.where(idx >= 0, obs_v[np.maximum(idx, 0)], np.nan)
+
+
+def compute_performance(conn: sqlite3.Connection, *, portfolio_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Daily equity curve and performance stats for a portfolio; None when it has no BUY/SELL transactions.
+
+    Holdings per day are the cumulative sum of signed BUY/SELL quantities; they are valued at the symbol's
+    daily close (1d rollup), or at its last trade price before the first close. Trade cash (qty * price
+    plus fees for buys, minus fees for sells) and dividends are external flows, so the time-weighted return
+    chains (equity_t + outflows_t) / (equity_{t-1} + inflows_t) - 1 and is not moved by deposits.
+    Results are cached per (portfolio version, newest daily bar of each held symbol).
+    """
+    pid = int(portfolio_id)
+    txns = conn.execute(
+        """
+        SELECT CAST(strftime('%s', date) AS INTEGER) / 86400 * 86400, symbol, UPPER(type), qty, price, fees
+        FROM transactions WHERE portfolio_id=? ORDER BY date ASC, id ASC
+        """,
+        (pid,),
+    ).fetchall()
+    txns = [r for r in txns if r[0] is not None]
+    symbols = sorted({r[1] for r in txns if r[2] in ("BUY", "SELL")})
+    if not symbols:
+        return None
+    closes_version = tuple(tuple(bars_version(conn, symbol=s, interval="1d") or ()) for s in symbols)
+    version = (portfolio_version(conn, portfolio_id=pid), closes_version)
+    db = cache_db_key(conn)
+    key = (db, pid, version)
+    cached = performance_cache.get(key) if db else None
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    start = min(r[0] for r in txns)
+    marks = ", ".join("?" for _ in symbols)
+    closes = conn.execute(
+        f"SELECT symbol, t, close FROM price_bars WHERE symbol IN ({marks}) AND interval = '1d' AND t >= ? "
+        "ORDER BY symbol, t",
+        (*symbols, start),
+    ).fetchall()
+
+    # Day axis: every day with a close for a held symbol or a transaction
+    days = np.unique(np.array([r[0] for r in txns] + [r[1] for r in closes], dtype=np.int64))
+    col = {s: j for j, s in enumerate(symbols)}
+    n, m = len(days), len(symbols)
+    delta = np.zeros((n, m))
+    flows = np.zeros(n)
+    trade_px: Dict[str, Tuple[List[int], List[float]]] = {s: ([], []) for s in symbols}
+    for day, sym, typ, qty, price, fees in txns:
+        i = int(np.searchsorted(days, day))
+        qty, price, fees = float(qty or 0), float(price or 0), float(fees or 0)
+        if typ == "BUY":
+            delta[i, col[sym]] += qty
+            flows[i] += qty * price + fees
+        elif typ == "SELL":
+            delta[i, col[sym]] -= qty
+            flows[i] -= qty * price - fees
+        elif typ == "DIV":
+            flows[i] -= qty * price if qty else price
+        if typ in ("BUY", "SELL"):
+            trade_px[sym][0].append(day)
+            trade_px[sym][1].append(price)
+    holdings = np.cumsum(delta, axis=0)
+
+    prices = np.empty((n, m))
+    by_symbol: Dict[str, Tuple[List[int], List[float]]] = {s: ([], []) for s in symbols}
+    for sym, t, close in closes:
+        by_symbol[sym][0].append(t)
+        by_symbol[sym][1].append(close)
+    for sym, j in col.items():
+        px = _ffill(days, np.array(by_symbol[sym][0], dtype=np.int64), np.array(by_symbol[sym][1], dtype=float))
+        fallback = _ffill(days, np.array(trade_px[sym][0], dtype=np.int64), np.array(trade_px[sym][1], dtype=float))
+        prices[:, j] = np.where(np.isnan(px), fallback, px)
+    equity = np.nansum(holdings * prices, axis=1)
+
+    prev = np.concatenate(([0.0], equity[:-1]))
+    inflow, outflow = np.maximum(flows, 0.0), np.maximum(-flows, 0.0)
+    denom = prev + inflow
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(denom > 0, (equity + outflow) / denom - 1.0, 0.0)
+    growth = np.cumprod(1.0 + returns)
+    drawdown = growth / np.maximum.accumulate(growth) - 1.0
+    vol = float(np.std(returns[1:], ddof=1) * math.sqrt(TRADING_DAYS)) if n > 2 else 0.0
+
+    result = {
+        "dates": [np.datetime_as_string(np.datetime64(int(d), "s"), unit="D") for d in days],
+        "equity": equity.tolist(),
+        "twr": (growth - 1.0).tolist(),
+        "drawdown": drawdown.tolist(),
+        "total_return": float(growth[-1] - 1.0),
+        "max_drawdown": float(drawdown.min()),
+        "volatility": vol,
+    }
+    if db:
+        performance_cache.put(key, result)
+    return {**result, "cached": False}
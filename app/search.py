@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import html
+import re
+import sqlite3
+from typing import Any, Dict, List, Optional, Sequence
+
+
+KINDS = ("plan", "journal")
+_TERM = re.compile(r"\w+\*?")
+# FTS5 brackets matches with these, so the snippet text can be HTML-escaped before the real markers go in
+_OPEN, _CLOSE = "\x02", "\x03"
+
+# Each source is ranked by FTS5 (rank = bm25, newest first on ties, the same key as the merge) and cut to
+# the page window before the merge, so snippets are only built for rows that can appear on the page.
+_SOURCES = {
+    "plan": """
+        SELECT 'plan', p.id, p.symbol, p.created_at, snippet(entry_plans_fts, -1, ?, ?, '…', ?), entry_plans_fts.rank
+        FROM entry_plans_fts JOIN entry_plans p ON p.id = entry_plans_fts.rowid
+        WHERE entry_plans_fts MATCH ? {symbol}
+        ORDER BY entry_plans_fts.rank, p.id DESC LIMIT ?
+    """,
+    "journal": """
+        SELECT 'journal', j.id, j.symbol, j.date, snippet(journal_fts, -1, ?, ?, '…', ?), journal_fts.rank
+        FROM journal_fts JOIN journal j ON j.id = journal_fts.rowid
+        WHERE journal_fts MATCH ? {symbol}
+        ORDER BY journal_fts.rank, j.id DESC LIMIT ?
+    """,
+}
+
+
+def fts_query(q: str) -> str:
+    """
+    Turn free text into an FTS5 query: every word must match, a trailing * is a prefix search.
+    Words are quoted so user punctuation can never be parsed as FTS5 syntax.
+    """
+    terms = _TERM.findall(q or "")
+    return " ".join(f'"{t[:-1]}"*' if t.endswith("*") else f'"{t}"' for t in terms)
+
+
+def _highlight(snip: Optional[str], mark: Sequence[str]) -> str:
+    return html.escape(snip or "", quote=False).replace(_OPEN, mark[0]).replace(_CLOSE, mark[1])
+
+
+def search_text(
+    conn: sqlite3.Connection,
+    *,
+    q: str,
+    kinds: Sequence[str] = KINDS,
+    symbol: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    mark: Sequence[str] = ("<mark>", "</mark>"),
+    snippet_tokens: int = 24,
+) -> List[Dict[str, Any]]:
+    """
+    Ranked matches across entry plans (symbol, text, notes) and journal rows (symbol, notes, tags), best first.
+    Scores are bm25 (lower is better). Each hit carries a snippet of its best-matching column, HTML-escaped,
+    with the matched terms wrapped in `mark` (inserted as-is). Raises ValueError for an empty query or unknown kind.
+    """
+    match = fts_query(q)
+    if not match:
+        raise ValueError("Query has no searchable terms")
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"Unknown kind(s): {', '.join(sorted(unknown))}")
+    window = int(offset) + int(limit)
+    hits: List[tuple] = []
+    for kind in KINDS:
+        if kind not in kinds:
+            continue
+        alias = "p" if kind == "plan" else "j"
+        sql = _SOURCES[kind].format(symbol=f"AND {alias}.symbol = ?" if symbol else "")
+        params: List[Any] = [_OPEN, _CLOSE, int(snippet_tokens), match]
+        if symbol:
+            params.append(symbol)
+        params.append(window)
+        hits.extend(conn.execute(sql, tuple(params)).fetchall())
+    hits.sort(key=lambda h: (h[5], h[0], -h[1]))
+    return [
+        {"kind": k, "id": rid, "symbol": sym, "date": date, "snippet": _highlight(snip, mark), "score": float(score)}
+        for k, rid, sym, date, snip, score in hits[int(offset):window]
+    ]
@@ -13,7 +13,7 @@ if str(ROOT) not in sys.path:
 from app.db import (
     get_connection,
     init_db,
-    insert_price,
+    insert_prices,
     upsert_journal,
     upsert_portfolio,
     list_portfolios,
@@ -36,23 +36,24 @@ def seed_prices() -> None:
         "AAPL": 192.0,
         "MSFT": 415.0,
     }
+    rows = []
+    for sym, base in symbols.items():
+        price = base
+        for i in range(24, -1, -1):  # 25 hourly points
+            ts = now - timedelta(hours=i)
+            # random walk
+            step = random.uniform(-0.001, 0.001) * (base if sym.isalpha() and len(sym) <= 4 else 1)
+            price = max(0.0001, price + step)
+            rows.append({
+                "symbol": sym,
+                "price": round(price, 5),
+                "as_of": iso(ts),
+                "currency": "USD" if sym.startswith("X") or sym in ("AAPL", "MSFT") else None,
+            })
     with get_connection() as conn:
         init_db(conn)
-        for sym, base in symbols.items():
-            price = base
-            for i in range(24, -1, -1):  # 25 hourly points
-                ts = now - timedelta(hours=i)
-                # random walk
-                step = random.uniform(-0.001, 0.001) * (base if sym.isalpha() and len(sym) <= 4 else 1)
-                price = max(0.0001, price + step)
-                insert_price(
-                    conn,
-                    symbol=sym,
-                    price=round(price, 5),
-                    as_of=iso(ts),
-                    currency="USD" if sym.startswith("X") or sym in ("AAPL", "MSFT") else None,
-                    source="demo",
-                )
+        # One transaction for the whole series instead of a commit per row
+        insert_prices(conn, rows, source="demo")
 
 
 def seed_journal(n: int = 40) -> None:
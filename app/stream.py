@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+
+class Subscription:
+    """One streaming client: the symbols it follows and a bounded queue owned by its event loop."""
+
+    def __init__(self, symbols: Iterable[str], loop: asyncio.AbstractEventLoop, maxsize: int = 256) -> None:
+        self.symbols: Set[str] = {s.upper() for s in symbols if s}
+        self.loop = loop
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def wants(self, symbol: str) -> bool:
+        return not self.symbols or symbol.upper() in self.symbols
+
+    def _offer(self, item: Dict[str, Any]) -> None:
+        # Runs on the subscriber's loop. A slow client loses its oldest rows rather than stalling ingest.
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(item)
+
+
+class PriceHub:
+    """
+    In-process fan-out of newly stored price rows to streaming subscribers.
+    publish() is called from sync DB code on worker threads; delivery hops onto each subscriber's loop.
+    """
+
+    def __init__(self) -> None:
+        self._subs: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, symbols: Iterable[str], *, maxsize: int = 256) -> Subscription:
+        sub = Subscription(symbols, asyncio.get_running_loop(), maxsize=maxsize)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, item: Dict[str, Any]) -> int:
+        """Deliver a price row dict to every subscriber following its symbol; returns how many were notified."""
+        with self._lock:
+            if not self._subs:
+                return 0
+            self.published += 1
+            targets = [s for s in self._subs if s.wants(str(item.get("symbol", "")))]
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, item)
+            except RuntimeError:
+                # Subscriber's loop already closed; it will be unsubscribed by its own cleanup
+                pass
+        return len(targets)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": len(self._subs), "published": self.published}
+
+
+price_hub = PriceHub()
+
+
+async def sse_price_events(
+    sub: Subscription,
+    *,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    keepalive: float = 15.0,
+) -> AsyncIterator[str]:
+    """Server-Sent Events frames for a subscription: `event: price` per row, comment pings when idle."""
+    yield ": connected\n\n"
+    while True:
+        if is_disconnected is not None and await is_disconnected():
+            return
+        try:
+            item = await asyncio.wait_for(sub.queue.get(), timeout=keepalive)
+        except asyncio.TimeoutError:
+            yield ": keepalive\n\n"
+            continue
+        yield f"event: price\ndata: {json.dumps(item, separators=(',', ':'))}\n\n"
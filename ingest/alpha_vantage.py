@@ -4,12 +4,11 @@ import os
 import sys
 from typing import Dict, Any, Optional
 
-import requests
-
 from app.db import get_connection, init_db, insert_price
+from app.http_client import http_client
 
 
-ALPHA_URL = "https://www.alphavantage.co/query"
+ALPHA_URL = os.getenv("ALPHA_VANTAGE_URL") or "https://www.alphavantage.co/query"
 
 
 def fetch_price(symbol: str, api_key: str) -> Dict[str, Any]:
@@ -23,7 +22,7 @@ def fetch_price(symbol: str, api_key: str) -> Dict[str, Any]:
         "symbol": symbol,
         "apikey": api_key,
     }
-    r = requests.get(ALPHA_URL, params=params, timeout=15)
+    r = http_client.get(ALPHA_URL, provider="alpha_vantage", params=params, timeout=15)
     r.raise_for_status()
     data = r.json()
     quote = data.get("Global Quote") or data.get("globalQuote") or {}
@@ -3,7 +3,9 @@ import requests
 from typing import Dict
 from datetime import datetime, timezone
 
-API_URL = "https://www.alphavantage.co/query"
+from app.http_client import http_client
+
+API_URL = os.getenv("ALPHA_VANTAGE_URL") or "https://www.alphavantage.co/query"
 
 
 def parse_pair(pair: str):
@@ -22,7 +24,7 @@ def fetch_fx_rate(pair: str, api_key: str) -> Dict:
         "apikey": api_key,
     }
     try:
-        r = requests.get(API_URL, params=params, timeout=15)
+        r = http_client.get(API_URL, provider="alpha_vantage", params=params, timeout=15)
         r.raise_for_status()
     except requests.RequestException as e:
         raise RuntimeError(f"Network error calling Alpha Vantage: {e}")
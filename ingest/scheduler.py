@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Ensure repo root is on sys.path when running as a script
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from app.db import insert_prices, pooled_connection, validate_price_row
+
+
+log = logging.getLogger("ingest.scheduler")
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per `per` seconds, bursting up to `capacity`."""
+
+    def __init__(self, rate: float, per: float = 60.0, capacity: Optional[float] = None) -> None:
+        self.rate = float(rate) / float(per)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def try_acquire(self) -> float:
+        """Take a token if available; returns 0.0 on success, else seconds until one is due."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return 0.0
+            return (1.0 - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1.0)
+
+    def drain(self) -> None:
+        """Provider told us to slow down: empty the bucket so callers wait a full refill."""
+        with self._lock:
+            self._tokens = 0.0
+            self._stamp = time.monotonic()
+
+
+def acquire_all(buckets: List[TokenBucket], *, timeout: float) -> bool:
+    """Take one token from every bucket, waiting up to `timeout` seconds; all-or-nothing."""
+    deadline = time.monotonic() + timeout
+    while True:
+        taken: List[TokenBucket] = []
+        wait_for = 0.0
+        for b in buckets:
+            delay = b.try_acquire()
+            if delay:
+                wait_for = delay
+                break
+            taken.append(b)
+        if len(taken) == len(buckets):
+            return True
+        for b in taken:  # give back partial grabs
+            b.refund()
+        if time.monotonic() + wait_for > deadline:
+            return False
+        time.sleep(min(wait_for, max(0.0, deadline - time.monotonic())))
+
+
+# ===== Providers =====
+def _alpha_vantage(symbol: str, api_key: Optional[str]) -> Dict[str, Any]:
+    from ingest.alpha_vantage import fetch_price
+    return fetch_price(symbol, api_key or "")
+
+
+def _alpha_vantage_fx(symbol: str, api_key: Optional[str]) -> Dict[str, Any]:
+    from ingest.alpha_vantage_fx import fetch_fx_rate
+    return fetch_fx_rate(symbol, api_key or "")
+
+
+def _yahoo(symbol: str, api_key: Optional[str]) -> Dict[str, Any]:
+    from ingest.yahoo import fetch_price
+    return fetch_price(symbol)
+
+
+# name -> (fetch(symbol, api_key), rate-limit group, api key env var or None)
+PROVIDERS: Dict[str, Tuple[Callable[[str, Optional[str]], Dict[str, Any]], str, Optional[str]]] = {
+    "alpha_vantage": (_alpha_vantage, "alpha_vantage", "ALPHA_VANTAGE_API_KEY"),
+    "alpha_vantage_fx": (_alpha_vantage_fx, "alpha_vantage", "ALPHA_VANTAGE_API_KEY"),
+    "yahoo": (_yahoo, "yahoo", None),
+}
+
+# Requests per minute per rate-limit group ("<group>:key" for the per-API-key bucket).
+# Alpha Vantage's free tier allows 5/min per key.
+DEFAULT_RATES = {"alpha_vantage": 5.0, "yahoo": 60.0}
+
+THROTTLE_HINTS = ("rate limit", "call frequency", "thank you for using alpha vantage", "too many requests", "429")
+
+
+def guess_provider(symbol: str) -> str:
+    """FX pairs and metals (EURUSD, XAUUSD) go to the FX endpoint; everything else is an equity quote."""
+    s = symbol.replace("/", "").upper()
+    return "alpha_vantage_fx" if len(s) == 6 and s.isalpha() else "alpha_vantage"
+
+
+def parse_universe(spec: Iterable[str]) -> List[Tuple[str, str]]:
+    """Turn ["EURUSD", "yahoo:AAPL"] into [(provider, symbol), ...], dropping duplicates."""
+    jobs: List[Tuple[str, str]] = []
+    for item in spec:
+        item = item.strip()
+        if not item:
+            continue
+        provider, _, symbol = item.rpartition(":")
+        symbol = symbol.upper()
+        job = (provider or guess_provider(symbol), symbol)
+        if job[0] not in PROVIDERS:
+            raise ValueError(f"Unknown provider: {job[0]}")
+        if job not in jobs:
+            jobs.append(job)
+    return jobs
+
+
+class IngestScheduler:
+    """
+    Refreshes a symbol universe every `interval` seconds.
+    Fetches run concurrently on a thread pool, gated by a token bucket per rate-limit group and per API key;
+    concurrent requests for the same (provider, symbol) share one fetch. Each cycle's results are written
+    with a single insert_prices batch.
+    """
+
+    def __init__(
+        self,
+        universe: Iterable[str],
+        *,
+        interval: float = 60.0,
+        max_workers: int = 4,
+        api_keys: Optional[Dict[str, str]] = None,
+        rates: Optional[Dict[str, float]] = None,
+        max_wait: Optional[float] = None,
+        db_path: Optional[Path] = None,
+    ) -> None:
+        self.jobs = parse_universe(universe)
+        self.interval = float(interval)
+        self.max_wait = float(max_wait) if max_wait is not None else self.interval
+        self.db_path = db_path
+        self.api_keys = dict(api_keys or {})
+        self.rates = {**DEFAULT_RATES, **(rates or {})}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="ingest")
+        self._buckets: Dict[Tuple[Optional[str], ...], TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def _api_key(self, provider: str) -> Optional[str]:
+        env = PROVIDERS[provider][2]
+        if env is None:
+            return None
+        return self.api_keys.get(provider) or self.api_keys.get(PROVIDERS[provider][1]) or os.getenv(env)
+
+    def _bucket(self, group: str, api_key: Optional[str] = None) -> TokenBucket:
+        key = (group, api_key) if api_key else (group,)
+        with self._buckets_lock:
+            b = self._buckets.get(key)
+            if b is None:
+                # "<group>:key" sets the per-key rate; it defaults to the group rate
+                rate = self.rates.get(f"{group}:key" if api_key else group) or self.rates.get(group, 60.0)
+                b = TokenBucket(rate, per=60.0)
+                self._buckets[key] = b
+            return b
+
+    def _fetch(self, provider: str, symbol: str) -> Dict[str, Any]:
+        fetch, group, key_env = PROVIDERS[provider]
+        api_key = self._api_key(provider)
+        if key_env and not api_key:
+            raise RuntimeError(f"Missing API key ({key_env})")
+        buckets = [self._bucket(group)]
+        if api_key:
+            buckets.append(self._bucket(group, api_key))
+        if not acquire_all(buckets, timeout=self.max_wait):
+            raise TimeoutError(f"{group} rate limit: no request budget within {self.max_wait:.0f}s")
+        try:
+            item = fetch(symbol, api_key)
+        except Exception as e:
+            if any(h in str(e).lower() for h in THROTTLE_HINTS):
+                for b in buckets:
+                    b.drain()
+            raise
+        return {**item, "source": provider}
+
+    def submit(self, provider: str, symbol: str) -> Future:
+        """Schedule one fetch; a request for a (provider, symbol) already in flight returns that future."""
+        key = (provider, symbol.upper())
+        with self._inflight_lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                return fut
+            fut = self._executor.submit(self._fetch, *key)
+            self._inflight[key] = fut
+        fut.add_done_callback(lambda _f, k=key: self._forget(k))
+        return fut
+
+    def _forget(self, key: Tuple[str, str]) -> None:
+        with self._inflight_lock:
+            self._inflight.pop(key, None)
+
+    def run_once(self) -> Dict[str, Any]:
+        """Fetch the whole universe once and store the results; returns a summary of the cycle."""
+        started = time.monotonic()
+        futures = {job: self.submit(*job) for job in self.jobs}
+        wait(list(futures.values()))
+        rows: List[Dict[str, Any]] = []
+        errors: Dict[str, str] = {}
+        for (provider, symbol), fut in futures.items():
+            exc = fut.exception()
+            if exc is not None:
+                errors[f"{provider}:{symbol}"] = str(exc)
+                continue
+            item = fut.result()
+            if not item.get("as_of"):
+                errors[f"{provider}:{symbol}"] = "Response has no timestamp"
+                continue
+            try:
+                # One bad quote must not fail the batch insert for the whole universe
+                validate_price_row(item)
+            except ValueError as e:
+                errors[f"{provider}:{symbol}"] = str(e)
+                continue
+            rows.append(item)
+        inserted = ignored = 0
+        if rows:
+            with pooled_connection(self.db_path) as conn:
+                inserted, ignored = insert_prices(conn, rows)
+        result = {
+            "fetched": len(rows),
+            "inserted": inserted,
+            "ignored": ignored,
+            "errors": errors,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        for k, msg in errors.items():
+            log.warning("[ingest] %s failed: %s", k, msg)
+        self.last_result = result
+        return result
+
+    def run_forever(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("[ingest] cycle failed")
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self) -> None:
+        """Run in a daemon thread (used by the API lifespan when INGEST_SYMBOLS is set)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run_forever, name="ingest-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def scheduler_from_env() -> Optional[IngestScheduler]:
+    """Build a scheduler from INGEST_SYMBOLS (comma-separated, optional provider: prefix) and INGEST_INTERVAL."""
+    spec = os.getenv("INGEST_SYMBOLS")
+    if not spec:
+        return None
+    return IngestScheduler(
+        spec.split(","),
+        interval=float(os.getenv("INGEST_INTERVAL") or 60),
+        max_workers=int(os.getenv("INGEST_WORKERS") or 4),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh a symbol universe on an interval")
+    parser.add_argument("symbols", nargs="+", help="e.g. EURUSD XAUUSD AAPL yahoo:MSFT")
+    parser.add_argument("--interval", type=float, default=60.0, help="seconds between cycles")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--once", action="store_true", help="run a single cycle and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    sched = IngestScheduler(args.symbols, interval=args.interval, max_workers=args.workers)
+    if args.once:
+        print(sched.run_once())
+    else:
+        try:
+            sched.run_forever()
+        except KeyboardInterrupt:
+            sched.stop()
@@ -1,7 +1,7 @@
 import datetime as dt
 from typing import Dict, Any
 
-import requests
+from app.http_client import http_client
 
 
 def fetch_price(symbol: str) -> Dict[str, Any]:
@@ -13,7 +13,7 @@ def fetch_price(symbol: str) -> Dict[str, Any]:
         "https://query1.finance.yahoo.com/v8/finance/chart/"
         f"{symbol}?region=US&lang=en-US&range=1d&interval=1m&includePrePost=false"
     )
-    r = requests.get(url, timeout=10)
+    r = http_client.get(url, provider="yahoo", timeout=10)
     r.raise_for_status()
     data = r.json()
 
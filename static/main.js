@@ -19,6 +19,8 @@
   let offset = 0;
   let selected = null;
   let autoTimer = null;
+  let quoteStream = null; // EventSource for /stream/prices while Auto is on
+  let seriesReloadTimer = null;
   let chart = null; // chart removed from UI; keep stub to avoid errors
   let lastInsights = '';
   let lastQuote = null;
@@ -29,6 +31,10 @@
   let journalBackendOK = false;
   // Recent series (oldest->newest) for ICT analysis
   let recentSeries = [];
+  // Server-computed indicators for the selected symbol (GET /indicators, cached server-side per last bar)
+  let lastIndicators = null;
+  // Precomputed market structure (GET /structure) for the selected symbol
+  let lastStructure = null;
   // Wealth state
   let selectedPortfolioId = null;
   let portfoliosCache = [];
@@ -82,6 +88,7 @@
 
   // Cache series for ICT analysis (convert to oldest -> newest)
   recentSeries = items.slice().reverse();
+  loadIndicators(sym).catch(()=>{});
 
   // Load news and calendar in parallel
     loadNews(sym).catch(console.error);
@@ -92,6 +99,15 @@
     try{ refreshPlanHistory(); }catch{}
   }
 
+  async function loadIndicators(sym){
+    const [ind, st] = await Promise.all([
+      fetch(`/indicators/${encodeURIComponent(sym)}?interval=1h&limit=100&sma=20,50`),
+      fetch(`/structure/${encodeURIComponent(sym)}?interval=1h&levels=0`),
+    ]);
+    lastIndicators = ind.ok ? { symbol: sym, ...(await ind.json()) } : null;
+    lastStructure = st.ok ? { symbol: sym, ...(await st.json()).summary } : null;
+  }
+
   async function loadNews(symbol){
     const res = await fetch(`/news${symbol?`?symbol=${encodeURIComponent(symbol)}`:''}`);
     if(!res.ok) return;
@@ -227,10 +243,33 @@
   }
 
   // ===== Alternative strategies (fallback when ICT unavailable) =====
-  function getAtrGuess(sym){ return sym.endsWith('JPY') ? 0.3 : (sym.startsWith('XA') ? 10 : 0.005); }
+  function getAtrGuess(sym){
+    const atr = (lastIndicators && lastIndicators.symbol===sym) ? (lastIndicators.series.atr14 || []).at(-1) : null;
+    if(atr) return atr;
+    return sym.endsWith('JPY') ? 0.3 : (sym.startsWith('XA') ? 10 : 0.005);
+  }
   function stddev(arr){ if(arr.length<2) return 0; const m=arr.reduce((s,x)=>s+x,0)/arr.length; const v=arr.reduce((s,x)=>s+(x-m)*(x-m),0)/(arr.length-1); return Math.sqrt(v); }
-  function rollingStd(arr, n){ const out=[]; for(let i=0;i<arr.length;i++){ const a=arr.slice(Math.max(0,i-n+1), i+1); out.push(stddev(a)); } return out; }
-  function rollingMin(arr, n){ const out=[]; for(let i=0;i<arr.length;i++){ const a=arr.slice(Math.max(0,i-n+1), i+1); out.push(Math.min(...a)); } return out; }
+  // Running sums / monotonic deque: O(n) over the series instead of re-slicing each window
+  function rollingStd(arr, n){
+    const out=[]; const m0 = arr.length ? arr[0] : 0; let s=0, s2=0;
+    for(let i=0;i<arr.length;i++){
+      const d=arr[i]-m0; s+=d; s2+=d*d;
+      if(i>=n){ const o=arr[i-n]-m0; s-=o; s2-=o*o; }
+      const k=Math.min(n, i+1);
+      out.push(k<2 ? 0 : Math.sqrt(Math.max(0, (s2 - s*s/k)/(k-1))));
+    }
+    return out;
+  }
+  function rollingMin(arr, n){
+    const out=[]; const dq=[]; let head=0;
+    for(let i=0;i<arr.length;i++){
+      while(dq.length>head && arr[dq[dq.length-1]]>=arr[i]) dq.pop();
+      dq.push(i);
+      if(dq[head]<=i-n) head++;
+      out.push(arr[dq[head]]);
+    }
+    return out;
+  }
   function highest(arr, n){ const L=arr.length; if(!L) return {v:NaN,i:-1}; const start=Math.max(0,L-n); let v=-Infinity, idx=start; for(let i=start;i<L;i++){ if(arr[i]>v){ v=arr[i]; idx=i; } } return {v, i:idx}; }
   function lowest(arr, n){ const L=arr.length; if(!L) return {v:NaN,i:-1}; const start=Math.max(0,L-n); let v=Infinity, idx=start; for(let i=start;i<L;i++){ if(arr[i]<v){ v=arr[i]; idx=i; } } return {v, i:idx}; }
   function buildAltStrategies(sym){
@@ -334,6 +373,15 @@
     return lows;
   }
   function analyzeICT(series){
+    const st = lastStructure;
+    if(st && st.ok && st.symbol===selected){
+      return {
+        ok:true, last:st.last, hi:st.high, lo:st.low, mid:st.mid, pd:st.zone, bias:st.bias,
+        eqHighs:st.eq_highs, eqLows:st.eq_lows,
+        legStart:{v:st.leg_start.price}, legEnd:{v:st.leg_end.price},
+        oteLow:st.ote_low, oteHigh:st.ote_high, timeLast:st.as_of,
+      };
+    }
     const px = toPrices(series);
     const tm = toTimes(series);
     const L = px.length;
@@ -382,31 +430,45 @@
     };
   }
 
+  // Queue an insights job and follow its SSE token stream; resolves with the final InsightsResponse
+  async function streamInsights(payload, onText){
+    const res = await fetch('/insights/jobs', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload) });
+    if(!res.ok){
+      let msg = `(${res.status})`;
+      try{ const err = await res.json(); if(err?.detail||err?.message){ msg += `: ${err.detail||err.message}`; } }catch{}
+      throw new Error(msg);
+    }
+    const job = await res.json();
+    return new Promise((resolve, reject)=>{
+      const es = new EventSource(`/insights/jobs/${job.id}/events`);
+      let text = '';
+      es.addEventListener('token', (e)=>{ text += JSON.parse(e.data).text; onText?.(text); });
+      es.addEventListener('done', (e)=>{ es.close(); resolve(JSON.parse(e.data)); });
+      // Server-sent `error` events carry {status_code, detail}; connection failures carry no data
+      es.addEventListener('error', (e)=>{
+        es.close();
+        let detail = 'stream interrupted';
+        try{ if(e.data) detail = JSON.parse(e.data).detail || detail; }catch{}
+        reject(new Error(detail));
+      });
+    });
+  }
+
   async function fetchInsights(symbol, horizon){
     const el = $('#analysis-content');
     if(el){ el.textContent = 'Loading insights…'; el.classList.add('text-muted'); }
     try{
       // Build context notes from News and Calendar
       const notes = buildContextNotes(symbol);
-      const res = await fetch('/insights', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ symbol, horizon, notes }) });
-      if(!res.ok){
-        let msg = `Insights request failed (${res.status})`;
-        try{
-          const err = await res.json();
-          if(err && (err.detail || err.message)){
-            msg += `: ${err.detail || err.message}`;
-          }
-        }catch{}
-        if(el){ el.textContent = msg; el.classList.remove('text-muted'); }
-        return;
-      }
-      const data = await res.json();
+      const data = await streamInsights({ symbol, horizon, notes }, (text)=>{
+        if(el){ el.textContent = text; el.classList.remove('text-muted'); }
+      });
       lastInsights = data.summary || '';
       if(el){ el.textContent = lastInsights || 'No insights available.'; el.classList.remove('text-muted'); }
-      console.log('Insights:', lastInsights);
+      console.log('Insights:', lastInsights, data.cached ? '(cached)' : '');
     }catch(err){
       console.warn('Insights error', err);
-      if(el){ el.textContent = 'Error loading insights. Check server logs or API key.'; el.classList.remove('text-muted'); }
+      if(el){ el.textContent = `Insights request failed ${err.message||''}`.trim(); el.classList.remove('text-muted'); }
     }
   }
 
@@ -553,16 +615,13 @@
 
   async function refreshWatchlistQuotes(){
     const symbols = getWatchlist();
-    // Pull last 1 per symbol and compute delta vs previous
-    for(const s of symbols){
+    // One batched call returns latest price + delta vs previous for every symbol
+    if(symbols.length){
       try{
-        const data = await fetchPrices({ symbol: s, limit: '2', offset: '0' });
-        const items = data.items;
-        if(items.length){
-          const last = items[0];
-          const prev = items[1];
-          const delta = prev ? (last.price - prev.price) : 0;
-          wlQuotes.set(s, { price: last.price, delta });
+        const res = await fetch(`/quotes?${new URLSearchParams({ symbols: symbols.join(',') }).toString()}`);
+        if(res.ok){
+          const data = await res.json();
+          (data.items||[]).forEach(q=> wlQuotes.set(q.symbol, { price: q.price, delta: q.delta, as_of: q.as_of }));
         }
       }catch{}
     }
@@ -587,12 +646,36 @@
     if(row) row.classList.add('active');
     await autoIngestOnSelect(s).catch(console.warn);
   await loadSymbolSeries(s);
+    if(quoteStream) openQuoteStream(); // resubscribe with the updated symbol set
+  }
+
+  function onStreamedPrice(row){
+    const prev = wlQuotes.get(row.symbol);
+    if(prev && prev.as_of && row.as_of < prev.as_of) return; // back-filled history, not a new quote
+    wlQuotes.set(row.symbol, { price: row.price, delta: prev ? (row.price - prev.price) : 0, as_of: row.as_of });
+    renderWatchlist(getWatchlist());
+    if(row.symbol === selected){
+      // Coalesce bursts of rows into one series reload
+      clearTimeout(seriesReloadTimer);
+      seriesReloadTimer = setTimeout(()=>{ loadSymbolSeries(selected).catch(console.error); }, 500);
+    }
+  }
+
+  function openQuoteStream(){
+    if(quoteStream){ quoteStream.close(); quoteStream = null; }
+    const symbols = [...new Set([...getWatchlist(), ...(selected?[selected]:[])])];
+    quoteStream = new EventSource(`/stream/prices?${new URLSearchParams({ symbols: symbols.join(',') }).toString()}`);
+    quoteStream.addEventListener('price', (ev)=>{ try{ onStreamedPrice(JSON.parse(ev.data)); }catch{} });
   }
 
   function setAutoRefresh(enabled){
     const INTERVAL_MS = 15000; // 15s
     if(autoTimer){ clearInterval(autoTimer); autoTimer = null; }
-  if(enabled){ autoTimer = setInterval(async ()=>{ if(selected) await loadSymbolSeries(selected); await refreshWatchlistQuotes(); }, INTERVAL_MS); }
+    if(quoteStream){ quoteStream.close(); quoteStream = null; }
+    if(!enabled) return;
+    // Prefer server push: only new rows arrive, as ingest stores them. Fall back to polling.
+    if(window.EventSource){ openQuoteStream(); return; }
+    autoTimer = setInterval(async ()=>{ if(selected) await loadSymbolSeries(selected); await refreshWatchlistQuotes(); }, INTERVAL_MS);
   }
 
   // Event bindings
@@ -700,17 +783,22 @@
   const fileInput = document.getElementById('plan-images');
   const previewWrap = document.getElementById('plan-image-previews');
   const clearBtn = document.getElementById('plan-images-clear');
-  async function filesToDataUrls(files){
-    const arr = [];
+  // Uploaded once per file: the server downsizes and stores it, later requests only send its digest
+  const uploadedImages = new Map();
+  async function uploadImages(files){
+    const digests = [];
     const max = Math.min(files.length, 5);
     for(let i=0;i<max;i++){
       const f = files[i];
-      const url = await new Promise((resolve, reject)=>{
-        const reader = new FileReader(); reader.onload = ()=> resolve(reader.result); reader.onerror = reject; reader.readAsDataURL(f);
-      });
-      arr.push(String(url));
+      const key = `${f.name}:${f.size}:${f.lastModified}`;
+      if(!uploadedImages.has(key)){
+        const r = await fetch('/images', { method:'POST', headers:{'Content-Type': f.type || 'application/octet-stream'}, body: f });
+        if(!r.ok) throw new Error(`Image upload failed (${r.status})`);
+        uploadedImages.set(key, (await r.json()).digest);
+      }
+      digests.push(uploadedImages.get(key));
     }
-    return arr;
+    return digests;
   }
   fileInput?.addEventListener('change', ()=>{
     if(!previewWrap) return;
@@ -737,23 +825,21 @@
     if(!selected){ if(out) out.textContent = 'Select a symbol first.'; return; }
     if(out){ out.textContent = 'Analyzing screenshots with ICT…'; out.classList.add('text-muted'); }
     try{
-      const images = fileInput?.files?.length ? await filesToDataUrls(fileInput.files) : [];
+      const image_digests = fileInput?.files?.length ? await uploadImages(fileInput.files) : [];
       // Build a concise coaching note with context
       const notes = [
         'Use ICT concepts: liquidity (SSL/BSL), displacement, PD arrays, OTE (62-79%), FVG/OB, and killzones.',
         buildContextNotes(selected)
       ].filter(Boolean).join('\n');
-      const res = await fetch('/insights', {
-        method: 'POST', headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ symbol: selected, horizon: 'daily', notes, images })
-      });
-      if(!res.ok){
-        let msg = `Vision plan failed (${res.status})`;
-        try{ const err = await res.json(); if(err?.detail||err?.message){ msg += `: ${err.detail||err.message}`; } }catch{}
-        if(out){ out.textContent = msg; out.classList.remove('text-muted'); }
+      let data;
+      try{
+        data = await streamInsights({ symbol: selected, horizon: 'daily', notes, image_digests }, (text)=>{
+          if(out){ out.textContent = text; out.classList.remove('text-muted'); }
+        });
+      }catch(err){
+        if(out){ out.textContent = `Vision plan failed ${err.message||''}`.trim(); out.classList.remove('text-muted'); }
         return;
       }
-      const data = await res.json();
   const plan = data.summary || 'No plan generated.';
   if(out){ out.textContent = plan; out.classList.remove('text-muted'); }
       // Persist if different from latest
@@ -919,13 +1005,14 @@
   function computeFilteredRows(){
     const fSym = ($('#j-filter-symbol')?.value||'').trim().toUpperCase();
     const fDir = ($('#j-filter-dir')?.value)||'';
-    const fTag = ($('#j-filter-tag')?.value||'').trim().toLowerCase();
+    // Comma-separated, exact (case-insensitive) matches on any tag, like GET /journal?tag=
+    const fTags = ($('#j-filter-tag')?.value||'').toLowerCase().split(',').map(x=>x.trim()).filter(Boolean);
     const fStart = $('#j-filter-start')?.value ? new Date($('#j-filter-start').value) : null;
     const fEnd = $('#j-filter-end')?.value ? new Date($('#j-filter-end').value) : null;
     return journal.filter(t=>{
       if(fSym && String(t.symbol||'').toUpperCase() !== fSym) return false;
       if(fDir && t.direction !== fDir) return false;
-      if(fTag && !String(t.tags||'').toLowerCase().includes(fTag)) return false;
+      if(fTags.length && !String(t.tags||'').toLowerCase().split(',').some(x=> fTags.includes(x.trim()))) return false;
       if(fStart && new Date(t.date) < fStart) return false;
       if(fEnd && new Date(t.date) > fEnd) return false;
       return true;
@@ -935,16 +1022,9 @@
   function renderJournal(){
     const rows = computeFilteredRows();
 
-    // Stats
-    const trades = rows.length;
-    const wins = rows.filter(t=>computePnL(t) > 0).length;
-    const winrate = trades ? Math.round(wins/trades*100) : 0;
-    const pnlSum = rows.reduce((s,t)=> s + computePnL(t), 0);
-    const rAvg = trades ? (rows.reduce((s,t)=> s + computeR(t),0)/trades) : 0;
-    $('#j-stat-trades').textContent = String(trades);
-    $('#j-stat-winrate').textContent = `${winrate}%`;
-    $('#j-stat-pnl').textContent = pnlSum.toFixed(2);
-    $('#j-stat-ravg').textContent = rAvg.toFixed(2);
+    // Stats and charts: aggregated server-side (GET /journal/stats), local fallback when offline
+    renderJournalStats(rows);
+    const fSym = ($('#j-filter-symbol')?.value||'').trim().toUpperCase();
     $('#j-overview-caption').textContent = fSym ? `Filtered: ${fSym}` : '';
 
     // Table
@@ -973,10 +1053,6 @@
       tbody.appendChild(tr);
     }
 
-    // Charts
-  try{ renderEquityChart(rows); }catch(err){ console.warn('Equity chart error', err); }
-  try{ renderPnlHist(rows); }catch(err){ console.warn('PnL hist error', err); }
-
     // Attach AI review handler (idempotent binding)
     const runBtn = document.getElementById('j-ai-run');
     if(runBtn && !runBtn.dataset.bound){
@@ -987,28 +1063,77 @@
     }
   }
 
-  function renderEquityChart(rows){
-    const ctx = document.getElementById('equity-chart'); if(!ctx) return;
-    const seq = rows.slice().sort((a,b)=> new Date(a.date) - new Date(b.date));
+  function journalStatsQuery(){
+    const p = new URLSearchParams();
+    const fSym = ($('#j-filter-symbol')?.value||'').trim().toUpperCase();
+    const fDir = ($('#j-filter-dir')?.value)||'';
+    const fTag = ($('#j-filter-tag')?.value||'').trim().toLowerCase();
+    if(fSym) p.set('symbol', fSym);
+    if(fDir) p.set('direction', fDir);
+    if(fTag) p.set('tag', fTag);
+    if($('#j-filter-start')?.value) p.set('start', $('#j-filter-start').value);
+    if($('#j-filter-end')?.value) p.set('end', $('#j-filter-end').value);
+    return p.toString();
+  }
+
+  // Same shape as GET /journal/stats, for local-only mode
+  function localJournalStats(rows){
+    const seq = rows.filter(t=> t.exit != null && t.exit !== '').sort((a,b)=> new Date(a.date) - new Date(b.date));
+    const pnls = seq.map(computePnL);
+    const rs = seq.filter(t=> t.stop != null && t.stop !== '' && computeR(t)).map(computeR);
+    const wins = pnls.filter(v=> v > 0).length;
     let acc = 0;
-    const labels = seq.map(t=> fmtDateLocal(t.date));
-    const data = seq.map(t=> { acc += computePnL(t); return acc; });
+    const equity = { t: seq.map(t=> t.date), pnl: pnls.map(v=> (acc += v)) };
+    const bins = 10;
+    const histogram = { edges: [], counts: [] };
+    if(pnls.length){
+      const min = Math.min(...pnls), max = Math.max(...pnls);
+      const step = (max-min)/bins || 1;
+      histogram.counts = Array.from({length:bins}, ()=>0);
+      histogram.edges = Array.from({length:bins+1}, (_,i)=> min + i*step);
+      for(const v of pnls){ histogram.counts[Math.min(bins-1, Math.max(0, Math.floor((v-min)/step)))]++; }
+    }
+    return {
+      trades: pnls.length,
+      win_rate: pnls.length ? wins/pnls.length : 0,
+      pnl: pnls.reduce((s,v)=> s+v, 0),
+      avg_r: rs.length ? rs.reduce((s,v)=> s+v, 0)/rs.length : null,
+      equity, histogram,
+    };
+  }
+
+  async function renderJournalStats(rows){
+    let stats = null;
+    if(journalBackendOK){
+      try{
+        const res = await fetch(`/journal/stats?${journalStatsQuery()}`);
+        if(res.ok) stats = await res.json();
+      }catch(err){ console.warn('Journal stats unavailable', err); }
+    }
+    if(!stats) stats = localJournalStats(rows);
+    $('#j-stat-trades').textContent = String(stats.trades);
+    $('#j-stat-winrate').textContent = `${Math.round(stats.win_rate*100)}%`;
+    $('#j-stat-pnl').textContent = stats.pnl.toFixed(2);
+    $('#j-stat-ravg').textContent = (stats.avg_r || 0).toFixed(2);
+    try{ renderEquityChart(stats.equity); }catch(err){ console.warn('Equity chart error', err); }
+    try{ renderPnlHist(stats.histogram); }catch(err){ console.warn('PnL hist error', err); }
+  }
+
+  function renderEquityChart(equity){
+    const ctx = document.getElementById('equity-chart'); if(!ctx) return;
+    const labels = equity.t.map(fmtDateLocal);
+    const data = equity.pnl;
     if(window._equityChart){ try{ window._equityChart.destroy(); }catch{} }
     window._equityChart = new Chart(ctx.getContext('2d'), {
       type: 'line', data: { labels, datasets: [{ label:'Equity', data, borderColor:'#51cf66', pointRadius:0, tension:.2 }] },
       options: { responsive:true, maintainAspectRatio:false, scales:{ x:{ type:'category' }, y:{} }, plugins:{ legend:{display:false} } }
     });
   }
-  function renderPnlHist(rows){
+  function renderPnlHist(histogram){
     const ctx = document.getElementById('pnl-hist-chart'); if(!ctx) return;
-    const arr = rows.map(computePnL);
-    // simple binning into 10 bins
-    const n = arr.length; if(!n){ if(window._pnlHist){ try{ window._pnlHist.destroy(); }catch{} } return; }
-    const min = Math.min(...arr), max = Math.max(...arr);
-    const bins = 10; const step = (max-min)/bins || 1;
-    const counts = Array.from({length:bins}, ()=>0);
-    for(const v of arr){ const idx = Math.min(bins-1, Math.max(0, Math.floor((v-min)/step))); counts[idx]++; }
-    const labels = counts.map((_,i)=> `${(min+i*step).toFixed(0)}–${(min+(i+1)*step).toFixed(0)}`);
+    const { edges, counts } = histogram;
+    if(!counts.length){ if(window._pnlHist){ try{ window._pnlHist.destroy(); }catch{} } return; }
+    const labels = counts.map((_,i)=> `${edges[i].toFixed(0)}–${edges[i+1].toFixed(0)}`);
     if(window._pnlHist){ try{ window._pnlHist.destroy(); }catch{} }
     window._pnlHist = new Chart(ctx.getContext('2d'), {
       type: 'bar', data: { labels, datasets: [{ label:'PnL', data: counts, backgroundColor:'rgba(13,110,253,.4)' }] },
@@ -1143,17 +1268,15 @@
         notes ? `Focus: ${notes}` : ''
       ].filter(Boolean).join('\n');
 
-      const res = await fetch('/insights', {
-        method: 'POST', headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ symbol: symbolHint, horizon: 'weekly', notes: prompt })
-      });
-      if(!res.ok){
-        let msg = `AI review failed (${res.status})`;
-        try{ const err = await res.json(); if(err?.detail||err?.message){ msg += `: ${err.detail||err.message}`; } }catch{}
-        if(out){ out.textContent = msg; out.classList.remove('text-muted'); }
+      let data;
+      try{
+        data = await streamInsights({ symbol: symbolHint, horizon: 'weekly', notes: prompt }, (text)=>{
+          if(out){ out.textContent = text; out.classList.remove('text-muted'); }
+        });
+      }catch(err){
+        if(out){ out.textContent = `AI review failed ${err.message||''}`.trim(); out.classList.remove('text-muted'); }
         return;
       }
-      const data = await res.json();
       if(out){ out.textContent = data.summary || 'No feedback.'; out.classList.remove('text-muted'); }
     }catch(err){
       if(out){ out.textContent = 'Error analyzing journal. Check server logs or API key.'; out.classList.remove('text-muted'); }
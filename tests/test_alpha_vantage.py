@@ -5,12 +5,13 @@ def test_fetch_price_parsing(monkeypatch):
     class DummyResp:
         def __init__(self, json_data):
             self._json = json_data
+            self.status_code = 200
         def raise_for_status(self):
             return None
         def json(self):
             return self._json
 
-    def fake_get(url, params=None, timeout=15):
+    def fake_request(method, url, params=None, timeout=15):
         return DummyResp({
             "Global Quote": {
                 "01. symbol": "AAPL",
@@ -19,8 +20,8 @@ def test_fetch_price_parsing(monkeypatch):
             }
         })
 
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    from app.http_client import http_client
+    monkeypatch.setattr(http_client.session, "request", fake_request)
 
     out = fetch_price("AAPL", api_key="dummy")
     assert out["symbol"] == "AAPL"
@@ -38,6 +38,10 @@ def test_ingest_endpoint(tmp_path, monkeypatch):
     assert body["saved"]["price"] == 123.45
     assert body["saved"]["created_at"]
 
+    # A quote without a usable timestamp is the provider's fault, not a server error
+    monkeypatch.setattr(av, "fetch_price", lambda symbol, api_key: {"symbol": symbol, "price": 1.0, "as_of": ""})
+    assert c.post("/ingest/alpha_vantage", json={"symbol": "AAPL"}).status_code == 502
+
 
 def test_pagination(tmp_path, monkeypatch):
     monkeypatch.setenv("DB_PATH", str(tmp_path / "t.db"))
@@ -61,4 +65,61 @@ def test_pagination(tmp_path, monkeypatch):
     b2 = r2.json()
     assert b2["count"] == 1
     assert b2["offset"] == 2
-    assert b2["next_offset"] is None
\ No newline at end of file
+    assert b2["next_offset"] is None
+
+def test_cursor_pagination(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "t.db"))
+    with get_connection() as conn:
+        init_db(conn)
+        # Two rows share an as_of so the id tiebreak matters
+        insert_price(conn, symbol="AAPL", price=1.0, as_of="2024-01-01T00:00:00Z", currency="USD", source="a")
+        insert_price(conn, symbol="AAPL", price=2.0, as_of="2024-01-02T00:00:00Z", currency="USD", source="a")
+        insert_price(conn, symbol="AAPL", price=2.5, as_of="2024-01-02T00:00:00Z", currency="USD", source="b")
+        insert_price(conn, symbol="MSFT", price=9.0, as_of="2024-01-03T00:00:00Z", currency="USD", source="a")
+
+    c = TestClient(app)
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        body = c.get("/prices/AAPL", params=params).json()
+        seen.extend(it["price"] for it in body["items"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [2.5, 2.0, 1.0]
+
+    assert c.get("/prices", params={"cursor": "not-a-cursor"}).status_code == 400
+
+
+def test_entry_plans_cursor(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "t.db"))
+    c = TestClient(app)
+    for i in range(3):
+        assert c.post("/entry_plans", json={"symbol": "EURUSD", "text": f"plan {i}"}).status_code == 200
+    b1 = c.get("/entry_plans", params={"symbol": "EURUSD", "limit": 2}).json()
+    assert [it["text"] for it in b1["items"]] == ["plan 2", "plan 1"]
+    b2 = c.get("/entry_plans", params={"symbol": "EURUSD", "limit": 2, "cursor": b1["next_cursor"]}).json()
+    assert [it["text"] for it in b2["items"]] == ["plan 0"]
+    assert b2["next_cursor"] is None
+
+
+def test_prices_bulk_json_and_ndjson(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "t.db"))
+    c = TestClient(app)
+    rows = [{"symbol": "XAUUSD", "price": 2300 + i, "as_of": f"2024-01-0{i + 1}T00:00:00Z"} for i in range(3)]
+    r = c.post("/prices/bulk", params={"source": "backfill"}, json=rows)
+    assert r.status_code == 200
+    assert r.json() == {"received": 3, "inserted": 3, "ignored": 0}
+
+    nd = "\n".join(
+        '{"symbol":"XAUUSD","price":%d,"as_of":"2024-01-0%dT00:00:00Z","source":"backfill"}' % (2300 + i, i + 1)
+        for i in range(2, 5)
+    )
+    r = c.post("/prices/bulk", content=nd, headers={"Content-Type": "application/x-ndjson"})
+    assert r.json() == {"received": 3, "inserted": 2, "ignored": 1}
+    assert c.get("/quotes", params={"symbols": "XAUUSD"}).json()["items"][0]["price"] == 2304
+
+    assert c.post("/prices/bulk", json=[{"symbol": "X"}]).status_code == 400
@@ -0,0 +1,102 @@
+import sqlite3
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import app.archive
+from app.archive import archive_prices, archive_slices, archive_stats
+from app.bars import check_rollups, query_bars, rebuild_rollups
+from app.db import encode_cursor, get_price, init_db, insert_prices, query_prices, query_prices_page
+
+
+def _ticks():
+    # Jan-Mar 2024, several ticks a day, two sources; one as_of written with an offset and one with millis
+    rows = []
+    for day in range(90):
+        for h in (2, 9, 15):
+            d = np.datetime64("2024-01-01") + np.timedelta64(day, "D")
+            rows.append(("EURUSD", 1.0 + day / 100 + h / 1000, f"{d}T{h:02d}:00:00Z", "USD", "fx" if h != 9 else "alt"))
+        rows.append(("GBPUSD", 1.2 + day / 100, f"{d}T12:00:00Z", None, "fx"))
+    rows.append(("EURUSD", 9.0, "2024-02-10T01:30:00+02:00", "USD", "fx"))
+    rows.append(("EURUSD", 9.5, "2024-02-11T08:00:00.250Z", "USD", "fx"))
+    return rows
+
+
+QUERIES = [
+    dict(symbol="EURUSD", limit=20),
+    dict(symbol="EURUSD", start="2024-01-10", end="2024-02-20", limit=500),
+    dict(start="2024-01-25", end="2024-02-05", limit=50, offset=7),
+    dict(limit=400),
+    dict(symbol="GBPUSD", limit=100, offset=40),
+]
+
+
+@pytest.fixture()
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_DIR", str(tmp_path / "archive"))
+    c = sqlite3.connect(":memory:")
+    init_db(c)
+    insert_prices(c, _ticks())
+    yield c
+    c.close()
+
+
+def _pages(conn, **kw):
+    out, cursor = [], None
+    while True:
+        rows, cursor = query_prices_page(conn, cursor=cursor, **kw)
+        out += rows
+        if not cursor:
+            return out
+
+
+def test_archived_reads_match_row_store(conn):
+    before = [query_prices(conn, **q) for q in QUERIES]
+    pages = _pages(conn, symbol="EURUSD", limit=37)
+    bars = query_bars(conn, symbol="EURUSD", interval="1d", start="2024-01-01", limit=200)
+
+    done = archive_prices(conn, before="2024-03-15")
+    assert done == {"partitions": 4, "rows": 60 * 4 + 2}
+    assert conn.execute("SELECT COUNT(*) FROM prices WHERE as_of < '2024-03'").fetchone()[0] == 0
+    assert [query_prices(conn, **q) for q in QUERIES] == before
+    assert _pages(conn, symbol="EURUSD", limit=37) == pages
+    # Bars of archived months are kept; rebuild and check only look at the hot months
+    assert query_bars(conn, symbol="EURUSD", interval="1d", start="2024-01-01", limit=200) == bars
+    rebuild_rollups(conn)
+    assert query_bars(conn, symbol="EURUSD", interval="1d", start="2024-01-01", limit=200) == bars
+    assert check_rollups(conn) == []
+
+    # Columns are memory mapped and a range read is a view into them
+    sym, cols, meta, lo, hi = next(archive_slices(conn, symbol="EURUSD", start_ms=0))
+    assert sym == "EURUSD" and isinstance(cols["t"], np.memmap) and np.shares_memory(cols["price"][lo:hi], cols["price"])
+    assert archive_stats(conn)["rows"] == done["rows"]
+
+
+def test_archived_ticks_dedupe_and_late_ticks_merge(conn):
+    archive_prices(conn, before="2024-03-01")
+    row = get_price(conn, symbol="EURUSD", as_of="2024-01-05T09:00:00Z", source="alt")
+    assert row[:5] == ("EURUSD", 1.049, "2024-01-05T09:00:00Z", "USD", "alt")
+    assert get_price(conn, symbol="EURUSD", as_of="2024-02-11T08:00:00.250Z", source="fx")[2] == "2024-02-11T08:00:00.250Z"
+    assert get_price(conn, symbol="EURUSD", as_of="2024-02-09T23:30:00Z", source="fx")[2] == "2024-02-10T01:30:00+02:00"
+    # Re-ingesting an archived period is ignored like any duplicate; a new tick in it lands hot and is merged later
+    assert insert_prices(conn, [("EURUSD", 1.049, "2024-01-05T09:00:00Z", "USD", "alt")]) == (0, 1)
+    assert insert_prices(conn, [("EURUSD", 7.0, "2024-01-05T10:00:00Z", "USD", "late")]) == (1, 0)
+    assert query_prices(conn, symbol="EURUSD", start="2024-01-05", end="2024-01-05T23", limit=10)[1][:5] == ("EURUSD", 7.0, "2024-01-05T10:00:00Z", "USD", "late")
+    assert archive_prices(conn, before="2024-03-01") == {"partitions": 1, "rows": 1}
+    assert conn.execute("SELECT rows FROM price_archive WHERE symbol = 'EURUSD' AND month = '2024-01'").fetchone()[0] == 94
+    assert query_prices(conn, symbol="EURUSD", start="2024-01-05", end="2024-01-05T23", limit=10)[1][4] == "late"
+    assert len(list((Path(archive_stats(conn)["dir"]) / "EURUSD").iterdir())) == 2  # the replaced partition is removed
+    with pytest.raises(ValueError):
+        archive_prices(conn, before="soon")
+    assert query_prices(conn, symbol="EURUSD", cursor=encode_cursor("2024-01-02T00:00:00Z", 0), limit=3)[0][2] == "2024-01-01T15:00:00Z"
+
+
+def test_archived_reads_stop_at_older_partitions(conn, monkeypatch):
+    archive_prices(conn, before="2024-04-01")
+    opened, real = [], app.archive._open
+    monkeypatch.setattr(app.archive, "_open", lambda path: opened.append(path) or real(path))
+    rows = query_prices(conn, symbol="EURUSD", end="2024-03-20", limit=5)
+    assert rows[0][2] == "2024-03-19T15:00:00Z"
+    # March holds all 5 rows; February is the one older partition looked at, January is never opened
+    assert [Path(p).name[:7] for p in opened] == ["2024-03", "2024-02"]
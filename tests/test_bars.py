@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.bars import check_rollups, query_bars, rebuild_rollups, rollup_for
+from app.db import get_connection, init_db, insert_price, insert_prices
+from app.main import app
+
+
+def _ticks():
+    # 10:00-10:59 ticks every 10 minutes plus an 11:05 tick; inserted out of order on purpose
+    rows = [("EURUSD", 1.0 + i / 100, f"2024-01-02T10:{i * 10:02d}:00Z", None, "t") for i in range(6)]
+    rows.append(("EURUSD", 2.0, "2024-01-02T11:05:00Z", None, "t"))
+    return list(reversed(rows))
+
+
+def test_query_bars_ohlc():
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    insert_prices(conn, _ticks())
+    bars = query_bars(conn, symbol="EURUSD", interval="1h", start="2024-01-01")
+    assert bars == [
+        ("2024-01-02T10:00:00Z", 1.0, 1.05, 1.0, 1.05, 6),
+        ("2024-01-02T11:00:00Z", 2.0, 2.0, 2.0, 2.0, 1),
+    ]
+    # Without start only the latest `limit` bucket periods are read (empty periods produce no bar)
+    last = query_bars(conn, symbol="EURUSD", interval="5m", limit=8)
+    assert [b[0] for b in last] == ["2024-01-02T10:30:00Z", "2024-01-02T10:40:00Z", "2024-01-02T10:50:00Z", "2024-01-02T11:05:00Z"]
+    # With `end` the periods are counted back from the newest bar up to it; with `start` the first `limit` bars are read
+    before = query_bars(conn, symbol="EURUSD", interval="5m", end="2024-01-02T10:30:00Z", limit=3)
+    assert [b[0] for b in before] == ["2024-01-02T10:20:00Z", "2024-01-02T10:30:00Z"]
+    first = query_bars(conn, symbol="EURUSD", interval="5m", start="2024-01-02T10:00:00Z", limit=2)
+    assert [b[0] for b in first] == ["2024-01-02T10:00:00Z", "2024-01-02T10:10:00Z"]
+    assert query_bars(conn, symbol="EURUSD", interval="1h", start="2024-01-01", limit=1) == [bars[0]]
+    with pytest.raises(ValueError):
+        query_bars(conn, symbol="EURUSD", interval="7m")
+
+
+def test_rollups_follow_single_and_bulk_inserts():
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    insert_prices(conn, _ticks())
+    # Late ticks: one before the 10:00 open, one mid-bucket, one duplicate (ignored)
+    insert_price(conn, symbol="EURUSD", price=0.5, as_of="2024-01-02T09:59:59Z", currency=None, source="t")
+    insert_price(conn, symbol="EURUSD", price=3.0, as_of="2024-01-02T10:15:00Z", currency=None, source="t")
+    insert_price(conn, symbol="EURUSD", price=9.0, as_of="2024-01-02T10:15:00Z", currency=None, source="t")
+    insert_prices(conn, [("EURUSD", 0.9, "2024-01-02T10:59:59Z", None, "late")])
+    assert check_rollups(conn) == []
+    hourly = {b[0]: b[1:] for b in query_bars(conn, symbol="EURUSD", interval="1h", start="2024-01-02")}
+    assert hourly["2024-01-02T09:00:00Z"] == (0.5, 0.5, 0.5, 0.5, 1)
+    assert hourly["2024-01-02T10:00:00Z"] == (1.0, 3.0, 0.9, 0.9, 8)
+    day = query_bars(conn, symbol="EURUSD", interval="1d", start="2024-01-02")
+    assert day == [("2024-01-02T00:00:00Z", 0.5, 3.0, 0.5, 2.0, 10)]
+
+
+def test_rebuild_and_check_rollups():
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    insert_prices(conn, _ticks())
+    conn.execute("DELETE FROM prices WHERE as_of = '2024-01-02T11:05:00Z';")
+    assert check_rollups(conn) == [
+        ("1m", "EURUSD", "2024-01-02T11:05:00Z"),
+        ("1h", "EURUSD", "2024-01-02T11:00:00Z"),
+        ("1d", "EURUSD", "2024-01-02T00:00:00Z"),
+    ]
+    assert rebuild_rollups(conn, symbol="EURUSD") == 6 + 1 + 1
+    assert check_rollups(conn) == []
+    assert rollup_for("4h") == "1h" and rollup_for("15m") == "1m" and rollup_for("1d") == "1d"
+
+
+def test_bars_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "b.db"))
+    with get_connection() as conn:
+        init_db(conn)
+        insert_prices(conn, _ticks())
+    c = TestClient(app)
+    r = c.get("/bars/EURUSD", params={"interval": "1d"})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert len(items) == 1
+    assert items[0]["open"] == 1.0 and items[0]["close"] == 2.0 and items[0]["high"] == 2.0 and items[0]["count"] == 7
+    assert c.get("/bars/EURUSD", params={"interval": "2w"}).status_code == 400
+    assert c.get("/bars/EURUSD", params={"interval": "1h", "start": "garbage"}).status_code == 400
+    assert c.get("/bars/EURUSD", params={"interval": "1h", "end": "2024-13-45"}).status_code == 400
+    assert len(c.get("/bars/EURUSD", params={"interval": "1h", "start": "2024-01-02T12:00:00+02:00"}).json()["items"]) == 2
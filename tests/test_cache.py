@@ -0,0 +1,66 @@
+from app.cache import LatestPriceCache, quote_cache
+from app.db import get_connection, init_db, insert_price, latest_quotes, compute_positions, insert_transaction, upsert_portfolio
+
+
+def test_lru_eviction():
+    c = LatestPriceCache(maxsize=2, ttl=0)
+    for sym in ("A", "B"):
+        c.put("db", (sym, 1.0, "t", None, "s", "c", None), key=("t", 1))
+    assert c.get("db", "A") is not None  # A is now most recent
+    c.put("db", ("C", 1.0, "t", None, "s", "c", None), key=("t", 2))
+    assert c.get("db", "B") is None
+    assert c.get("db", "A") is not None
+    assert c.get("db", "C") is not None
+
+
+def test_insert_price_writes_through(tmp_path):
+    conn = get_connection(tmp_path / "c.db")
+    init_db(conn)
+    insert_price(conn, symbol="EURUSD", price=1.10, as_of="2024-01-01T00:00:00Z", currency="USD", source="t")
+    assert latest_quotes(conn, symbols=["EURUSD"])[0][1] == 1.10  # fills the cache
+
+    insert_price(conn, symbol="EURUSD", price=1.20, as_of="2024-01-02T00:00:00Z", currency="USD", source="t")
+    seen = []
+    conn.set_trace_callback(seen.append)
+    row = latest_quotes(conn, symbols=["EURUSD"])[0]
+    conn.set_trace_callback(None)
+    assert row[1] == 1.20 and row[6] == 1.10
+    assert not any("price_ticks" in sql for sql in seen)
+
+    # A back-filled older tick may change prev_price: entry is dropped and re-read
+    insert_price(conn, symbol="EURUSD", price=1.15, as_of="2024-01-01T12:00:00Z", currency="USD", source="t")
+    row = latest_quotes(conn, symbols=["EURUSD"])[0]
+    assert row[1] == 1.20 and row[6] == 1.15
+    conn.close()
+
+
+def test_case_variant_requests_use_the_cache(tmp_path):
+    conn = get_connection(tmp_path / "c.db")
+    init_db(conn)
+    insert_price(conn, symbol="EURUSD", price=1.10, as_of="2024-01-01T00:00:00Z", currency="USD", source="t")
+    assert latest_quotes(conn, symbols=["eurusd"])[0][0] == "EURUSD"
+    seen = []
+    conn.set_trace_callback(seen.append)
+    assert latest_quotes(conn, symbols=["eurusd", "EURUSD"])[0][:2] == ("EURUSD", 1.10)
+    conn.set_trace_callback(None)
+    assert not any("price_ticks" in sql for sql in seen)
+
+    # Once a symbol is stored under exactly the requested spelling, it wins over the alias
+    insert_price(conn, symbol="eurusd", price=9.0, as_of="2024-01-01T00:00:00Z", currency="USD", source="t")
+    assert latest_quotes(conn, symbols=["eurusd"])[0][:2] == ("eurusd", 9.0)
+    conn.close()
+
+
+def test_positions_use_cached_prices(tmp_path):
+    conn = get_connection(tmp_path / "c.db")
+    init_db(conn)
+    pid = upsert_portfolio(conn, id=None, name="P", base_currency="USD")
+    for sym, px in (("AAPL", 100.0), ("MSFT", 200.0)):
+        insert_price(conn, symbol=sym, price=px, as_of="2024-01-01T00:00:00Z", currency="USD", source="t")
+        insert_transaction(conn, portfolio_id=pid, date="2024-01-01", symbol=sym, type="BUY", qty=2, price=px, fees=0, currency="USD", notes=None)
+    compute_positions(conn, portfolio_id=pid)
+    hits = quote_cache.stats()["hits"]
+    out = {p["symbol"]: p for p in compute_positions(conn, portfolio_id=pid)}
+    assert out["MSFT"]["market_value"] == 400.0
+    assert quote_cache.stats()["hits"] == hits + 2
+    conn.close()
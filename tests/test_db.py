@@ -1,6 +1,10 @@
+import random
 import sqlite3
 
-from app.db import init_db, insert_price, list_prices
+from app.db import (
+    init_db, insert_price, list_prices, upsert_portfolio, delete_portfolio,
+    insert_transaction, delete_transaction, compute_positions, rebuild_positions,
+)
 
 
 def test_db_insert_and_list():
@@ -23,3 +27,97 @@ def test_db_insert_and_list():
     assert as_of.startswith("2024-01-02")
     assert currency == "USD"
     assert source == "test"
+
+
+def test_insert_prices_bulk_counts_and_atomicity():
+    import pytest
+    from app.db import insert_prices, query_prices
+
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    rows = [{"symbol": "EURUSD", "price": 1.0 + i / 1000, "as_of": f"2024-01-01T00:{i:02d}:00Z"} for i in range(50)]
+    assert insert_prices(conn, rows, source="bulk", chunk_size=7) == (50, 0)
+    # Re-sending overlaps are ignored, new rows inserted
+    more = rows[-5:] + [("EURUSD", 2.0, "2024-01-02T00:00:00Z", "USD", "bulk")]
+    assert insert_prices(conn, more, source="bulk") == (1, 5)
+    assert query_prices(conn, symbol="EURUSD", limit=1)[0][1] == 2.0
+
+    with pytest.raises(ValueError, match="Row 1"):
+        insert_prices(conn, [("AAPL", 1.0, "2024-01-01", None, "x"), {"symbol": "AAPL"}])
+    assert query_prices(conn, symbol="AAPL") == []
+
+
+def test_positions_snapshot_tracks_inserts_and_deletes():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("PRAGMA foreign_keys = ON;")
+    init_db(conn)
+    pid = upsert_portfolio(conn, id=None, name="P", base_currency="USD")
+    rng = random.Random(3)
+    ids = []
+    for i in range(200):
+        # Dates are random, so most inserts are back-dated relative to the previous one
+        ids.append(insert_transaction(
+            conn, portfolio_id=pid, date=f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            symbol=rng.choice(["AAPL", "MSFT", "EURUSD"]), type=rng.choice(["BUY", "BUY", "SELL", "DIV"]),
+            qty=rng.randint(1, 50), price=rng.randint(10, 500), fees=1.0, currency="USD", notes=None,
+        ))
+    for rid in rng.sample(ids, 120):
+        assert delete_transaction(conn, id=rid) == 1
+    assert delete_transaction(conn, id=ids[0] + 10_000) == 0
+    snap = {p["symbol"]: p for p in compute_positions(conn, portfolio_id=pid)}
+    rebuild_positions(conn, portfolio_id=pid)
+    full = {p["symbol"]: p for p in compute_positions(conn, portfolio_id=pid)}
+    assert snap.keys() == full.keys()
+    for sym in full:
+        assert abs(snap[sym]["qty"] - full[sym]["qty"]) < 1e-6
+        assert abs(snap[sym]["avg_cost"] - full[sym]["avg_cost"]) < 1e-6
+    # Removing every transaction of a symbol drops its row; deleting the portfolio cascades
+    for (rid,) in conn.execute("SELECT id FROM transactions WHERE symbol = 'MSFT'").fetchall():
+        delete_transaction(conn, id=rid)
+    assert "MSFT" not in {p["symbol"] for p in compute_positions(conn, portfolio_id=pid)}
+    delete_portfolio(conn, id=pid)
+    assert conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0] == 0
+
+
+def test_legacy_text_prices_migrate_to_ticks():
+    from app.bars import query_bars
+    from app.db import MIGRATIONS, _migration_price_ticks, get_price, query_prices
+
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    # A database from before price_ticks: text as_of in mixed spellings, one unparseable
+    conn.execute("DROP VIEW prices")
+    conn.execute(
+        "CREATE TABLE prices (id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT NOT NULL, price REAL NOT NULL, as_of TEXT NOT NULL,"
+        " currency TEXT, source TEXT NOT NULL, created_at TEXT DEFAULT (datetime('now')), UNIQUE(symbol, as_of, source))"
+    )
+    conn.executemany(
+        "INSERT INTO prices(id, symbol, price, as_of, currency, source) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (3, "EURUSD", 1.10, "2024-01-01T00:00:00Z", "USD", "fx"),
+            (5, "EURUSD", 1.11, "2024-01-01", "USD", "fx"),  # same instant as id 3
+            (8, "EURUSD", 1.12, "2024-01-02T10:30:00+02:00", "USD", "fx"),
+            (9, "AAPL", 150.0, "yesterday", "USD", "t"),
+        ],
+    )
+    conn.execute(f"PRAGMA user_version = {MIGRATIONS.index(_migration_price_ticks)}")
+    init_db(conn)
+
+    rows = query_prices(conn, symbol="EURUSD", limit=10)
+    assert [r[:5] for r in rows] == [
+        ("EURUSD", 1.12, "2024-01-02T10:30:00+02:00", "USD", "fx"),
+        ("EURUSD", 1.10, "2024-01-01T00:00:00Z", "USD", "fx"),
+    ]
+    assert [r[0] for r in conn.execute("SELECT id FROM prices ORDER BY id")] == [3, 8]
+    assert conn.execute("SELECT COUNT(*) FROM price_ticks").fetchone()[0] == 2
+    assert [b[4] for b in query_bars(conn, symbol="EURUSD", interval="1d", limit=10)] == [1.10, 1.12]
+    # The view keeps legacy SQL working, and new ids continue after the legacy ones
+    conn.execute("INSERT INTO prices(symbol, price, as_of, currency, source) VALUES ('GBPUSD', 1.3, '2024-01-03', NULL, 'fx')")
+    assert conn.execute("SELECT id, as_of FROM prices WHERE symbol = 'GBPUSD'").fetchone() == (10, "2024-01-03")
+    assert get_price(conn, symbol="EURUSD", as_of="2024-01-01", source="fx")[1] == 1.10
+    assert insert_price(conn, symbol="EURUSD", price=1.2, as_of="2024-01-02T08:30:00.000Z", currency="USD", source="fx") == 0
+    try:
+        insert_price(conn, symbol="EURUSD", price=1.2, as_of="soon", currency="USD", source="fx")
+        assert False, "unparseable as_of accepted"
+    except ValueError:
+        pass
@@ -0,0 +1,79 @@
+import pytest
+import requests
+
+from app.http_client import ProviderClient
+
+
+class Resp:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+def test_retries_429_and_5xx_with_backoff():
+    sleeps = []
+    client = ProviderClient(retries=3, backoff=0.5, sleep=sleeps.append)
+    script = [Resp(429, {"Retry-After": "2"}), Resp(503), Resp(200)]
+    client.session.request = lambda method, url, **kw: script.pop(0)
+    r = client.get("http://x/y", provider="stub")
+    assert r.status_code == 200
+    assert sleeps[0] == 2.0  # Retry-After honoured
+    assert 0.0 <= sleeps[1] <= 1.0  # jittered: uniform(0, backoff * 2**1)
+    st = client.stats()["stub"]
+    assert st["requests"] == 3 and st["retries"] == 2 and st["errors"] == 2
+
+
+def test_gives_up_after_retries():
+    client = ProviderClient(retries=1, sleep=lambda s: None)
+    calls = []
+
+    def boom(method, url, **kw):
+        calls.append(url)
+        raise requests.ConnectionError("refused")
+
+    client.session.request = boom
+    with pytest.raises(requests.ConnectionError):
+        client.get("http://x/y", provider="stub")
+    assert len(calls) == 2
+
+    client.session.request = lambda method, url, **kw: Resp(500)
+    assert client.get("http://x/y").status_code == 500  # final response returned to the caller
+
+
+def test_post_is_retried_only_when_not_sent():
+    client = ProviderClient(retries=3, sleep=lambda s: None)
+    calls = []
+
+    def fail(exc):
+        def send(method, url, **kw):
+            calls.append(method)
+            raise exc
+        return send
+
+    # A read timeout or dropped connection may come after the server acted on the POST
+    for exc in (requests.ReadTimeout("slow"), requests.ConnectionError("reset")):
+        calls.clear()
+        client.session.request = fail(exc)
+        with pytest.raises(type(exc)):
+            client.post("http://x/y", provider="stub")
+        assert calls == ["POST"]
+    calls.clear()
+    client.session.request = fail(requests.ConnectTimeout("connect"))
+    with pytest.raises(requests.ConnectTimeout):
+        client.post("http://x/y", provider="stub")
+    assert len(calls) == 4
+
+    script = [Resp(503), Resp(429), Resp(200)]
+    client.session.request = lambda method, url, **kw: script.pop(0)
+    assert client.post("http://x/y").status_code == 503
+    assert client.post("http://x/y").status_code == 200  # 429 means it was not processed
+
+
+def test_session_is_shared_and_pooled():
+    client = ProviderClient(pool_maxsize=4)
+    adapter = client.session.get_adapter("https://www.alphavantage.co/query")
+    assert adapter is client.session.get_adapter("https://api.openai.com/v1/chat/completions")
+    assert adapter._pool_maxsize == 4
@@ -0,0 +1,70 @@
+import sqlite3
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.db import get_connection, init_db, insert_prices
+from app.ict import detect_levels, list_levels, refresh_structure
+from app.main import app
+
+
+def _bar_ticks(symbol, start_minute, bars, step=1):
+    """Four ticks per bar (open, high, low, close) from (high, low) pairs, one bar every `step` minutes."""
+    rows = []
+    for k, (hi, lo) in enumerate(bars):
+        m = start_minute + k * step
+        ts = f"2024-01-{2 + m // 1440:02d}T{m // 60 % 24:02d}:{m % 60:02d}"
+        mid = (hi + lo) / 2
+        rows += [(symbol, mid, f"{ts}:00Z", None, "t"), (symbol, hi, f"{ts}:10Z", None, "t"),
+                 (symbol, lo, f"{ts}:20Z", None, "t"), (symbol, mid, f"{ts}:30Z", None, "t")]
+    return rows
+
+
+def test_detect_levels():
+    t = [f"b{i}" for i in range(9)]
+    high = [1.0, 1.2, 1.6, 1.5, 1.4, 1.6, 1.3, 1.2, 1.25]
+    low = [0.9, 1.0, 1.3, 1.2, 1.1, 1.1, 0.95, 1.0, 1.1]
+    levels = {(k, lt): (t2, p, p2, f) for k, lt, t2, p, p2, f in detect_levels(t, high, low, swing=1)}
+    # b0.high=1.0 < b2.low=1.3: bullish gap 1.0-1.3 at b1, filled when b6 trades down to 0.95
+    assert levels[("fvg_bull", "b1")] == ("b2", 1.0, 1.3, "b6")
+    assert ("swing_high", "b2") in levels and ("swing_high", "b5") in levels
+    assert ("swing_low", "b4") in levels and ("swing_low", "b6") in levels
+    # b2 and b5 both top at 1.6 -> equal highs, not yet swept
+    assert levels[("eq_high", "b2")] == ("b5", 1.6, 1.6, None)
+
+
+def test_incremental_refresh_matches_full_rebuild():
+    rng = np.random.default_rng(7)
+    mid = 1.1 + np.cumsum(rng.normal(0, 0.002, 240))
+    bars = [(m + abs(rng.normal(0, 0.001)), m - abs(rng.normal(0, 0.001))) for m in mid]
+    ticks = _bar_ticks("EURUSD", 0, bars)
+    inc = sqlite3.connect(":memory:")
+    init_db(inc)
+    for i in range(0, len(ticks), 26):  # several bars per step, the last one usually half-formed
+        insert_prices(inc, ticks[i:i + 26])
+        refresh_structure(inc, symbol="EURUSD", interval="1m")
+    full = sqlite3.connect(":memory:")
+    init_db(full)
+    insert_prices(full, ticks)
+    s_full = refresh_structure(full, symbol="EURUSD", interval="1m", full=True)
+    assert refresh_structure(inc, symbol="EURUSD", interval="1m") == s_full
+    assert list_levels(inc, symbol="EURUSD", interval="1m", limit=10000) == list_levels(full, symbol="EURUSD", interval="1m", limit=10000)
+    assert any(k.startswith("fvg") for k, *_ in list_levels(full, symbol="EURUSD", interval="1m", limit=10000))
+
+
+def test_structure_endpoint_and_insights_prompt(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "s.db"))
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    ups = [(1.10 + i * 0.002 + 0.001, 1.10 + i * 0.002 - 0.001) for i in range(30)]
+    with get_connection() as conn:
+        init_db(conn)
+        insert_prices(conn, _bar_ticks("EURUSD", 0, ups, step=60))
+    c = TestClient(app)
+    r = c.get("/structure/EURUSD", params={"interval": "1h"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["summary"]["ok"] is True and body["summary"]["bias"] == "bullish"
+    assert body["summary"]["zone"] == "premium"
+    assert c.get("/structure/NOPE").status_code == 404
+    r = c.post("/insights", json={"symbol": "EURUSD", "horizon": "daily"})
+    assert "Market structure (1h" in r.json()["summary"]
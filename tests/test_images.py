@@ -0,0 +1,77 @@
+import io
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.db import get_connection, init_db
+from app.images import preprocess_image, store_image
+from app.llm_stub import StubLLMHandler, serve
+from app.main import app
+
+
+def _png(size, color=(200, 30, 30, 255), mode="RGBA"):
+    buf = io.BytesIO()
+    Image.new(mode, size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_preprocess_downscales_and_flattens_alpha():
+    data, mime, w, h = preprocess_image(_png((3000, 1500), (0, 0, 0, 0)), side=1000)
+    assert mime == "image/jpeg" and (w, h) == (1000, 500)
+    img = Image.open(io.BytesIO(data))
+    assert img.format == "JPEG" and img.size == (1000, 500)
+    assert img.getpixel((10, 10)) == (255, 255, 255)  # transparent pixels become white, not black
+    # Small images keep their size; output is deterministic
+    assert preprocess_image(_png((40, 30)), side=1000)[2:] == (40, 30)
+    assert preprocess_image(_png((40, 30)), side=1000)[0] == preprocess_image(_png((40, 30)), side=1000)[0]
+
+
+def test_upload_dedups_and_serves(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "i.db"))
+    monkeypatch.setenv("IMAGE_MAX_SIDE", "256")
+    with get_connection() as conn:
+        init_db(conn)
+    c = TestClient(app)
+    raw = _png((1024, 512))
+    first = c.post("/images", content=raw, headers={"Content-Type": "image/png"}).json()
+    assert (first["width"], first["height"], first["deduped"]) == (256, 128, False)
+    again = c.post("/images", content=raw, headers={"Content-Type": "image/png"}).json()
+    assert again["digest"] == first["digest"] and again["deduped"] is True
+    with get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 1
+        # A different source that processes to the same bytes shares the stored row
+        assert store_image(conn, _png((2048, 1024)))["digest"] == first["digest"]
+        assert conn.execute("SELECT COUNT(*) FROM images").fetchone()[0] == 1
+
+    r = c.get(f"/images/{first['digest']}")
+    assert r.status_code == 200 and r.headers["content-type"] == "image/jpeg" and len(r.content) == first["size"]
+    assert c.get("/images/missing").status_code == 404
+    assert c.post("/images", content=b"not an image").status_code == 400
+    monkeypatch.setenv("IMAGE_MAX_UPLOAD_BYTES", "100")
+    assert c.post("/images", content=raw).status_code == 413
+
+
+def test_insights_send_stored_images(tmp_path, monkeypatch):
+    StubLLMHandler.calls = []
+    StubLLMHandler.delay = 0.0
+    StubLLMHandler.status = 200
+    srv, url = serve()
+    try:
+        monkeypatch.setenv("OPENAI_URL", url)
+        monkeypatch.setenv("OPENAI_API_KEY", "stub")
+        monkeypatch.setenv("DB_PATH", str(tmp_path / "v.db"))
+        with get_connection() as conn:
+            init_db(conn)
+        c = TestClient(app)
+        digest = c.post("/images", content=_png((4000, 4000))).json()["digest"]
+        req = {"symbol": "EURUSD", "notes": "chart", "image_digests": [digest]}
+        assert c.post("/insights", json=req).json()["cached"] is False
+        parts = StubLLMHandler.calls[0]["messages"][-1]["content"]
+        urls = [p["image_url"]["url"] for p in parts if p["type"] == "image_url"]
+        assert len(urls) == 1 and urls[0].startswith("data:image/jpeg;base64,")
+        assert len(urls[0]) < 100_000
+        # Same stored image, same answer from the cache
+        assert c.post("/insights", json=req).json()["cached"] is True and len(StubLLMHandler.calls) == 1
+        assert c.post("/insights", json={**req, "image_digests": ["nope"]}).status_code == 400
+    finally:
+        srv.shutdown()
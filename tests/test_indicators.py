@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app import indicators as ind
+from app.db import get_connection, init_db, insert_price, insert_prices
+from app.main import app
+
+
+def _naive(x, n, fn):
+    out = np.full(len(x), np.nan)
+    out[n - 1:] = [fn(w) for w in sliding_window_view(x, n)]
+    return out
+
+
+@pytest.mark.parametrize("n", [1, 3, 14, 50])
+def test_rolling_kernels_match_naive(n):
+    rng = np.random.default_rng(n)
+    x = 1.1 + np.cumsum(rng.normal(0, 1e-3, 500))
+    np.testing.assert_allclose(ind.sma(x, n), _naive(x, n, np.mean), rtol=1e-9)
+    np.testing.assert_array_equal(ind.rolling_max(x, n), _naive(x, n, np.max))
+    np.testing.assert_array_equal(ind.rolling_min(x, n), _naive(x, n, np.min))
+    if n > 1:
+        np.testing.assert_allclose(ind.rolling_std(x, n), _naive(x, n, lambda w: np.std(w, ddof=1)), rtol=1e-6, atol=1e-12)
+    assert np.isnan(ind.sma(x[: n - 1], n)).all()
+
+
+def test_ema_atr_and_swings():
+    x = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    e = ind.ema(x, 3)  # seeded with mean(1, 2, 3) = 2, alpha = 0.5
+    assert np.isnan(e[:2]).all() and e[2:].tolist() == [2.0, 3.0, 4.0]
+    high = np.array([2.0, 3.0, 2.5, 5.0, 4.0])
+    low = np.array([1.0, 2.0, 1.5, 3.0, 3.5])
+    close = np.array([1.5, 2.5, 2.0, 4.5, 3.8])
+    assert ind.true_range(high, low, close).tolist() == [1.0, 1.5, 1.0, 3.0, 1.0]
+    a = ind.atr(high, low, close, 2)
+    assert a[1:].tolist() == [1.25, 1.125, 2.0625, 1.53125]
+    px = np.array([1, 3, 2, 1, 2, 4, 2, 1, 1.5], dtype=float)
+    assert ind.swing_highs(px, 1).tolist() == [1, 5]
+    assert ind.swing_lows(px, 1).tolist() == [3, 7]
+    with pytest.raises(ValueError):
+        ind.sma(x, 0)
+
+
+def test_indicators_endpoint_caches_per_last_bar(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "i.db"))
+    rows = [("EURUSD", 1.0 + (i % 7) / 100, f"2024-01-02T{i // 60:02d}:{i % 60:02d}:00Z", None, "t") for i in range(600)]
+    with get_connection() as conn:
+        init_db(conn)
+        insert_prices(conn, rows)
+    c = TestClient(app)
+    params = {"interval": "5m", "limit": 50, "sma": "3,10", "ema": "5"}
+    r = c.get("/indicators/EURUSD", params=params)
+    assert r.status_code == 200
+    body = r.json()
+    assert len(body["t"]) == 50 and body["cached"] is False
+    assert set(body["series"]) == {"sma3", "sma10", "ema5", "std14", "high20", "low20", "atr14"}
+    # 60 extra bars of history are read, so even the first returned bar is warmed up
+    assert None not in body["series"]["sma10"]
+    assert c.get("/indicators/EURUSD", params=params).json()["cached"] is True
+
+    with get_connection() as conn:
+        insert_price(conn, symbol="EURUSD", price=2.0, as_of="2024-01-02T09:59:30Z", currency=None, source="t")
+    fresh = c.get("/indicators/EURUSD", params=params).json()
+    assert fresh["cached"] is False and fresh["high"][-1] == 2.0
+
+    assert c.get("/indicators/NOPE").status_code == 404
+    assert c.get("/indicators/EURUSD", params={"sma": "x"}).status_code == 400
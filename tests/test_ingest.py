@@ -11,7 +11,7 @@ def test_fetch_price_smoke(monkeypatch):
         def json(self):
             return self._json
 
-    def fake_get(url, timeout=10):
+    def fake_request(method, url, timeout=10):
         return DummyResp({
             "chart": {
                 "result": [{
@@ -22,8 +22,8 @@ def test_fetch_price_smoke(monkeypatch):
             }
         })
 
-    import requests
-    monkeypatch.setattr(requests, "get", fake_get)
+    from app.http_client import http_client
+    monkeypatch.setattr(http_client.session, "request", fake_request)
 
     out = fetch_price("AAPL")
     assert out["symbol"] == "AAPL"
@@ -1,4 +1,12 @@
+import base64
+import io
+
 from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.db import get_connection, init_db, insert_prices
+from app.http_client import http_client
+from app.insights import put_cached_insight
 from app.main import app
 
 def test_insights_demo_without_key():
@@ -7,3 +15,56 @@ def test_insights_demo_without_key():
     assert r.status_code == 200
     data = r.json()
     assert 'summary' in data and isinstance(data['summary'], str) and len(data['summary']) > 0
+
+
+def test_insights_cache_reuses_identical_requests(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "c.db"))
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    with get_connection() as conn:
+        init_db(conn)
+    calls = []
+
+    class Resp:
+        status_code = 200
+        def json(self):
+            return {"choices": [{"message": {"content": f"plan #{len(calls)}"}}]}
+
+    def fake_request(method, url, **kwargs):
+        calls.append(kwargs["json"])
+        return Resp()
+
+    monkeypatch.setattr(http_client.session, "request", fake_request)
+    c = TestClient(app)
+    buf = io.BytesIO()
+    Image.new("RGB", (8, 8), (10, 20, 30)).save(buf, format="PNG")
+    img = "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode()
+    req = {"symbol": "EURUSD", "horizon": "daily", "notes": "London", "images": [img]}
+    first = c.post("/insights", json=req).json()
+    assert first["summary"] == "plan #1" and first["cached"] is False
+    again = c.post("/insights", json=req).json()
+    assert again["summary"] == "plan #1" and again["cached"] is True and again["cache_hits"] == 1
+    assert again["cache_key"] == first["cache_key"] and len(calls) == 1
+
+    # Any input change is a different key; refresh bypasses the lookup and replaces the entry
+    assert c.post("/insights", json={**req, "notes": "New York"}).json()["cached"] is False
+    assert c.post("/insights", json={**req, "refresh": True}).json()["summary"] == "plan #3"
+    assert c.post("/insights", json=req).json()["summary"] == "plan #3"
+    assert len(calls) == 3
+
+    # Ticks inside the newest 1h bar keep the key (the prompt's live price may differ); a new bar changes it
+    with get_connection() as conn:
+        insert_prices(conn, [("EURUSD", 1.10 + i / 100, f"2024-01-02T{h:02d}:{i:02d}:00Z", None, "t") for h in range(8) for i in range(3)])
+    plain = {"symbol": "EURUSD", "horizon": "daily"}
+    assert c.post("/insights", json=plain).json()["cached"] is False
+    with get_connection() as conn:
+        insert_prices(conn, [("EURUSD", 1.30, "2024-01-02T07:30:00Z", None, "t")])
+    assert c.post("/insights", json=plain).json()["cached"] is True
+    with get_connection() as conn:
+        insert_prices(conn, [("EURUSD", 1.31, "2024-01-02T08:05:00Z", None, "t")])
+    assert c.post("/insights", json=plain).json()["cached"] is False
+    assert len(calls) == 5
+
+    with get_connection() as conn:
+        for i in range(5):
+            put_cached_insight(conn, key=f"k{i}", model="m", summary="s", max_entries=3)
+        assert conn.execute("SELECT COUNT(*) FROM insights_cache").fetchone()[0] == 3
@@ -0,0 +1,141 @@
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import get_connection, init_db
+from app.jobs import JobLimitError, JobQueue
+from app.llm_stub import StubLLMHandler, serve
+from app.main import app
+
+
+@pytest.fixture()
+def llm(monkeypatch, tmp_path):
+    StubLLMHandler.calls = []
+    StubLLMHandler.delay = 0.0
+    StubLLMHandler.status = 200
+    srv, url = serve()
+    monkeypatch.setenv("OPENAI_URL", url)
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "j.db"))
+    with get_connection() as conn:
+        init_db(conn)
+    yield StubLLMHandler
+    srv.shutdown()
+
+
+def _events(client, job_id):
+    out = []
+    with client.stream("GET", f"/insights/jobs/{job_id}/events") as r:
+        assert r.status_code == 200
+        name = None
+        for line in r.iter_lines():
+            if line.startswith("event: "):
+                name = line[7:]
+            elif line.startswith("data: "):
+                out.append((name, json.loads(line[6:])))
+    return out
+
+
+def test_job_streams_tokens_then_result(llm):
+    c = TestClient(app)
+    r = c.post("/insights/jobs", json={"symbol": "EURUSD", "horizon": "daily", "notes": "London open"})
+    assert r.status_code == 202 and r.json()["status"] in ("queued", "running", "done")
+    events = _events(c, r.json()["id"])
+    tokens = [d["text"] for e, d in events if e == "token"]
+    assert len(tokens) > 3 and events[-1][0] == "done"
+    assert "".join(tokens) == events[-1][1]["summary"]
+    assert events[-1][1]["summary"].startswith("Stub plan: Provide a daily view for EURUSD")
+    assert llm.calls[0]["stream"] is True
+
+    done = c.get(f"/insights/jobs/{r.json()['id']}").json()
+    assert done["status"] == "done" and done["text"] == done["result"]["summary"]
+    # A late subscriber replays the whole stream; the same request is now answered from the cache
+    assert _events(c, r.json()["id"]) == events
+    again = _events(c, c.post("/insights/jobs", json={"symbol": "EURUSD", "horizon": "daily", "notes": "London open"}).json()["id"])
+    assert again[-1][1]["cached"] is True and len(llm.calls) == 1
+    assert c.get("/insights/jobs/nope").status_code == 404
+
+
+def test_per_user_limit_and_cheap_endpoints_stay_responsive(llm):
+    llm.delay = 0.05
+    c = TestClient(app)
+    ids = [c.post("/insights/jobs", json={"symbol": "EURUSD", "notes": f"n{i}"}).json()["id"] for i in range(2)]
+    r = c.post("/insights/jobs", json={"symbol": "EURUSD", "notes": "n2"})
+    assert r.status_code == 429
+    started = time.perf_counter()
+    assert c.get("/health").status_code == 200
+    assert time.perf_counter() - started < 0.5
+    other = TestClient(app, cookies={"session": "someone-else"})
+    r = other.post("/insights/jobs", json={"symbol": "EURUSD", "notes": "n3"})
+    assert r.status_code == 202
+    for job_id in ids + [r.json()["id"]]:
+        assert _events(c, job_id)[-1][0] == "done"
+    assert c.post("/insights", json={"symbol": "EURUSD", "notes": "n0"}).json()["cached"] is True
+    # The blocking call is not subject to the per-user cap, even while that user's jobs run
+    ids = [c.post("/insights/jobs", json={"symbol": "EURUSD", "notes": f"m{i}"}).json()["id"] for i in range(2)]
+    assert c.post("/insights", json={"symbol": "EURUSD", "notes": "m2"}).status_code == 200
+    for job_id in ids:
+        assert _events(c, job_id)[-1][0] == "done"
+
+
+def test_upstream_error_is_reported_on_stream_and_sync_call(llm):
+    llm.status = 500
+    c = TestClient(app)
+    events = _events(c, c.post("/insights/jobs", json={"symbol": "EURUSD"}).json()["id"])
+    assert events == [("error", {"status_code": 502, "detail": "OpenAI error 500: stub failure"})]
+    r = c.post("/insights", json={"symbol": "EURUSD", "refresh": True})
+    assert r.status_code == 502
+
+
+def test_job_queue_limits():
+    q = JobQueue(workers=1, per_owner=1, max_pending=2)
+    gate = []
+
+    def slow(on_token):
+        while not gate:
+            time.sleep(0.01)
+        on_token("ok")
+        return {"summary": "ok"}
+
+    a = q.submit("a", slow)
+    with pytest.raises(JobLimitError) as e:
+        q.submit("a", slow)
+    assert e.value.status_code == 429
+    q.submit("b", slow)
+    with pytest.raises(JobLimitError) as e:
+        q.submit("c", slow)
+    assert e.value.status_code == 503
+    gate.append(1)
+    for _ in range(200):
+        if q.stats()["completed"] == 2:
+            break
+        time.sleep(0.01)
+    assert a.snapshot()["result"] == {"summary": "ok"} and q.stats()["rejected"] == 2
+    q.shutdown()
+
+
+def test_shutdown_fails_unfinished_jobs():
+    import asyncio
+
+    q = JobQueue(workers=1)
+    gate = []
+
+    def slow(on_token):
+        while not gate:
+            time.sleep(0.01)
+        return {"summary": "late"}
+
+    running, queued = q.submit("a", slow), q.submit("b", slow)
+    q.shutdown()
+    for job in (running, queued):
+        outcome = asyncio.run(asyncio.wait_for(job.wait(), 1))
+        assert outcome == {"event": "error", "data": {"status_code": 503, "detail": "Shutting down"}}
+    gate.append(1)
+    time.sleep(0.05)
+    assert running.snapshot()["status"] == "error" and running.result is None and q.stats()["failed"] == 2
+    # A worker that picks up a job already failed by shutdown leaves it failed
+    q._run(queued, lambda on_token: 1 / 0)
+    assert queued.snapshot()["status"] == "error" and q.stats()["failed"] == 2
+
@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import MIGRATIONS, _migration_journal_tags, delete_journal, get_connection, init_db, query_journal, upsert_journal
+from app.journal import journal_stats
+from app.main import app
+
+
+TRADES = [
+    # symbol, date, direction, qty, entry, stop, exit, fees, tags
+    ("EURUSD", "2024-01-01T10:00", "Long", 1000, 1.10, 1.09, 1.12, 2.0, "fx,breakout"),
+    ("EURUSD", "2024-01-02T10:00", "Short", 1000, 1.12, 1.13, 1.13, 2.0, "fx"),
+    ("XAUUSD", "2024-01-03T10:00", "Long", 1, 2000.0, None, 2030.0, 0.0, "breakout"),
+    ("XAUUSD", "2024-01-04T10:00", "Long", 1, 2030.0, 2020.0, None, 0.0, "fx"),
+]
+
+
+def test_journal_stats_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "j.db"))
+    with get_connection() as conn:
+        init_db(conn)
+        for s, d, dirn, q, e, st, x, f, tags in TRADES:
+            upsert_journal(conn, id=None, symbol=s, date=d, direction=dirn, qty=q, entry=e, stop=st, exit=x, fees=f, tags=tags, notes=None)
+    c = TestClient(app)
+    body = c.get("/journal/stats").json()
+    # PnL: 18, -12, 30; the XAUUSD trade without an exit is open
+    assert (body["trades"], body["open"], body["wins"], body["losses"]) == (3, 1, 2, 1)
+    assert body["pnl"] == pytest.approx(36.0)
+    assert body["expectancy"] == pytest.approx(12.0)
+    assert body["profit_factor"] == pytest.approx(48 / 12)
+    assert body["avg_r"] == pytest.approx((1.8 - 1.2) / 2)  # the stop-less trade has no R
+    assert body["equity"]["pnl"] == pytest.approx([18.0, 6.0, 36.0])
+    assert sum(body["histogram"]["counts"]) == 3 and len(body["histogram"]["edges"]) == 11
+    by_symbol = {g["key"]: g for g in body["by_symbol"]}
+    assert by_symbol["EURUSD"]["trades"] == 2 and by_symbol["EURUSD"]["win_rate"] == 0.5
+    assert [g["key"] for g in body["by_tag"]] == ["breakout", "fx"]
+    assert body["by_tag"][0]["pnl"] == pytest.approx(48.0)
+
+    long_fx = c.get("/journal/stats", params={"direction": "Long", "symbol": "EURUSD", "bins": 4}).json()
+    assert long_fx["trades"] == 1 and long_fx["histogram"]["counts"] == [0, 0, 1, 0]
+    empty = c.get("/journal/stats", params={"symbol": "NOPE"}).json()
+    assert empty["trades"] == 0 and empty["by_symbol"] == [] and empty["histogram"]["counts"] == []
+
+
+def test_journal_tags_index_filters_exactly_and_stays_in_sync():
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    a = upsert_journal(conn, id=None, symbol="EURUSD", date="2024-01-01", direction="Long", qty=1, entry=1, stop=None, exit=2, fees=0, tags="FX, breakout", notes=None)
+    b = upsert_journal(conn, id=None, symbol="EURUSD", date="2024-01-02", direction="Long", qty=1, entry=1, stop=None, exit=2, fees=0, tags="fxscalp", notes=None)
+    c = upsert_journal(conn, id=None, symbol="EURUSD", date="2024-01-03", direction="Long", qty=1, entry=1, stop=None, exit=2, fees=0, tags="fx", notes=None)
+
+    def ids(**kw):
+        return [r[0] for r in query_journal(conn, **kw)]
+
+    assert ids(tag="fx") == [c, a]  # no substring match on "fxscalp"
+    assert ids(tag="breakout,fxscalp") == [b, a]
+    assert ids(tag="fx,breakout", tag_mode="all") == [a]
+    with pytest.raises(ValueError):
+        ids(tag="fx", tag_mode="some")
+
+    upsert_journal(conn, id=c, symbol="EURUSD", date="2024-01-03", direction="Long", qty=1, entry=1, stop=None, exit=2, fees=0, tags="breakout", notes=None)
+    assert ids(tag="fx") == [a] and ids(tag="breakout") == [c, a]
+    delete_journal(conn, id=a)
+    assert conn.execute("SELECT COUNT(*) FROM journal_tags WHERE journal_id=?", (a,)).fetchone()[0] == 0
+    assert [g["key"] for g in journal_stats(conn)["by_tag"]] == ["breakout", "fxscalp"]
+
+    # Backfill: a database from before the journal_tags migration gets its index on the next init_db
+    conn.execute("DROP TABLE journal_tags")
+    conn.execute(f"PRAGMA user_version = {MIGRATIONS.index(_migration_journal_tags)}")
+    init_db(conn)
+    assert ids(tag="fxscalp") == [b] and ids(tag="breakout") == [c]
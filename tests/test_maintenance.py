@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+from app.archive import archive_prices, archive_stats
+from app.bars import check_rollups, query_bars, rebuild_rollups
+from app.db import create_session, get_connection, get_session, init_db, insert_email_code, insert_prices, query_prices
+from app.maintenance import RetentionPolicy, maintenance_from_env, run_maintenance
+
+
+NOW = datetime(2024, 2, 10, 6, tzinfo=timezone.utc).timestamp()
+
+
+def _ticks():
+    # Hourly EURUSD ticks for Dec 2023 - 8 Feb 2024
+    start = datetime(2023, 12, 1, tzinfo=timezone.utc)
+    return [
+        ("EURUSD", 1.0 + h / 10000, (start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M:%SZ"), "USD", "fx")
+        for h in range(70 * 24)
+    ]
+
+
+def test_retention_keeps_bars_and_purges_expired(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARCHIVE_DIR", str(tmp_path / "archive"))
+    conn = get_connection(tmp_path / "m.db")
+    init_db(conn)
+    insert_prices(conn, _ticks())
+    archive_prices(conn, before="2024-01-10")
+    daily = query_bars(conn, symbol="EURUSD", interval="1d", start="2023-12-01", limit=100)
+    hourly = query_bars(conn, symbol="EURUSD", interval="1h", start="2024-01-25", end="2024-01-27", limit=100)
+    insert_email_code(conn, email="a@b.c", code="123456")
+    insert_email_code(conn, email="a@b.c", code="654321")
+    create_session(conn, email="a@b.c", token="old")
+    create_session(conn, email="a@b.c", token="new")
+    conn.execute("UPDATE email_codes SET expires_at = datetime('now', '-1 minutes') WHERE code = '123456'")
+    conn.execute("UPDATE sessions SET expires_at = datetime('now', '-1 days') WHERE token = 'old'")
+    conn.commit()
+
+    policy = RetentionPolicy(ticks_days=10, minute_bars_days=20, images_days=0, batch_size=100, pause=0)
+    done = run_maintenance(conn, policy, now=NOW)
+    assert done["purged"]["email_codes"] == 1 and done["purged"]["sessions"] == 1
+    assert get_session(conn, token="new") and not get_session(conn, token="old")
+    # Cutoff is 31 Jan 00:00: December was archived and its partition goes too
+    assert done["ticks"] == {"symbols": 1, "ticks": 30 * 24, "archived": 31 * 24}
+    assert archive_stats(conn)["partitions"] == 0
+    assert query_prices(conn, symbol="EURUSD", end="2024-01-30T23:59:59Z", limit=5) == []
+    assert len(query_prices(conn, symbol="EURUSD", limit=1000)) == 9 * 24
+
+    # Bars survive, also through a rebuild; only 1m bars older than 20 days are downsampled away
+    assert query_bars(conn, symbol="EURUSD", interval="1d", start="2023-12-01", limit=100) == daily
+    rebuild_rollups(conn)
+    assert query_bars(conn, symbol="EURUSD", interval="1d", start="2023-12-01", limit=100) == daily
+    assert query_bars(conn, symbol="EURUSD", interval="1h", start="2024-01-25", end="2024-01-27", limit=100) == hourly
+    assert check_rollups(conn) == []
+    assert query_bars(conn, symbol="EURUSD", interval="5m", start="2024-01-19", end="2024-01-19T23:59:59Z", limit=10) == []
+    assert len(query_bars(conn, symbol="EURUSD", interval="5m", start="2024-01-22", end="2024-01-22T23:59:59Z", limit=100)) == 24
+
+    # A pruned period only has bars: re-ingesting its ticks is ignored
+    assert insert_prices(conn, [("EURUSD", 9.0, "2024-01-05T00:30:00Z", "USD", "fx")]) == (0, 1)
+    assert done["auto_vacuum"] == "INCREMENTAL" and done["vacuumed_pages"] > 0 and done["free_pages"] == 0
+    assert conn.execute("PRAGMA analysis_limit").fetchone()[0] == 0
+    assert run_maintenance(conn, policy, now=NOW)["ticks"]["ticks"] == 0
+    conn.close()
+
+
+def test_maintenance_is_opt_in(monkeypatch):
+    monkeypatch.delenv("MAINTENANCE_INTERVAL", raising=False)
+    monkeypatch.delenv("RETAIN_IMAGES_DAYS", raising=False)
+    assert maintenance_from_env() is None
+    assert RetentionPolicy.from_env().images_days == 0
+    monkeypatch.setenv("MAINTENANCE_INTERVAL", "3600")
+    assert maintenance_from_env().interval == 3600
+
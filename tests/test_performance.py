@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db import get_connection, init_db, insert_price, insert_prices, insert_transaction, upsert_portfolio
+from app.main import app
+
+
+def test_performance_endpoint_twr_drawdown_and_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "p.db"))
+    closes = [10.0, 12.0, 9.0, 11.0]
+    with get_connection() as conn:
+        init_db(conn)
+        insert_prices(conn, [("AAA", c, f"2024-01-0{d + 1}T12:00:00Z", None, "t") for d, c in enumerate(closes)])
+        pid = upsert_portfolio(conn, id=None, name="P", base_currency="USD")
+        for date, price in (("2024-01-01", 10.0), ("2024-01-03", 9.0)):
+            insert_transaction(conn, portfolio_id=pid, date=date, symbol="AAA", type="BUY", qty=10, price=price, fees=0, currency="USD", notes=None)
+    c = TestClient(app)
+    body = c.get(f"/portfolios/{pid}/performance").json()
+    assert body["dates"] == ["2024-01-01", "2024-01-02", "2024-01-03", "2024-01-04"]
+    assert body["equity"] == [100.0, 120.0, 180.0, 220.0]
+    # The second buy is a deposit, not a return: day 3 is 180 / (120 + 90) - 1
+    growth = 1.2 * (180 / 210) * (220 / 180)
+    assert body["twr"][-1] == pytest.approx(growth - 1)
+    assert body["max_drawdown"] == pytest.approx(180 / 210 - 1)
+    assert body["volatility"] > 0 and body["cached"] is False
+    assert c.get(f"/portfolios/{pid}/performance").json()["cached"] is True
+
+    with get_connection() as conn:
+        insert_price(conn, symbol="AAA", price=13.0, as_of="2024-01-05T12:00:00Z", currency=None, source="t")
+    fresh = c.get(f"/portfolios/{pid}/performance").json()
+    assert fresh["cached"] is False and fresh["equity"][-1] == 260.0
+    assert c.get("/portfolios/999/performance").status_code == 404
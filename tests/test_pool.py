@@ -0,0 +1,82 @@
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.db import ConnectionPool, StorageProfile, get_connection, get_pool, insert_price
+
+
+def test_pool_reuses_connections_and_runs_schema_once(tmp_path):
+    pool = ConnectionPool(tmp_path / "p.db", size=2)
+    with pool.connection() as c1:
+        tables = {r[0] for r in c1.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+        assert {"prices", "journal", "entry_plans"} <= tables
+    with pool.connection() as c2:
+        assert c2 is c1
+    st = pool.stats()
+    assert st["open"] == 1
+    assert st["checkouts"] == 2
+    assert st["in_use"] == 0
+    pool.close()
+
+
+def test_pool_waits_when_exhausted(tmp_path):
+    pool = ConnectionPool(tmp_path / "p.db", size=1, timeout=5)
+    held = pool.acquire()
+    got = []
+
+    def worker():
+        with pool.connection() as conn:
+            got.append(conn)
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join(0.2)
+    assert not got
+    pool.release(held)
+    t.join(5)
+    assert got == [held]
+    assert pool.stats()["waits"] == 1
+    pool.close()
+
+
+def test_pool_stats_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "t.db"))
+    c = TestClient(app)
+    assert c.get("/journal").status_code == 200
+    r = c.get("/health/db")
+    assert r.status_code == 200
+    items = {it["readonly"]: it for it in r.json()["items"]}
+    assert items[True]["checkouts"] >= 1
+    assert items[True]["open"] >= 1
+    assert items[True]["db_path"] == str(tmp_path / "t.db")
+    assert get_pool().stats()["db_path"] == str(tmp_path / "t.db")
+
+
+def test_storage_profile_enables_wal(tmp_path):
+    conn = get_connection(tmp_path / "w.db", profile=StorageProfile(synchronous="NORMAL", busy_timeout=1234))
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 1234
+    conn.close()
+
+
+def test_readonly_pool_reads_during_open_write(tmp_path):
+    db = tmp_path / "ro.db"
+    reader = ConnectionPool(db, size=1, readonly=True)
+    reader.warm()  # creates the schema through a short-lived writer
+    writer = get_connection(db)
+    insert_price(writer, symbol="AAPL", price=1.0, as_of="2024-01-01T00:00:00Z", currency="USD", source="test")
+    # Hold an uncommitted write; WAL readers still see the last committed snapshot
+    writer.execute("INSERT INTO prices(symbol, price, as_of, source) VALUES ('AAPL', 2.0, '2024-01-02T00:00:00Z', 'test')")
+    with reader.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0] == 1
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM prices")
+    writer.commit()
+    with reader.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0] == 2
+    writer.close()
+    reader.close()
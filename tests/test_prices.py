@@ -46,3 +46,30 @@ def test_prices_with_one_row(tmp_path, monkeypatch):
     assert top["price"] == 123.45
     assert top["currency"] == "USD"
     assert top["source"] == "test"
+
+
+def test_quotes_batched(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "test.db"))
+    with get_connection() as conn:
+        init_db(conn)
+        insert_price(conn, symbol="EURUSD", price=1.10, as_of="2024-01-01T00:00:00Z", currency="USD", source="test")
+        insert_price(conn, symbol="EURUSD", price=1.12, as_of="2024-01-02T00:00:00Z", currency="USD", source="test")
+        insert_price(conn, symbol="AAPL", price=150.0, as_of="2024-01-02T00:00:00Z", currency="USD", source="test")
+
+    client = TestClient(app)
+    r = client.get("/quotes", params={"symbols": "eurusd,AAPL,NOPE"})
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [it["symbol"] for it in items] == ["EURUSD", "AAPL"]
+    assert items[0]["price"] == 1.12
+    assert items[0]["prev_price"] == 1.10
+    assert abs(items[0]["delta"] - 0.02) < 1e-9
+    assert items[1]["prev_price"] is None
+    assert items[1]["delta"] == 0.0
+
+    # Symbols stored in lower or mixed case are quoted too; an exact match wins over a case-insensitive one
+    with get_connection() as conn:
+        insert_price(conn, symbol="btc-usd", price=40000.0, as_of="2024-01-02T00:00:00Z", currency="USD", source="test")
+        insert_price(conn, symbol="EurUsd", price=9.0, as_of="2024-01-02T00:00:00Z", currency="USD", source="test")
+    items = client.get("/quotes", params={"symbols": "btc-usd,BTC-USD,EurUsd,eurusd"}).json()["items"]
+    assert [(it["symbol"], it["price"]) for it in items] == [("btc-usd", 40000.0), ("EurUsd", 9.0), ("EURUSD", 1.12)]
@@ -0,0 +1,79 @@
+import sqlite3
+
+import pytest
+
+from app.bars import query_bars
+from app.db import (
+    init_db, insert_price, get_latest_price, query_prices, query_journal,
+    list_transactions, compute_positions, list_entry_plans, encode_cursor, latest_quotes, INDEXES, TICK_INDEXES,
+)
+
+
+def _plans(conn, call):
+    """Run call(conn), capture every query it issues and return the EXPLAIN QUERY PLAN details."""
+    seen: list[str] = []
+    conn.set_trace_callback(seen.append)
+    try:
+        call(conn)
+    finally:
+        conn.set_trace_callback(None)
+    out = []
+    for sql in seen:
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            out.append([row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)])
+    assert out, "no SELECT captured"
+    return out
+
+
+@pytest.fixture()
+def conn():
+    c = sqlite3.connect(":memory:")
+    init_db(c)
+    insert_price(c, symbol="AAPL", price=1.0, as_of="2024-01-01T00:00:00Z", currency="USD", source="test")
+    yield c
+    c.close()
+
+
+HOT_QUERIES = {
+    "latest_price": lambda c: get_latest_price(c, symbol="AAPL"),
+    "prices_by_symbol": lambda c: query_prices(c, symbol="AAPL", limit=10),
+    "prices_by_symbol_range": lambda c: query_prices(c, symbol="AAPL", start="2024-01-01", end="2024-02-01"),
+    "prices_range": lambda c: query_prices(c, start="2024-01-01", end="2024-02-01"),
+    "prices_latest_n": lambda c: query_prices(c, limit=10),
+    "journal": lambda c: query_journal(c),
+    "journal_range": lambda c: query_journal(c, start="2024-01-01", end="2024-02-01"),
+    "journal_tags_any": lambda c: query_journal(c, tag="fx,breakout"),
+    "journal_tags_all": lambda c: query_journal(c, tag="fx,breakout", tag_mode="all", limit=10),
+    "transactions": lambda c: list_transactions(c, portfolio_id=1),
+    "positions": lambda c: compute_positions(c, portfolio_id=1),
+    "entry_plans_by_symbol": lambda c: list_entry_plans(c, symbol="AAPL"),
+    "entry_plans": lambda c: list_entry_plans(c),
+    # keyset pages must seek, not scan and discard
+    "prices_by_symbol_cursor": lambda c: query_prices(c, symbol="AAPL", cursor=encode_cursor("2024-01-01", 10)),
+    "prices_cursor": lambda c: query_prices(c, cursor=encode_cursor("2024-01-01", 10)),
+    "journal_cursor": lambda c: query_journal(c, limit=10, cursor=encode_cursor("2024-01-01", 10)),
+    "entry_plans_cursor": lambda c: list_entry_plans(c, symbol="AAPL", cursor=encode_cursor("2024-01-01", 10)),
+    "latest_quotes": lambda c: latest_quotes(c, symbols=["AAPL", "MSFT"]),
+    "bars": lambda c: query_bars(c, symbol="AAPL", interval="4h", start="2024-01-01"),
+}
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(conn, name):
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    for details in _plans(conn, HOT_QUERIES[name]):
+        for d in details:
+            assert "TEMP B-TREE" not in d, f"{name}: sort not served by an index: {details}"
+            # Scanning a CTE/VALUES list is fine; scanning a stored table without an index is not
+            words = d.split()
+            full_scan = words[0] == "SCAN" and words[1] in tables and "INDEX" not in d
+            assert not full_scan, f"{name}: full table scan: {details}"
+
+
+def test_init_db_creates_planned_indexes_once(conn):
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+    # The legacy prices indexes were replaced by TICK_INDEXES along with their table
+    assert {n for n, t in INDEXES + TICK_INDEXES if not t.startswith("prices(")} <= names
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    init_db(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == version
@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.db import get_connection, query_prices
+from ingest.scheduler import IngestScheduler, TokenBucket, parse_universe
+
+
+class StubAlphaVantage(BaseHTTPRequestHandler):
+    calls: list = []
+    delay = 0.0
+
+    def do_GET(self):
+        q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        type(self).calls.append(q)
+        time.sleep(type(self).delay)
+        if q.get("symbol") == "SLOW" or q.get("from_currency") == "THR":
+            body = {"Note": "Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute."}
+        elif q.get("symbol") == "BAD":
+            body = {"Global Quote": {"01. symbol": "BAD", "05. price": "1.0", "07. latest trading day": "n/a"}}
+        elif q["function"] == "GLOBAL_QUOTE":
+            body = {"Global Quote": {"01. symbol": q["symbol"], "05. price": "101.5", "07. latest trading day": "2024-01-02"}}
+        else:
+            body = {"Realtime Currency Exchange Rate": {"5. Exchange Rate": "1.0850", "6. Last Refreshed": "2024-01-02 10:00:00"}}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub(monkeypatch, tmp_path):
+    StubAlphaVantage.calls = []
+    StubAlphaVantage.delay = 0.0
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), StubAlphaVantage)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{srv.server_address[1]}/query"
+    import ingest.alpha_vantage as av
+    import ingest.alpha_vantage_fx as fx
+    monkeypatch.setattr(av, "ALPHA_URL", url)
+    monkeypatch.setattr(fx, "API_URL", url)
+    monkeypatch.setenv("ALPHA_VANTAGE_API_KEY", "k1")
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "s.db"))
+    yield StubAlphaVantage
+    srv.shutdown()
+
+
+def test_parse_universe_guesses_provider_and_dedupes():
+    assert parse_universe(["eurusd", "AAPL", "yahoo:msft", "EURUSD"]) == [
+        ("alpha_vantage_fx", "EURUSD"), ("alpha_vantage", "AAPL"), ("yahoo", "MSFT"),
+    ]
+
+
+def test_run_once_fetches_concurrently_and_batches_writes(stub, tmp_path):
+    sched = IngestScheduler(["EURUSD", "AAPL", "MSFT"], rates={"alpha_vantage": 100}, max_workers=3)
+    out = sched.run_once()
+    assert out["fetched"] == 3 and out["inserted"] == 3 and not out["errors"]
+    assert len(stub.calls) == 3
+    conn = get_connection(tmp_path / "s.db")
+    assert {r[0] for r in query_prices(conn)} == {"EURUSD", "AAPL", "MSFT"}
+    assert query_prices(conn, symbol="EURUSD")[0][4] == "alpha_vantage_fx"
+    # Same quotes again: stored rows are ignored, not duplicated
+    assert sched.run_once()["ignored"] == 3
+    sched.stop()
+
+
+def test_run_once_reports_unusable_quotes(stub):
+    sched = IngestScheduler(["AAPL", "BAD"], rates={"alpha_vantage": 100})
+    out = sched.run_once()
+    assert out["inserted"] == 1 and list(out["errors"]) == ["alpha_vantage:BAD"]
+    sched.stop()
+
+
+def test_duplicate_requests_are_coalesced(stub):
+    stub.delay = 0.2
+    sched = IngestScheduler([], rates={"alpha_vantage": 100})
+    a = sched.submit("alpha_vantage", "AAPL")
+    b = sched.submit("alpha_vantage", "aapl")
+    assert a is b
+    assert a.result()["price"] == 101.5
+    assert len(stub.calls) == 1
+    sched.stop()
+
+
+def test_rate_limit_and_throttle_backoff(stub):
+    # Budget of 2 requests/minute per key and no waiting: the third symbol is refused locally
+    sched = IngestScheduler(["AAPL", "MSFT", "IBM"], rates={"alpha_vantage": 100, "alpha_vantage:key": 2}, max_wait=0, max_workers=1)
+    out = sched.run_once()
+    assert out["fetched"] == 2
+    assert "rate limit" in next(iter(out["errors"].values()))
+    assert len(stub.calls) == 2
+    sched.stop()
+
+    # A provider "Note" drains the buckets so the next request waits for a refill
+    stub.calls.clear()
+    sched = IngestScheduler(["SLOW", "AAPL"], rates={"alpha_vantage": 100}, max_wait=0, max_workers=1)
+    out = sched.run_once()
+    assert "alpha_vantage:SLOW" in out["errors"]
+    assert "alpha_vantage:AAPL" in out["errors"]
+    assert len(stub.calls) == 1
+    sched.stop()
+
+
+def test_token_bucket_refills():
+    b = TokenBucket(rate=600, per=60.0, capacity=1)  # 10 tokens/s
+    assert b.try_acquire() == 0.0
+    assert b.try_acquire() > 0
+    time.sleep(0.15)
+    assert b.try_acquire() == 0.0
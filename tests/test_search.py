@@ -0,0 +1,64 @@
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from app.db import delete_journal, get_connection, init_db, insert_entry_plan, upsert_journal
+from app.main import app
+from app.search import fts_query, search_text
+
+
+def test_fts_query_quotes_terms():
+    assert fts_query('london "killzone" AND x*') == '"london" "killzone" "AND" "x"*'
+    assert fts_query("  -- ") == ""
+
+
+def test_fts_indexes_follow_inserts_updates_and_deletes():
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    insert_entry_plan(conn, symbol="XAUUSD", text="Short the London killzone sweep above Asian highs.")
+    insert_entry_plan(conn, symbol="EURUSD", text="Range day; no killzone setups.")
+    jid = upsert_journal(conn, id=None, symbol="XAUUSD", date="2024-01-02", direction="Long", qty=1, entry=1, stop=None, exit=2, fees=0, tags="killzone", notes="Took the London open drive")
+
+    hits = search_text(conn, q="London killzone")
+    assert sorted((h["kind"], h["symbol"]) for h in hits) == [("journal", "XAUUSD"), ("plan", "XAUUSD")]
+    plan = next(h for h in hits if h["kind"] == "plan")
+    assert "<mark>London</mark> <mark>killzone</mark>" in plan["snippet"]
+    assert [h["symbol"] for h in search_text(conn, q="killzone", symbol="EURUSD")] == ["EURUSD"]
+    assert len(search_text(conn, q="kill*")) == 3
+
+    upsert_journal(conn, id=jid, symbol="XAUUSD", date="2024-01-02", direction="Long", qty=1, entry=1, stop=None, exit=2, fees=0, tags=None, notes="New York reversal")
+    assert [h["kind"] for h in search_text(conn, q="killzone", kinds=("journal",))] == []
+    assert [h["id"] for h in search_text(conn, q="york")] == [jid]
+    delete_journal(conn, id=jid)
+    assert search_text(conn, q="york") == []
+
+
+def test_snippets_are_html_escaped():
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    insert_entry_plan(conn, symbol="XAUUSD", text="Buy <script>alert(1)</script> & hold the London low")
+    snip = search_text(conn, q="script london")[0]["snippet"]
+    assert "<script>" not in snip
+    assert "&lt;<mark>script</mark>&gt;alert(1)&lt;/<mark>script</mark>&gt; &amp; hold the <mark>London</mark>" in snip
+
+
+def test_search_endpoint_ranks_and_pages(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_PATH", str(tmp_path / "f.db"))
+    with get_connection() as conn:
+        init_db(conn)
+        insert_entry_plan(conn, symbol="XAUUSD", text="London killzone long. London lows swept, London open FVG, killzone timing.")
+        for i in range(4):
+            insert_entry_plan(conn, symbol="XAUUSD", text=f"Plan {i}: mention London once, then unrelated words about gold and dollars.")
+    c = TestClient(app)
+    r = c.get("/search", params={"q": "london", "limit": 3})
+    assert r.status_code == 200
+    body = r.json()
+    assert len(body["items"]) == 3 and body["next_offset"] == 3
+    assert "killzone" in body["items"][0]["snippet"]  # the densest match ranks first
+    scores = [h["score"] for h in body["items"]]
+    assert scores == sorted(scores)
+    rest = c.get("/search", params={"q": "london", "limit": 3, "offset": 3}).json()
+    assert len(rest["items"]) == 2 and rest["next_offset"] is None
+    assert {h["id"] for h in body["items"]}.isdisjoint(h["id"] for h in rest["items"])
+    assert c.get("/search", params={"q": "!!"}).status_code == 400
+    assert c.get("/search", params={"q": "london", "kind": "notes"}).status_code == 400
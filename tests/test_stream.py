@@ -0,0 +1,56 @@
+import asyncio
+import json
+import threading
+
+from app.db import get_connection, init_db, insert_price
+from app.stream import PriceHub, price_hub, sse_price_events
+
+
+def test_hub_fans_out_by_symbol():
+    async def run():
+        hub = PriceHub()
+        eur = hub.subscribe(["eurusd"])
+        everything = hub.subscribe([])
+        # publish from a worker thread, as sync endpoints/ingest do
+        t = threading.Thread(target=lambda: [hub.publish({"symbol": s, "price": 1.0}) for s in ("AAPL", "EURUSD", "eurusd")])
+        t.start(); t.join()
+        # Symbols stored in any case reach the subscriber, under their stored name
+        assert [(await asyncio.wait_for(eur.queue.get(), 1))["symbol"] for _ in range(2)] == ["EURUSD", "eurusd"]
+        assert eur.queue.empty()
+        assert [(await everything.queue.get())["symbol"] for _ in range(3)] == ["AAPL", "EURUSD", "eurusd"]
+        hub.unsubscribe(eur); hub.unsubscribe(everything)
+        assert hub.stats()["subscribers"] == 0
+    asyncio.run(run())
+
+
+def test_slow_subscriber_drops_oldest():
+    async def run():
+        hub = PriceHub()
+        sub = hub.subscribe(["X"], maxsize=2)
+        for i in range(3):
+            hub.publish({"symbol": "X", "price": float(i)})
+        await asyncio.sleep(0)
+        assert [sub.queue.get_nowait()["price"] for _ in range(2)] == [1.0, 2.0]
+        assert sub.dropped == 1
+    asyncio.run(run())
+
+
+def test_insert_price_streams_sse_frame(tmp_path):
+    async def run():
+        sub = price_hub.subscribe(["AAPL"])
+        frames = sse_price_events(sub, keepalive=5)
+        assert await frames.__anext__() == ": connected\n\n"
+
+        def write():
+            conn = get_connection(tmp_path / "s.db")
+            init_db(conn)
+            insert_price(conn, symbol="AAPL", price=10.5, as_of="2024-01-01T00:00:00Z", currency="USD", source="t")
+            conn.close()
+
+        await asyncio.get_running_loop().run_in_executor(None, write)
+        frame = await asyncio.wait_for(frames.__anext__(), 2)
+        price_hub.unsubscribe(sub)
+        assert frame.startswith("event: price\ndata: ")
+        data = json.loads(frame.split("data: ", 1)[1])
+        assert data["symbol"] == "AAPL" and data["price"] == 10.5 and data["created_at"]
+    asyncio.run(run())